@@ -12,19 +12,23 @@ function checkHintsAreAleradyInjected(): boolean {
   return false;
 }
 
-function makePayloadStringFromArticleNode(articleNode: HTMLElement): string {
+function makePayloadStringFromArticleNode(articleNode: HTMLElement, difficulty: number): string {
   const articleText = articleNode.textContent.trim();
-  const payload = { text: articleText };
+  const payload = { text: articleText, options: { difficulty: Number(difficulty) } };
   return JSON.stringify(payload);
 }
 
-function getHintsFromAPI(articleNode: HTMLElement, apiUrl: string): Promise<any> {
+function getHintsFromAPI(
+  articleNode: HTMLElement,
+  apiUrl: string,
+  difficulty: number,
+): Promise<any> {
   return fetch(apiUrl, {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json',
     },
-    body: makePayloadStringFromArticleNode(articleNode),
+    body: makePayloadStringFromArticleNode(articleNode, difficulty),
   })
     .then((response) => {
       if (!response.ok) {
@@ -49,7 +53,7 @@ function handleExtensionIconClicked(): void {
       (options: Record<string, any>) => {
         const articleNodes = getArticleNodes(document);
         articleNodes.forEach((articleNode) => {
-          const hintsResp = getHintsFromAPI(articleNode, options.api_url);
+          const hintsResp = getHintsFromAPI(articleNode, options.api_url, options.difficulty);
           hintsResp.then((responseData) => {
             const hints: Hint[] = parseApiResponse(responseData);
             injectHints(hints, articleNode, options.difficulty);
@@ -0,0 +1,62 @@
+"""
+Compares the p50 / p99 latency of the eager WSD model with the compiled ones
+(wsd_compile in config.ini) for a few batch shapes.
+
+Run from the repository root:
+PYTHONPATH=. python scripts/wsd_inference/benchmark_compiled.py
+"""
+
+import argparse
+import statistics
+import time
+
+import torch
+
+from smart_word_hints_api.app.compiled_wsd_model import CompiledWsdModel
+from smart_word_hints_api.app.constants import (
+    WSD_COMPILE_INDUCTOR,
+    WSD_COMPILE_NONE,
+    WSD_COMPILE_TORCHSCRIPT,
+)
+from smart_word_hints_api.app.esr_sense_provider import ESRSenseProvider
+from smart_word_hints_api.app.wsd_input import get_dummy_batch
+
+BATCH_SHAPES = [(1, 32), (8, 64), (32, 64), (64, 128)]
+
+
+def get_percentile(timings: list[float], percentile: int) -> float:
+    return statistics.quantiles(timings, n=100, method="inclusive")[percentile - 1]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model_name", default="distilroberta-base")
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument(
+        "--compile_modes",
+        nargs="+",
+        default=[WSD_COMPILE_NONE, WSD_COMPILE_TORCHSCRIPT, WSD_COMPILE_INDUCTOR],
+    )
+    args = parser.parse_args()
+
+    eager_model = ESRSenseProvider(args.model_name).model.eval()
+
+    for compile_mode in args.compile_modes:
+        model = (
+            eager_model
+            if compile_mode == WSD_COMPILE_NONE
+            else CompiledWsdModel(eager_model, compile_mode, warmup_shapes=BATCH_SHAPES)
+        )
+        for batch_size, sequence_length in BATCH_SHAPES:
+            batch = get_dummy_batch(batch_size, sequence_length)
+            timings = []
+            for _ in range(args.repeats):
+                start = time.perf_counter()
+                with torch.no_grad():
+                    model(**batch)
+                timings.append((time.perf_counter() - start) * 1000)
+            print(
+                f"{compile_mode:>12} batch {batch_size:>3} x {sequence_length:>3}: "
+                f"p50 {get_percentile(timings, 50):.1f} ms, "
+                f"p99 {get_percentile(timings, 99):.1f} ms"
+            )
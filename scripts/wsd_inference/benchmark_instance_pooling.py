@@ -0,0 +1,122 @@
+"""
+Peak memory per batch size of the instance pooling of training (the instance mask
+and lengths repeated over the hidden size) vs the in-place inference pooling
+of DistilRobertaForWsd, on its own and in the whole forward pass,
+and whether their predictions are identical.
+
+The whole forward pass can still peak in the encoder layers (the feed-forward
+activations are 4x the size of the hidden states).
+
+Each measurement runs in a fresh process. The peak RSS is reset (Linux only)
+after the model is loaded and warmed up, so that only the measured step counts.
+
+Run from the repository root:
+PYTHONPATH=. python scripts/wsd_inference/benchmark_instance_pooling.py
+"""
+import argparse
+import multiprocessing
+from typing import Callable
+
+import torch
+
+from smart_word_hints_api.app.distilroberta_for_wsd import DistilRobertaForWsd
+from smart_word_hints_api.app.esr_sense_provider import get_checkpoint_path
+from smart_word_hints_api.app.model_files import load_model_config
+from smart_word_hints_api.app.wsd_input import get_dummy_batch
+
+POOLING_MODES = ["repeat", "in-place"]
+BATCH_SIZES = [8, 32, 128, 256]
+
+
+def pool_instances_with_repeat(
+    last_hidden_state: torch.Tensor,
+    instance_mask: torch.Tensor,
+    instance_lens: torch.Tensor,
+) -> torch.Tensor:
+    hidden_size = last_hidden_state.shape[2]
+    instance_mask = instance_mask.unsqueeze(dim=2).repeat(1, 1, hidden_size)
+    instance_lens = instance_lens.unsqueeze(dim=1).repeat(1, hidden_size)
+    return (last_hidden_state * instance_mask).sum(dim=1) / instance_lens
+
+
+def load_model(model_name: str, pooling_mode: str) -> DistilRobertaForWsd:
+    model = DistilRobertaForWsd.from_pretrained(
+        get_checkpoint_path(model_name), config=load_model_config(model_name)
+    ).eval()
+    if pooling_mode == "repeat":
+        model._pool_instances_in_place = pool_instances_with_repeat
+    return model
+
+
+def get_memory_mb() -> dict[str, float]:
+    memory_mb = {}
+    with open("/proc/self/status", "r") as f:
+        for line in f:
+            if line.startswith(("VmRSS", "VmHWM")):
+                name, value = line.split(":")
+                memory_mb[name] = int(value.split()[0]) / 1024
+    return memory_mb
+
+
+def get_peak_memory_mb(step: Callable[[], object]) -> float:
+    with open("/proc/self/clear_refs", "w") as f:
+        f.write("5")
+    rss_before_mb = get_memory_mb()["VmRSS"]
+    with torch.no_grad():
+        step()
+    return get_memory_mb()["VmHWM"] - rss_before_mb
+
+
+def measure_peak_memory(
+    model_name: str, pooling_mode: str, batch_size: int, sequence_length: int
+) -> None:
+    model = load_model(model_name, pooling_mode)
+    with torch.no_grad():
+        model(**get_dummy_batch(batch_size=1, sequence_length=sequence_length))
+    batch = get_dummy_batch(batch_size, sequence_length)
+    last_hidden_state = torch.randn(
+        batch_size, sequence_length, model.config.hidden_size
+    )
+
+    pooling_peak_mb = get_peak_memory_mb(
+        lambda: model._pool_instances_in_place(
+            last_hidden_state, batch["instance_mask"], batch["instance_lens"]
+        )
+    )
+    forward_peak_mb = get_peak_memory_mb(lambda: model(**batch))
+    print(
+        f"{pooling_mode:>8}, batch size {batch_size:>4}: "
+        f"peak memory of the pooling {pooling_peak_mb:.0f} MB, "
+        f"of the forward pass {forward_peak_mb:.0f} MB"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model_name", default="distilroberta-base")
+    parser.add_argument("--sequence_length", type=int, default=128)
+    parser.add_argument("--batch_sizes", type=int, nargs="+", default=BATCH_SIZES)
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    for batch_size in args.batch_sizes:
+        for pooling_mode in POOLING_MODES:
+            process = context.Process(
+                target=measure_peak_memory,
+                args=(args.model_name, pooling_mode, batch_size, args.sequence_length),
+            )
+            process.start()
+            process.join()
+
+    models = {
+        pooling_mode: load_model(args.model_name, pooling_mode)
+        for pooling_mode in POOLING_MODES
+    }
+    for batch_size in args.batch_sizes:
+        batch = get_dummy_batch(batch_size, args.sequence_length)
+        with torch.no_grad():
+            preds = [models[pooling_mode](**batch)[0] for pooling_mode in POOLING_MODES]
+        print(
+            f"batch size {batch_size:>4}: identical predictions "
+            f"{torch.equal(*preds)}"
+        )
@@ -0,0 +1,98 @@
+"""
+Reports the padding ratio and the inference time of ESRSenseProvider
+with and without length bucketing, and with sequence packing.
+
+Run from the repository root:
+PYTHONPATH=. python scripts/wsd_inference/benchmark_length_buckets.py
+"""
+
+import argparse
+import statistics
+import time
+
+from smart_word_hints_api.app.esr_sense_provider import ESRSenseProvider
+from smart_word_hints_api.app.text_holder import TextHolderEN
+from smart_word_hints_api.app.wsd_batching import (
+    get_padding_ratio,
+    group_into_length_buckets,
+    split_into_micro_batches,
+)
+
+SAMPLE_TEXT = (
+    "By the time we reached the opposite bank, the boat was sinking fast. "
+    "The committee will set out its proposals before the end of the year, "
+    "although several members have already raised concerns about the cost. "
+    "Researchers found that the plant, an endemic species, can survive "
+    "long periods of drought by storing water in its thick leaves. "
+    "Take care."
+)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model_name", default="distilroberta-base")
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--max_batch_examples", type=int, default=64)
+    parser.add_argument("--bucket_widths", type=int, nargs="+", default=[8, 16, 32])
+    parser.add_argument(
+        "--packed_row_lengths", type=int, nargs="+", default=[128, 256, 512]
+    )
+    args = parser.parse_args()
+
+    text_holder = TextHolderEN(SAMPLE_TEXT, flag_phrasal_verbs=True)
+    token_indexes = [
+        i for i, token in enumerate(text_holder.tokens) if token.is_translatable()
+    ]
+
+    for bucket_width in [None, *args.bucket_widths]:
+        sense_provider = ESRSenseProvider(
+            args.model_name,
+            max_batch_examples=args.max_batch_examples,
+            length_bucket_width=bucket_width,
+        )
+        examples = sense_provider.input_builder.build_examples(
+            text_holder.tokens, token_indexes
+        )
+        buckets = (
+            [examples]
+            if bucket_width is None
+            else group_into_length_buckets(examples, bucket_width)[0]
+        )
+        micro_batches = [
+            micro_batch
+            for bucket in buckets
+            for micro_batch in split_into_micro_batches(bucket, args.max_batch_examples)
+        ]
+
+        timings = []
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            sense_provider.get_sense_keys(text_holder, token_indexes)
+            timings.append((time.perf_counter() - start) * 1000)
+
+        print(
+            f"bucket width {str(bucket_width):>4}: "
+            f"{len(examples)} examples, {len(micro_batches)} micro-batches, "
+            f"padding ratio {get_padding_ratio(micro_batches):.3f}, "
+            f"median {statistics.median(timings):.1f} ms"
+        )
+
+    for packed_row_length in args.packed_row_lengths:
+        sense_provider = ESRSenseProvider(
+            args.model_name,
+            max_batch_tokens=args.max_batch_examples * packed_row_length,
+            packed_row_length=packed_row_length,
+        )
+        timings = []
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            sense_provider.get_sense_keys(text_holder, token_indexes)
+            timings.append((time.perf_counter() - start) * 1000)
+
+        packing_metrics = sense_provider.get_metrics()["sequence_packing"]
+        print(
+            f"packed row length {packed_row_length:>4}: "
+            f"{packing_metrics['examples_per_row']:.1f} examples per row, "
+            f"padding ratio {1 - packing_metrics['utilization']:.3f}, "
+            f"median {statistics.median(timings):.1f} ms"
+        )
@@ -0,0 +1,74 @@
+"""
+Startup time and memory of a worker process loading the WSD model from the .bin
+checkpoint (from_pretrained, unpickled and copied into the process memory)
+vs from the memory-mapped safetensors file.
+
+The private memory (RssAnon) is what each gunicorn worker pays separately,
+the file-backed memory (RssFile) is shared between the workers through
+the page cache.
+
+Convert the checkpoints first:
+python -m smart_word_hints_api.app.mmap_weights
+
+Run from the repository root:
+PYTHONPATH=. python scripts/wsd_inference/benchmark_model_loading.py
+"""
+import argparse
+import multiprocessing
+import time
+
+import torch
+
+from smart_word_hints_api.app.distilroberta_for_wsd import DistilRobertaForWsd
+from smart_word_hints_api.app.esr_sense_provider import get_checkpoint_path
+from smart_word_hints_api.app.mmap_weights import load_mmapped_model
+from smart_word_hints_api.app.model_files import load_model_config
+from smart_word_hints_api.app.wsd_input import get_dummy_batch
+
+LOADING_MODES = ["bin", "safetensors-mmap"]
+
+
+def get_rss_mb() -> dict[str, int]:
+    rss_mb = {}
+    with open("/proc/self/status", "r") as f:
+        for line in f:
+            if line.startswith(("RssAnon", "RssFile")):
+                name, value = line.split(":")
+                rss_mb[name] = int(value.split()[0]) // 1024
+    return rss_mb
+
+
+def load_model(model_name: str, loading_mode: str) -> None:
+    start = time.perf_counter()
+    model_config = load_model_config(model_name)
+    if loading_mode == "bin":
+        model = DistilRobertaForWsd.from_pretrained(
+            get_checkpoint_path(model_name), config=model_config
+        ).eval()
+    else:
+        model = load_mmapped_model(model_name, model_config)
+    load_time_s = time.perf_counter() - start
+    with torch.no_grad():
+        model(**get_dummy_batch(batch_size=1, sequence_length=32))
+    first_prediction_time_s = time.perf_counter() - start
+    rss_mb = get_rss_mb()
+    print(
+        f"{loading_mode:>16}: loaded in {load_time_s:.2f} s, "
+        f"first prediction after {first_prediction_time_s:.2f} s, "
+        f"private RSS {rss_mb['RssAnon']} MB, shared RSS {rss_mb['RssFile']} MB"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model_name", default="distilroberta-base")
+    args = parser.parse_args()
+
+    # a fresh process per mode, like a newly started worker
+    context = multiprocessing.get_context("spawn")
+    for loading_mode in LOADING_MODES:
+        process = context.Process(
+            target=load_model, args=(args.model_name, loading_mode)
+        )
+        process.start()
+        process.join()
@@ -0,0 +1,88 @@
+"""
+Compares the per-request cost of building the WSD model input through
+the temporary XML file + WsdDataset with the in-memory WsdInputBuilder.
+Only the input preparation is measured, the forward pass is the same for both.
+
+Run from the repository root:
+PYTHONPATH=. python scripts/wsd_inference/benchmark_wsd_input.py
+"""
+
+import argparse
+import statistics
+import tempfile
+import time
+
+from smart_word_hints_api.app.esr.code.esr.dataset.dataset_semcor_wngc import (
+    DataCollatorForWsd,
+    WsdDataset,
+)
+from smart_word_hints_api.app.esr_sense_provider import save_input_as_xml
+from smart_word_hints_api.app.model_files import load_tokenizer
+from smart_word_hints_api.app.text_holder import TextHolderEN
+from smart_word_hints_api.app.wsd_input import WsdInputBuilder, collate_wsd_examples
+
+SAMPLE_TEXT = (
+    "By the time we reached the opposite bank, the boat was sinking fast. "
+    "The committee will set out its proposals before the end of the year, "
+    "although several members have already raised concerns about the cost. "
+    "Researchers found that the plant, an endemic species, can survive "
+    "long periods of drought by storing water in its thick leaves."
+)
+
+
+def build_via_xml(tokenizer, text_holder, token_indexes):
+    with tempfile.NamedTemporaryFile(mode="w+t") as f:
+        save_input_as_xml(text_holder.tokens, token_indexes, f.name)
+        dataset = WsdDataset(
+            tokenizer,
+            limit=432,
+            wsd_xml=f.name,
+            wsd_label=None,
+            annotators=None,
+            is_dev=False,
+            is_main_process=False,
+            extra_xml=None,
+        )
+        return DataCollatorForWsd()(dataset)
+
+
+def build_in_memory(builder, text_holder, token_indexes):
+    examples = builder.build_examples(text_holder.tokens, token_indexes)
+    return collate_wsd_examples(examples, builder.tokenizer.pad_token_id)
+
+
+def measure_ms(func, repeats: int) -> list[float]:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model_name", default="distilroberta-base")
+    parser.add_argument("--repeats", type=int, default=50)
+    args = parser.parse_args()
+
+    tokenizer = load_tokenizer(args.model_name)
+    builder = WsdInputBuilder(tokenizer)
+    text_holder = TextHolderEN(SAMPLE_TEXT, flag_phrasal_verbs=True)
+    token_indexes = [
+        i for i, token in enumerate(text_holder.tokens) if token.is_translatable()
+    ]
+
+    for name, func in [
+        (
+            "xml + WsdDataset",
+            lambda: build_via_xml(tokenizer, text_holder, token_indexes),
+        ),
+        ("in-memory", lambda: build_in_memory(builder, text_holder, token_indexes)),
+    ]:
+        func()  # warm-up, e.g. WordNet lazy loading
+        timings = measure_ms(func, args.repeats)
+        print(
+            f"{name:>20}: median {statistics.median(timings):.2f} ms, "
+            f"min {min(timings):.2f} ms ({args.repeats} repeats)"
+        )
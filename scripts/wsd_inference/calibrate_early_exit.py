@@ -0,0 +1,251 @@
+"""
+Calibrates the early-exit heads of a WSD model (wsd_early_exit in config.ini)
+on SemCor-format data:
+1. the features of the exit layers are collected for the candidate senses
+   of the gold instances of the calibration documents (the model is frozen),
+2. a linear head per exit layer is trained on them,
+3. going from the shallowest exit layer, the threshold of each layer is the lowest
+   gap between the scores of the two best senses at which the instances exiting
+   there still agree with the full-depth model on at least --min_agreement of them.
+The heads are saved next to the checkpoint, then the accuracy, latency and average
+exit layer with early exit are compared with full depth on the held-out documents.
+
+Run from the repository root:
+PYTHONPATH=. python scripts/wsd_inference/calibrate_early_exit.py \
+    --xml semcor.data.xml --gold_keys semcor.gold.key.txt
+"""
+import argparse
+import random
+
+import torch
+import torch.nn as nn
+from semcor_eval import SemcorDocument, evaluate, format_result, load_semcor_documents
+
+from smart_word_hints_api.app.cascade_sense_provider import get_margin
+from smart_word_hints_api.app.early_exit import (
+    EarlyExitHeads,
+    get_default_exit_layers,
+    get_early_exit_heads_path,
+    get_exit_features,
+)
+from smart_word_hints_api.app.esr_sense_provider import ESRSenseProvider
+from smart_word_hints_api.app.wsd_batching import split_instances_into_micro_batches
+from smart_word_hints_api.app.wsd_input import collate_wsd_examples
+
+FEATURES_BATCH_SIZE = 64
+TRAINING_BATCH_SIZE = 256
+
+
+def collect_features(
+    sense_provider: ESRSenseProvider,
+    documents: list[SemcorDocument],
+    exit_layers: list[int],
+    max_examples: int,
+) -> tuple[list[torch.Tensor], torch.Tensor, torch.Tensor, torch.Tensor]:
+    """
+    Returns the features per exit layer, the labels (whether the sense is a gold
+    one), the full-depth probabilities and the instance (group) of each example.
+    """
+    model = sense_provider.model
+    features: list[list[torch.Tensor]] = [[] for _ in exit_layers]
+    full_depth_probs: list[torch.Tensor] = []
+    labels: list[int] = []
+    example_groups: list[int] = []
+    group = -1
+    for document in documents:
+        examples = sense_provider.input_builder.build_examples(
+            document.tokens, sorted(document.token_i__to__gold_keys)
+        )
+        for example_i, example in enumerate(examples):
+            if (
+                example_i == 0
+                or example.instance_id != examples[example_i - 1].instance_id
+            ):
+                group += 1
+            example_groups.append(group)
+            labels.append(
+                int(
+                    example.sense_key
+                    in document.token_i__to__gold_keys[example.instance_id]
+                )
+            )
+        for micro_batch in split_instances_into_micro_batches(
+            examples, FEATURES_BATCH_SIZE
+        ):
+            batch = collate_wsd_examples(
+                [examples[example_i] for example_i in micro_batch],
+                sense_provider.tokenizer.pad_token_id,
+            )
+            with torch.no_grad():
+                hidden_states = model.roberta(
+                    batch["input_ids"],
+                    attention_mask=batch["attention_mask"],
+                    output_hidden_states=True,
+                ).hidden_states
+                for layer_features, exit_layer in zip(features, exit_layers):
+                    layer_features.append(
+                        get_exit_features(
+                            model,
+                            hidden_states[exit_layer],
+                            batch["instance_mask"],
+                            batch["instance_lens"],
+                        )
+                    )
+                full_depth_probs.append(model(**batch)[0])
+        if len(labels) >= max_examples:
+            break
+    return (
+        [torch.cat(layer_features) for layer_features in features],
+        torch.tensor(labels),
+        torch.cat(full_depth_probs),
+        torch.tensor(example_groups),
+    )
+
+
+def train_head(
+    head: nn.Linear, features: torch.Tensor, labels: torch.Tensor, epochs: int
+) -> None:
+    optimizer = torch.optim.Adam(head.parameters(), lr=1e-3)
+    loss_fn = nn.CrossEntropyLoss()
+    head.train()
+    for _ in range(epochs):
+        permutation = torch.randperm(len(labels))
+        for start in range(0, len(labels), TRAINING_BATCH_SIZE):
+            indexes = permutation[start : start + TRAINING_BATCH_SIZE]
+            optimizer.zero_grad()
+            loss_fn(head(features[indexes]), labels[indexes]).backward()
+            optimizer.step()
+    head.eval()
+
+
+def get_margins_and_predictions(
+    probs: torch.Tensor, example_groups: torch.Tensor
+) -> dict[int, tuple[float, int]]:
+    """
+    For each group (instance): the gap between the scores of its two best senses
+    and the index of the best one.
+    """
+    group__to__margin_and_prediction = {}
+    for group in example_groups.unique().tolist():
+        group_probs = probs[example_groups == group]
+        group__to__margin_and_prediction[group] = (
+            get_margin(dict(enumerate(group_probs.tolist()))),
+            int(group_probs.argmax()),
+        )
+    return group__to__margin_and_prediction
+
+
+def choose_threshold(
+    head_results: dict[int, tuple[float, int]],
+    full_depth_predictions: dict[int, int],
+    min_agreement: float,
+) -> float:
+    """
+    The lowest margin such that the instances at or above it agree with
+    the full-depth predictions on at least min_agreement of them,
+    inf (no instance exits at the layer) if there is none.
+    """
+    threshold = float("inf")
+    agreeing = 0
+    by_margin = sorted(head_results.items(), key=lambda item: -item[1][0])
+    for exited, (group, (margin, prediction)) in enumerate(by_margin, start=1):
+        agreeing += prediction == full_depth_predictions[group]
+        if agreeing / exited >= min_agreement:
+            threshold = margin
+    return threshold
+
+
+def calibrate(
+    sense_provider: ESRSenseProvider,
+    documents: list[SemcorDocument],
+    exit_layers: list[int],
+    max_examples: int,
+    epochs: int,
+    min_agreement: float,
+) -> EarlyExitHeads:
+    features, labels, full_depth_probs, example_groups = collect_features(
+        sense_provider, documents, exit_layers, max_examples
+    )
+    full_depth_predictions = {
+        group: prediction
+        for group, (_, prediction) in get_margins_and_predictions(
+            full_depth_probs, example_groups
+        ).items()
+    }
+    heads = EarlyExitHeads(sense_provider.model.config.hidden_size, exit_layers)
+    remaining = torch.ones(len(labels), dtype=torch.bool)
+    for layer_i, (exit_layer, head) in enumerate(zip(exit_layers, heads.heads)):
+        train_head(head, features[layer_i], labels, epochs)
+        with torch.no_grad():
+            head_probs = torch.softmax(head(features[layer_i][remaining]), dim=1)[:, 1]
+        head_results = get_margins_and_predictions(
+            head_probs, example_groups[remaining]
+        )
+        threshold = choose_threshold(
+            head_results, full_depth_predictions, min_agreement
+        )
+        heads.thresholds[layer_i] = threshold
+        exited_groups = [
+            group for group, (margin, _) in head_results.items() if margin >= threshold
+        ]
+        remaining &= ~torch.isin(example_groups, torch.tensor(exited_groups))
+        print(
+            f"layer {exit_layer}: threshold {threshold:.4f}, "
+            f"{len(exited_groups)} of {len(head_results)} remaining instances exit"
+        )
+    return heads
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--xml", required=True)
+    parser.add_argument("--gold_keys", required=True)
+    parser.add_argument("--model_name", default="distilroberta-base")
+    parser.add_argument("--exit_layers", type=int, nargs="+")
+    parser.add_argument("--min_agreement", type=float, default=0.99)
+    parser.add_argument("--max_calibration_examples", type=int, default=20000)
+    parser.add_argument("--eval_fraction", type=float, default=0.2)
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    torch.manual_seed(args.seed)
+    documents = load_semcor_documents(args.xml, args.gold_keys)
+    random.Random(args.seed).shuffle(documents)
+    eval_documents_count = int(len(documents) * args.eval_fraction)
+    eval_documents = documents[:eval_documents_count]
+    calibration_documents = documents[eval_documents_count:]
+
+    full_depth_provider = ESRSenseProvider(args.model_name, max_batch_examples=64)
+    exit_layers = args.exit_layers or get_default_exit_layers(
+        full_depth_provider.model.config.num_hidden_layers
+    )
+    heads = calibrate(
+        full_depth_provider,
+        calibration_documents,
+        exit_layers,
+        args.max_calibration_examples,
+        args.epochs,
+        args.min_agreement,
+    )
+    heads_path = get_early_exit_heads_path(args.model_name)
+    heads.save(heads_path)
+    print(f"saved the early-exit heads to {heads_path}")
+
+    full_depth_result = evaluate(full_depth_provider, eval_documents)
+    print(format_result(f"full depth {args.model_name}", full_depth_result))
+    early_exit_provider = ESRSenseProvider(
+        args.model_name, max_batch_examples=64, early_exit=True
+    )
+    early_exit_result = evaluate(early_exit_provider, eval_documents)
+    print(format_result(f"early exit {args.model_name}", early_exit_result))
+    print(
+        f"accuracy difference: "
+        f"{early_exit_result.accuracy - full_depth_result.accuracy:+.4f}"
+    )
+    early_exit_metrics = early_exit_provider.get_metrics()["early_exit"]
+    print(
+        f"average exit layer {early_exit_metrics['average_exit_layer']:.2f} "
+        f"of {full_depth_provider.model.config.num_hidden_layers}, "
+        f"exited early: {early_exit_metrics['exited_early_fraction']:.4f}"
+    )
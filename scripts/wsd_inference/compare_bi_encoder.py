@@ -0,0 +1,66 @@
+"""
+Compares the accuracy and latency of the bi-encoder engine
+with the ESR cross-encoder on SemCor-format data. The evaluation is saved next
+to the sense embeddings, the bi-encoder engine only starts if it loses at most
+BI_ENCODER_MAX_ACCURACY_DROP accuracy.
+
+Build the sense embeddings first:
+python -m smart_word_hints_api.app.bi_encoder_sense_provider distilroberta-base
+
+Run from the repository root:
+PYTHONPATH=. python scripts/wsd_inference/compare_bi_encoder.py \
+    --xml ALL.data.xml --gold_keys ALL.gold.key.txt
+"""
+import argparse
+
+from semcor_eval import (
+    evaluate,
+    format_result,
+    get_agreement_rate,
+    load_semcor_documents,
+)
+
+from smart_word_hints_api.app.bi_encoder_sense_provider import (
+    BiEncoderSenseProvider,
+    check_evaluation,
+    get_sense_embeddings_dir,
+    save_evaluation,
+)
+from smart_word_hints_api.app.esr_sense_provider import ESRSenseProvider
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--xml", required=True)
+    parser.add_argument("--gold_keys", required=True)
+    parser.add_argument("--model_name", default="distilroberta-base")
+    args = parser.parse_args()
+
+    documents = load_semcor_documents(args.xml, args.gold_keys)
+
+    cross_encoder_result = evaluate(
+        ESRSenseProvider(args.model_name, max_batch_examples=64), documents
+    )
+    print(format_result(f"cross-encoder {args.model_name}", cross_encoder_result))
+
+    bi_encoder_result = evaluate(
+        BiEncoderSenseProvider(args.model_name, require_evaluation=False), documents
+    )
+    print(format_result(f"bi-encoder {args.model_name}", bi_encoder_result))
+
+    agreement_rate = get_agreement_rate(
+        cross_encoder_result.predictions, bi_encoder_result.predictions
+    )
+    print(f"agreement with the cross-encoder: {agreement_rate:.4f}")
+
+    embeddings_dir = get_sense_embeddings_dir(args.model_name)
+    save_evaluation(
+        embeddings_dir,
+        cross_encoder_result.accuracy,
+        bi_encoder_result.accuracy,
+        agreement_rate,
+    )
+    try:
+        check_evaluation(embeddings_dir)
+        print("the bi-encoder engine can be selected")
+    except ValueError as e:
+        print(e)
@@ -0,0 +1,64 @@
+"""
+Compares the cascade (wsd_engine = cascade: distilroberta-base first, the tokens
+with a low margin between the two best senses escalated to a larger model)
+with each of the two models alone on held-out SemCor-format data:
+accuracy, latency and the escalation rate for a few margins.
+
+Run from the repository root:
+PYTHONPATH=. python scripts/wsd_inference/evaluate_cascade.py \
+    --xml ALL.data.xml --gold_keys ALL.gold.key.txt
+"""
+import argparse
+
+from semcor_eval import (
+    evaluate,
+    format_result,
+    get_agreement_rate,
+    load_semcor_documents,
+)
+
+from smart_word_hints_api.app.cascade_sense_provider import CascadeSenseProvider
+from smart_word_hints_api.app.esr_sense_provider import ESRSenseProvider
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--xml", required=True)
+    parser.add_argument("--gold_keys", required=True)
+    parser.add_argument("--first_model_name", default="distilroberta-base")
+    parser.add_argument("--escalation_model_name", default="roberta-large")
+    parser.add_argument(
+        "--margins", type=float, nargs="+", default=[0.05, 0.1, 0.2, 0.3, 0.5]
+    )
+    args = parser.parse_args()
+
+    documents = load_semcor_documents(args.xml, args.gold_keys)
+
+    first_sense_provider = ESRSenseProvider(
+        args.first_model_name, max_batch_examples=64
+    )
+    escalation_sense_provider = ESRSenseProvider(
+        args.escalation_model_name, max_batch_examples=64
+    )
+
+    print(
+        format_result(args.first_model_name, evaluate(first_sense_provider, documents))
+    )
+    escalation_result = evaluate(escalation_sense_provider, documents)
+    print(format_result(args.escalation_model_name, escalation_result))
+
+    for margin in args.margins:
+        cascade_sense_provider = CascadeSenseProvider(
+            first_sense_provider, escalation_sense_provider, escalation_margin=margin
+        )
+        cascade_result = evaluate(cascade_sense_provider, documents)
+        escalation_rate = cascade_sense_provider.get_metrics()["cascade"][
+            "escalation_rate"
+        ]
+        agreement_rate = get_agreement_rate(
+            escalation_result.predictions, cascade_result.predictions
+        )
+        print(format_result(f"cascade, margin {margin}", cascade_result))
+        print(
+            f"{'':>30}  escalation rate {escalation_rate:.4f}, "
+            f"agreement with {args.escalation_model_name} {agreement_rate:.4f}"
+        )
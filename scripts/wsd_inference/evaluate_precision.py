@@ -0,0 +1,67 @@
+"""
+Compares the int8 dynamically quantized model (wsd_precision = int8) and
+the bfloat16 model (wsd_precision = bf16) with the fp32 model on held-out
+SemCor-format data: accuracy, agreement rate, latency and the size of the weights.
+
+Run from the repository root:
+PYTHONPATH=. python scripts/wsd_inference/evaluate_precision.py \
+    --xml ALL.data.xml --gold_keys ALL.gold.key.txt --precisions int8 bf16
+"""
+import argparse
+import io
+
+import torch
+from semcor_eval import (
+    evaluate,
+    format_result,
+    get_agreement_rate,
+    load_semcor_documents,
+)
+
+from smart_word_hints_api.app.constants import (
+    WSD_PRECISION_BF16,
+    WSD_PRECISION_FP32,
+    WSD_PRECISION_INT8,
+)
+from smart_word_hints_api.app.esr_sense_provider import ESRSenseProvider
+
+
+def get_serialized_size_mb(model: torch.nn.Module) -> float:
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.getbuffer().nbytes / 1024 / 1024
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--xml", required=True)
+    parser.add_argument("--gold_keys", required=True)
+    parser.add_argument("--model_name", default="distilroberta-base")
+    parser.add_argument(
+        "--precisions",
+        nargs="+",
+        default=[WSD_PRECISION_INT8, WSD_PRECISION_BF16],
+    )
+    args = parser.parse_args()
+
+    documents = load_semcor_documents(args.xml, args.gold_keys)
+
+    results = {}
+    for precision in [WSD_PRECISION_FP32, *args.precisions]:
+        sense_provider = ESRSenseProvider(
+            args.model_name, precision=precision, max_batch_examples=64
+        )
+        if sense_provider.precision != precision:
+            print(f"{precision} is not supported here, skipping")
+            continue
+        results[precision] = evaluate(sense_provider, documents)
+        print(format_result(f"{args.model_name} {precision}", results[precision]))
+        print(f"{'weights':>30}: {get_serialized_size_mb(sense_provider.model):.0f} MB")
+
+    for precision in args.precisions:
+        if precision not in results:
+            continue
+        agreement_rate = get_agreement_rate(
+            results[WSD_PRECISION_FP32].predictions, results[precision].predictions
+        )
+        print(f"{precision} vs fp32 agreement rate: {agreement_rate:.4f}")
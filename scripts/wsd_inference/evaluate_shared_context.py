@@ -0,0 +1,46 @@
+"""
+Compares the accuracy and latency of the shared-context engine (the context
+encoded once per instance, followed by all the candidate glosses)
+with the ESR cross-encoder on SemCor-format data.
+
+Run from the repository root:
+PYTHONPATH=. python scripts/wsd_inference/evaluate_shared_context.py \
+    --xml ALL.data.xml --gold_keys ALL.gold.key.txt
+"""
+import argparse
+
+from semcor_eval import (
+    evaluate,
+    format_result,
+    get_agreement_rate,
+    load_semcor_documents,
+)
+
+from smart_word_hints_api.app.esr_sense_provider import ESRSenseProvider
+from smart_word_hints_api.app.shared_context_sense_provider import (
+    SharedContextSenseProvider,
+)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--xml", required=True)
+    parser.add_argument("--gold_keys", required=True)
+    parser.add_argument("--model_name", default="distilroberta-base")
+    args = parser.parse_args()
+
+    documents = load_semcor_documents(args.xml, args.gold_keys)
+
+    cross_encoder_result = evaluate(
+        ESRSenseProvider(args.model_name, max_batch_examples=64), documents
+    )
+    print(format_result(f"cross-encoder {args.model_name}", cross_encoder_result))
+
+    shared_context_result = evaluate(
+        SharedContextSenseProvider(args.model_name, max_batch_tokens=8192), documents
+    )
+    print(format_result(f"shared-context {args.model_name}", shared_context_result))
+
+    agreement_rate = get_agreement_rate(
+        cross_encoder_result.predictions, shared_context_result.predictions
+    )
+    print(f"agreement with the cross-encoder: {agreement_rate:.4f}")
@@ -0,0 +1,80 @@
+"""
+Compares the model with the trimmed vocabulary (wsd_trimmed_vocab = yes)
+with the full vocabulary on SemCor-format data: the memory of the weights,
+the fraction of the input tokens outside of the trimmed vocabulary (embedded
+as <unk>), the accuracy, latency and agreement of the predictions.
+
+Build the trimmed vocabulary first:
+python -m smart_word_hints_api.app.vocab_trimming distilroberta-base
+
+Run from the repository root:
+PYTHONPATH=. python scripts/wsd_inference/evaluate_vocab_trimming.py \
+    --xml ALL.data.xml --gold_keys ALL.gold.key.txt
+"""
+import argparse
+
+import numpy as np
+from semcor_eval import (
+    SemcorDocument,
+    evaluate,
+    format_result,
+    get_agreement_rate,
+    load_semcor_documents,
+)
+
+from smart_word_hints_api.app.esr_sense_provider import ESRSenseProvider
+
+
+def get_fallback_token_rate(
+    sense_provider: ESRSenseProvider, documents: list[SemcorDocument]
+) -> float:
+    fallback_tokens = 0
+    total_tokens = 0
+    for document in documents:
+        for example in sense_provider.input_builder.build_examples(
+            document.tokens, sorted(document.token_i__to__gold_keys)
+        ):
+            total_tokens += len(example)
+            fallback_tokens += np.count_nonzero(
+                ~np.isin(example.input_ids, sense_provider.trimmed_vocab)
+            )
+    return fallback_tokens / max(total_tokens, 1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--xml", required=True)
+    parser.add_argument("--gold_keys", required=True)
+    parser.add_argument("--model_name", default="distilroberta-base")
+    args = parser.parse_args()
+
+    documents = load_semcor_documents(args.xml, args.gold_keys)
+
+    full_vocab_provider = ESRSenseProvider(args.model_name, max_batch_examples=64)
+    trimmed_vocab_provider = ESRSenseProvider(
+        args.model_name, max_batch_examples=64, trimmed_vocab=True
+    )
+    if trimmed_vocab_provider.trimmed_vocab is None:
+        raise SystemExit(f"The trimmed vocabulary of {args.model_name} isn't built")
+
+    full_vocab_memory_mb = full_vocab_provider.get_model_memory_mb()
+    trimmed_vocab_memory_mb = trimmed_vocab_provider.get_model_memory_mb()
+    print(
+        f"kept {len(trimmed_vocab_provider.trimmed_vocab)} "
+        f"of {full_vocab_provider.config.vocab_size} tokens, weights "
+        f"{full_vocab_memory_mb:.0f} MB -> {trimmed_vocab_memory_mb:.0f} MB "
+        f"(saved {full_vocab_memory_mb - trimmed_vocab_memory_mb:.0f} MB)"
+    )
+    print(
+        f"input tokens outside of the trimmed vocabulary: "
+        f"{get_fallback_token_rate(trimmed_vocab_provider, documents):.6f}"
+    )
+
+    full_vocab_result = evaluate(full_vocab_provider, documents)
+    print(format_result(f"full vocabulary {args.model_name}", full_vocab_result))
+    trimmed_vocab_result = evaluate(trimmed_vocab_provider, documents)
+    print(format_result(f"trimmed vocabulary {args.model_name}", trimmed_vocab_result))
+    agreement_rate = get_agreement_rate(
+        full_vocab_result.predictions, trimmed_vocab_result.predictions
+    )
+    print(f"agreement with the full vocabulary: {agreement_rate:.4f}")
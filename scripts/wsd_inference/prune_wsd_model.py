@@ -0,0 +1,244 @@
+"""
+Structured pruning of a WSD checkpoint (see smart_word_hints_api/app/pruning.py):
+1. the importance of each attention head (the gradient of the loss with respect
+   to a mask over the heads) and of each feed-forward neuron (its activation times
+   the gradient of the loss with respect to it) is accumulated over the gold
+   instances of SemCor-format documents,
+2. for each pruning level, that fraction of the least important heads (normalized
+   within each layer, at least one head is kept in each layer) and of the least
+   important feed-forward neurons of each layer is pruned,
+3. the parameters, accuracy and latency of each level are reported on held-out
+   documents (level 0 is the unpruned model).
+
+With --install_level, the model pruned at that level replaces the checkpoint
+(the original is kept as .unpruned.bin) and the files derived from the checkpoint
+(int8 cache, safetensors, ONNX model, early-exit heads) are removed, to be rebuilt.
+
+Run from the repository root:
+PYTHONPATH=. python scripts/wsd_inference/prune_wsd_model.py \
+    --xml semcor.data.xml --gold_keys semcor.gold.key.txt
+"""
+import argparse
+import copy
+import random
+import shutil
+
+import torch
+import torch.nn as nn
+from semcor_eval import SemcorDocument, evaluate, format_result, load_semcor_documents
+
+from smart_word_hints_api.app.distilroberta_for_wsd import DistilRobertaForWsd
+from smart_word_hints_api.app.early_exit import (
+    get_early_exit_heads_path,
+    get_exit_features,
+)
+from smart_word_hints_api.app.esr_sense_provider import (
+    ESRSenseProvider,
+    get_checkpoint_path,
+)
+from smart_word_hints_api.app.mmap_weights import get_safetensors_model_path
+from smart_word_hints_api.app.onnx_wsd_model import get_onnx_model_path
+from smart_word_hints_api.app.pruning import (
+    get_pruning_path,
+    load_pruning,
+    prune_model,
+    save_pruned_model,
+)
+from smart_word_hints_api.app.quantization import get_int8_model_path
+from smart_word_hints_api.app.wsd_batching import split_instances_into_micro_batches
+from smart_word_hints_api.app.wsd_input import collate_wsd_examples
+
+IMPORTANCE_BATCH_SIZE = 32
+PRUNING_LEVELS = [0.0, 0.1, 0.2, 0.3, 0.4, 0.5]
+
+
+def compute_importance(
+    sense_provider: ESRSenseProvider,
+    documents: list[SemcorDocument],
+    max_examples: int,
+) -> tuple[torch.Tensor, list[torch.Tensor]]:
+    """
+    Returns the importance of the heads [layers, heads] and of the feed-forward
+    neurons of each layer.
+    """
+    model = sense_provider.model
+    config = model.config
+    head_mask = torch.ones(
+        config.num_hidden_layers, config.num_attention_heads, requires_grad=True
+    )
+    head_importance = torch.zeros(head_mask.shape)
+    neuron_importance = [
+        torch.zeros(layer.intermediate.dense.out_features)
+        for layer in model.roberta.encoder.layer
+    ]
+    activations: list[torch.Tensor] = []
+
+    def keep_activation(module, inputs, output):
+        output.retain_grad()
+        activations.append(output)
+
+    hooks = [
+        layer.intermediate.register_forward_hook(keep_activation)
+        for layer in model.roberta.encoder.layer
+    ]
+    model.requires_grad_(False)
+    examples_count = 0
+    for document in documents:
+        examples = sense_provider.input_builder.build_examples(
+            document.tokens, sorted(document.token_i__to__gold_keys)
+        )
+        for micro_batch in split_instances_into_micro_batches(
+            examples, IMPORTANCE_BATCH_SIZE
+        ):
+            micro_batch_examples = [examples[example_i] for example_i in micro_batch]
+            batch = collate_wsd_examples(
+                micro_batch_examples, sense_provider.tokenizer.pad_token_id
+            )
+            labels = torch.tensor(
+                [
+                    int(
+                        example.sense_key
+                        in document.token_i__to__gold_keys[example.instance_id]
+                    )
+                    for example in micro_batch_examples
+                ]
+            )
+            activations.clear()
+            hidden_states = model.roberta(
+                batch["input_ids"],
+                attention_mask=batch["attention_mask"],
+                head_mask=head_mask,
+            )[0]
+            logits = model.classifier(
+                get_exit_features(
+                    model, hidden_states, batch["instance_mask"], batch["instance_lens"]
+                )
+            )
+            nn.functional.cross_entropy(logits, labels, reduction="sum").backward()
+            head_importance += head_mask.grad.abs()
+            head_mask.grad = None
+            for layer_importance, activation in zip(neuron_importance, activations):
+                layer_importance += (activation * activation.grad).abs().sum(dim=(0, 1))
+            examples_count += len(micro_batch_examples)
+        if examples_count >= max_examples:
+            break
+    for hook in hooks:
+        hook.remove()
+    head_importance /= head_importance.norm(dim=1, keepdim=True)
+    return head_importance, neuron_importance
+
+
+def get_heads_to_prune(
+    head_importance: torch.Tensor, level: float
+) -> dict[int, list[int]]:
+    num_layers, num_heads = head_importance.shape
+    layer__to__heads_to_prune: dict[int, list[int]] = {}
+    heads_left_to_prune = int(level * head_importance.numel())
+    for head_i in head_importance.flatten().argsort().tolist():
+        if not heads_left_to_prune:
+            break
+        layer_i, head = divmod(head_i, num_heads)
+        heads_to_prune = layer__to__heads_to_prune.setdefault(layer_i, [])
+        if len(heads_to_prune) < num_heads - 1:
+            heads_to_prune.append(head)
+            heads_left_to_prune -= 1
+    return layer__to__heads_to_prune
+
+
+def get_neurons_to_keep(
+    neuron_importance: list[torch.Tensor], level: float
+) -> dict[int, list[int]]:
+    return {
+        layer_i: layer_importance.argsort(descending=True)[
+            : max(1, round(len(layer_importance) * (1 - level)))
+        ].tolist()
+        for layer_i, layer_importance in enumerate(neuron_importance)
+    }
+
+
+def get_pruned_model(
+    model: DistilRobertaForWsd,
+    head_importance: torch.Tensor,
+    neuron_importance: list[torch.Tensor],
+    level: float,
+) -> DistilRobertaForWsd:
+    pruned_model = copy.deepcopy(model)
+    if level:
+        prune_model(
+            pruned_model,
+            get_heads_to_prune(head_importance, level),
+            get_neurons_to_keep(neuron_importance, level),
+        )
+    return pruned_model
+
+
+def install_pruned_model(model_name: str, pruned_model: DistilRobertaForWsd) -> None:
+    checkpoint_path = get_checkpoint_path(model_name)
+    shutil.copy2(checkpoint_path, checkpoint_path.with_suffix(".unpruned.bin"))
+    save_pruned_model(pruned_model, checkpoint_path, get_pruning_path(model_name))
+    for derived_path in [
+        get_int8_model_path(model_name),
+        get_safetensors_model_path(model_name),
+        get_onnx_model_path(model_name),
+        get_early_exit_heads_path(model_name),
+    ]:
+        if derived_path.exists():
+            derived_path.unlink()
+            print(f"removed {derived_path}, rebuild it for the pruned model")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--xml", required=True)
+    parser.add_argument("--gold_keys", required=True)
+    parser.add_argument(
+        "--model_name",
+        default="distilroberta-base",
+        choices=["distilroberta-base", "roberta-base"],
+    )
+    parser.add_argument("--levels", type=float, nargs="+", default=PRUNING_LEVELS)
+    parser.add_argument("--max_importance_examples", type=int, default=20000)
+    parser.add_argument("--eval_fraction", type=float, default=0.2)
+    parser.add_argument("--install_level", type=float)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if load_pruning(args.model_name) is not None:
+        raise SystemExit(
+            f"The checkpoint of {args.model_name} is already pruned, restore "
+            f"the .unpruned.bin copy and remove {get_pruning_path(args.model_name)}"
+        )
+
+    documents = load_semcor_documents(args.xml, args.gold_keys)
+    random.Random(args.seed).shuffle(documents)
+    eval_documents_count = int(len(documents) * args.eval_fraction)
+    eval_documents = documents[:eval_documents_count]
+    importance_documents = documents[eval_documents_count:]
+
+    sense_provider = ESRSenseProvider(args.model_name, max_batch_examples=64)
+    model = sense_provider.model
+    head_importance, neuron_importance = compute_importance(
+        sense_provider, importance_documents, args.max_importance_examples
+    )
+
+    for level in args.levels:
+        sense_provider.model = get_pruned_model(
+            model, head_importance, neuron_importance, level
+        )
+        parameters = sum(
+            parameter.numel() for parameter in sense_provider.model.parameters()
+        )
+        result = evaluate(sense_provider, eval_documents)
+        print(
+            format_result(f"pruned {level:.0%}", result)
+            + f", {parameters / 1e6:.1f}M parameters"
+        )
+
+    if args.install_level is not None:
+        install_pruned_model(
+            args.model_name,
+            get_pruned_model(
+                model, head_importance, neuron_importance, args.install_level
+            ),
+        )
+        print(f"installed the model pruned at {args.install_level:.0%}")
@@ -0,0 +1,150 @@
+"""
+Evaluation of the sense providers on SemCor-format data, i.e. the XML + gold key
+files of the WSD evaluation framework (Raganato et al., 2017), for example
+SemCor itself or the held-out ALL / SemEval sets.
+"""
+from __future__ import annotations
+
+import statistics
+import time
+from dataclasses import dataclass, field
+from typing import Protocol
+from xml.etree import ElementTree as ET
+
+WSD_XML_POS__TO__TAG = {"NOUN": "NN", "VERB": "VB", "ADJ": "JJ", "ADV": "RB"}
+
+
+@dataclass
+class SemcorToken:
+    """
+    Has the subset of TokenEN's interface used by the sense providers.
+    """
+
+    text: str
+    lemma: str
+    tag: str
+    sent_start: bool
+
+    @property
+    def lemma_extended(self) -> str:
+        return self.lemma
+
+    def is_sent_start(self) -> bool:
+        return self.sent_start
+
+
+@dataclass
+class SemcorDocument:
+    """
+    Has the subset of TextHolderEN's interface used by the sense providers.
+    """
+
+    tokens: list[SemcorToken] = field(default_factory=list)
+    token_i__to__gold_keys: dict[int, set[str]] = field(default_factory=dict)
+
+
+class SenseProvider(Protocol):
+    def get_sense_keys(
+        self, text_holder: SemcorDocument, token_indexes_to_disambiguate: list[int]
+    ) -> dict[int, str]:
+        ...
+
+
+def load_semcor_documents(
+    xml_path: str, gold_key_path: str, max_sentences_per_document: int = 20
+) -> list[SemcorDocument]:
+    """
+    Long texts are split into documents of at most max_sentences_per_document
+    sentences, which is closer to the size of a single API request.
+    """
+    instance_id__to__gold_keys: dict[str, set[str]] = {}
+    with open(gold_key_path, "r") as f:
+        for line in f.read().splitlines():
+            instance_id, *gold_keys = line.split()
+            instance_id__to__gold_keys[instance_id] = set(gold_keys)
+
+    documents: list[SemcorDocument] = []
+    for text_element in ET.parse(xml_path).getroot():
+        for sentence_i, sentence_element in enumerate(text_element):
+            if sentence_i % max_sentences_per_document == 0:
+                documents.append(SemcorDocument())
+            document = documents[-1]
+            for word_i, word_element in enumerate(sentence_element):
+                pos = word_element.get("pos", "")
+                if (
+                    word_element.tag == "instance"
+                    and word_element.get("id") in instance_id__to__gold_keys
+                ):
+                    document.token_i__to__gold_keys[
+                        len(document.tokens)
+                    ] = instance_id__to__gold_keys[word_element.get("id")]
+                document.tokens.append(
+                    SemcorToken(
+                        text=word_element.text or "",
+                        lemma=word_element.get("lemma", ""),
+                        tag=WSD_XML_POS__TO__TAG.get(pos, pos),
+                        sent_start=word_i == 0,
+                    )
+                )
+    return documents
+
+
+@dataclass
+class EvaluationResult:
+    predictions: list[dict[int, str]]
+    accuracy: float
+    median_latency_ms: float
+    total_time_s: float
+
+
+def evaluate(
+    sense_provider: SenseProvider, documents: list[SemcorDocument]
+) -> EvaluationResult:
+    """
+    Accuracy is the fraction of gold instances whose predicted sense key
+    is one of the gold keys (a missing prediction counts as an error).
+    """
+    predictions: list[dict[int, str]] = []
+    latencies_ms: list[float] = []
+    correct = 0
+    total = 0
+    for document in documents:
+        instances = sorted(document.token_i__to__gold_keys)
+        start = time.perf_counter()
+        document_predictions = sense_provider.get_sense_keys(document, instances)
+        latencies_ms.append((time.perf_counter() - start) * 1000)
+        predictions.append(document_predictions)
+        for token_i, gold_keys in document.token_i__to__gold_keys.items():
+            total += 1
+            correct += document_predictions.get(token_i) in gold_keys
+    return EvaluationResult(
+        predictions=predictions,
+        accuracy=correct / max(total, 1),
+        median_latency_ms=statistics.median(latencies_ms) if latencies_ms else 0.0,
+        total_time_s=sum(latencies_ms) / 1000,
+    )
+
+
+def get_agreement_rate(
+    predictions_a: list[dict[int, str]], predictions_b: list[dict[int, str]]
+) -> float:
+    """
+    The fraction of instances predicted by a for which b predicts the same sense.
+    """
+    same = 0
+    total = 0
+    for document_predictions_a, document_predictions_b in zip(
+        predictions_a, predictions_b
+    ):
+        for token_i, sense_key in document_predictions_a.items():
+            total += 1
+            same += document_predictions_b.get(token_i) == sense_key
+    return same / max(total, 1)
+
+
+def format_result(name: str, result: EvaluationResult) -> str:
+    return (
+        f"{name:>30}: accuracy {result.accuracy:.4f}, "
+        f"median latency per document {result.median_latency_ms:.1f} ms, "
+        f"total {result.total_time_s:.1f} s"
+    )
@@ -0,0 +1,44 @@
+"""
+Accuracy vs latency of the cross-encoder when only the K most frequent candidate
+senses of each token are scored (wsd_max_candidate_senses in config.ini),
+for a few values of K, on held-out SemCor-format data.
+
+Run from the repository root:
+PYTHONPATH=. python scripts/wsd_inference/sweep_candidate_senses.py \
+    --xml ALL.data.xml --gold_keys ALL.gold.key.txt
+"""
+import argparse
+
+from semcor_eval import evaluate, format_result, load_semcor_documents
+
+from smart_word_hints_api.app.difficulty_rankings import DifficultyRankingEN
+from smart_word_hints_api.app.esr_sense_provider import ESRSenseProvider
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--xml", required=True)
+    parser.add_argument("--gold_keys", required=True)
+    parser.add_argument("--model_name", default="distilroberta-base")
+    parser.add_argument("--ks", type=int, nargs="+", default=[2, 3, 4, 6, 8, 12])
+    args = parser.parse_args()
+
+    documents = load_semcor_documents(args.xml, args.gold_keys)
+    sense_key__to__ranking_score = DifficultyRankingEN().sense_key__to__ranking_score
+
+    for k in [None, *args.ks]:
+        sense_provider = ESRSenseProvider(
+            args.model_name,
+            max_batch_examples=64,
+            max_candidate_senses=k,
+            sense_key__to__ranking_score=sense_key__to__ranking_score,
+        )
+        number_of_examples = sum(
+            len(
+                sense_provider.input_builder.build_examples(
+                    document.tokens, sorted(document.token_i__to__gold_keys)
+                )
+            )
+            for document in documents
+        )
+        print(format_result(f"K = {k}", evaluate(sense_provider, documents)))
+        print(f"{'':>30}  {number_of_examples} scored (context, sense) pairs")
@@ -0,0 +1,50 @@
+"""
+bfloat16 CPU inference of the WSD models (wsd_precision = bf16 in config.ini).
+
+The weights and activations of the roberta encoder are in bfloat16, which halves
+their memory and memory bandwidth. The pooling, the classifier and the softmax
+stay in float32, so that close probabilities of the candidate senses are still
+compared at full precision.
+"""
+from __future__ import annotations
+
+import logging
+
+import torch
+import torch.nn as nn
+
+logger = logging.getLogger(__name__)
+
+
+def is_bfloat16_supported() -> bool:
+    """
+    Whether the CPU has native bfloat16 support in oneDNN (AVX512-BF16 / AMX,
+    or AVX512 with conversions). Elsewhere bfloat16 is emulated and slower
+    than float32.
+    """
+    return torch.backends.mkldnn.is_available() and bool(
+        torch.ops.mkldnn._is_mkldnn_bf16_supported()
+    )
+
+
+class Bfloat16Encoder(nn.Module):
+    """
+    Runs the wrapped encoder in bfloat16 and returns its outputs in float32.
+    """
+
+    def __init__(self, encoder: nn.Module) -> None:
+        super().__init__()
+        self.encoder = encoder.to(torch.bfloat16)
+
+    def forward(
+        self, input_ids: torch.Tensor, attention_mask: torch.Tensor
+    ) -> tuple[torch.Tensor, torch.Tensor]:
+        last_hidden_state, pooler_output = self.encoder(
+            input_ids, attention_mask=attention_mask, return_dict=False
+        )[:2]
+        return last_hidden_state.float(), pooler_output.float()
+
+
+def to_bfloat16_model(model: nn.Module) -> nn.Module:
+    model.roberta = Bfloat16Encoder(model.roberta)
+    return model
@@ -0,0 +1,297 @@
+"""
+Bi-encoder inference: the glosses of all WordNet synsets are embedded offline
+with the encoder of the WSD model, at request time each sentence is encoded once
+and the candidate senses are scored with a dot product.
+
+The encoder is the one of the cross-encoder, it wasn't trained for dot-product
+retrieval. So the engine only starts once the sense embeddings were evaluated
+against the cross-encoder and lose at most BI_ENCODER_MAX_ACCURACY_DROP accuracy.
+
+Build the sense embeddings, then evaluate them (which saves the evaluation next
+to them) before switching wsd_engine to bi-encoder:
+python -m smart_word_hints_api.app.bi_encoder_sense_provider distilroberta-base
+PYTHONPATH=. python scripts/wsd_inference/compare_bi_encoder.py \
+    --xml ALL.data.xml --gold_keys ALL.gold.key.txt
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+
+import numpy as np
+import torch
+from nltk.corpus import wordnet as wn
+
+from smart_word_hints_api.app.constants import (
+    BI_ENCODER_MAX_ACCURACY_DROP,
+    EN_SENSE_EMBEDDINGS_RELATIVE_PATH,
+    SENSE_EMBEDDINGS_BUILD_BATCH_SIZE,
+    SENSE_EMBEDDINGS_EVALUATION_FILENAME,
+    SENSE_EMBEDDINGS_FILENAME,
+    SENSE_EMBEDDINGS_SENSE_KEYS_FILENAME,
+    WSD_BACKEND_TORCH,
+)
+from smart_word_hints_api.app.esr_sense_provider import ESRModels, ESRSenseProvider
+from smart_word_hints_api.app.wsd_batching import split_into_micro_batches
+from smart_word_hints_api.app.wsd_input import (
+    get_synset_gloss,
+    split_into_sentences,
+)
+
+if TYPE_CHECKING:
+    from smart_word_hints_api.app.text_holder import TextHolderEN
+
+
+@dataclass
+class BiEncoderContext:
+    """
+    A sentence (or a window of it) with the spans of the instances
+    in its input_ids.
+    """
+
+    input_ids: list[int]
+    instance_spans: list[tuple[int, int]]
+
+    def __len__(self) -> int:
+        return len(self.input_ids)
+
+
+def get_sense_embeddings_dir(model_name: str) -> Path:
+    return Path(__file__).parent / EN_SENSE_EMBEDDINGS_RELATIVE_PATH / model_name
+
+
+def save_evaluation(
+    embeddings_dir: Path,
+    cross_encoder_accuracy: float,
+    bi_encoder_accuracy: float,
+    agreement_rate: float,
+) -> None:
+    with open(embeddings_dir / SENSE_EMBEDDINGS_EVALUATION_FILENAME, "w") as f:
+        json.dump(
+            {
+                "cross_encoder_accuracy": cross_encoder_accuracy,
+                "bi_encoder_accuracy": bi_encoder_accuracy,
+                "agreement_rate": agreement_rate,
+            },
+            f,
+        )
+
+
+def check_evaluation(embeddings_dir: Path) -> None:
+    """
+    Raises ValueError unless the sense embeddings were evaluated against
+    the cross-encoder and lose at most BI_ENCODER_MAX_ACCURACY_DROP accuracy.
+    """
+    evaluation_path = embeddings_dir / SENSE_EMBEDDINGS_EVALUATION_FILENAME
+    if not evaluation_path.exists():
+        raise ValueError(
+            f"The sense embeddings in {embeddings_dir} weren't evaluated against "
+            "the cross-encoder, run scripts/wsd_inference/compare_bi_encoder.py"
+        )
+    with open(evaluation_path, "r") as f:
+        evaluation = json.load(f)
+    accuracy_drop = (
+        evaluation["cross_encoder_accuracy"] - evaluation["bi_encoder_accuracy"]
+    )
+    if accuracy_drop > BI_ENCODER_MAX_ACCURACY_DROP:
+        raise ValueError(
+            f"The bi-encoder is {accuracy_drop:.4f} less accurate than the "
+            f"cross-encoder (at most {BI_ENCODER_MAX_ACCURACY_DROP} allowed), "
+            f"see {evaluation_path}"
+        )
+
+
+class BiEncoderSenseProvider(ESRSenseProvider):
+    def __init__(
+        self, model_name: ESRModels, require_evaluation: bool = True, **kwargs
+    ) -> None:
+        """
+        require_evaluation is only turned off to evaluate the sense embeddings.
+        """
+        embeddings_dir = get_sense_embeddings_dir(model_name)
+        if require_evaluation:
+            check_evaluation(embeddings_dir)
+        super().__init__(model_name, **kwargs)
+        if self.backend != WSD_BACKEND_TORCH:
+            raise ValueError("The bi-encoder engine needs the torch backend")
+        self.sense_embeddings: np.ndarray = np.load(
+            embeddings_dir / SENSE_EMBEDDINGS_FILENAME, mmap_mode="r"
+        )
+        self.sense_key__to__row: dict[str, int] = {}
+        with open(embeddings_dir / SENSE_EMBEDDINGS_SENSE_KEYS_FILENAME, "r") as f:
+            for line in f.read().splitlines():
+                sense_key, row = line.split("\t")
+                self.sense_key__to__row[sense_key] = int(row)
+
+    def get_sense_keys(
+        self, text_holder: TextHolderEN, token_indexes_to_disambiguate: list[int]
+    ) -> dict[int, str]:
+        instances, contexts = self._build_contexts(
+            text_holder, token_indexes_to_disambiguate
+        )
+        if not instances:
+            return {}
+
+        context_embeddings = self._encode_instances(contexts)
+        result: dict[int, str] = {}
+        for token_i, context_embedding in zip(instances, context_embeddings):
+            sense_key = self._get_best_sense_key(
+                self.input_builder.get_candidate_sense_keys(
+                    text_holder.tokens[token_i]
+                ),
+                context_embedding,
+            )
+            if sense_key is not None:
+                result[token_i] = sense_key
+        return result
+
+    def get_sense_scores(
+        self, text_holder: TextHolderEN, token_indexes_to_disambiguate: list[int]
+    ) -> dict[int, dict[str, float]]:
+        """
+        The dot products aren't probabilities, so they can't stand in for the
+        cross-encoder scores (e.g. in the cascade, against its escalation margin).
+        """
+        raise NotImplementedError(
+            "The bi-encoder only predicts sense keys, use the cross-encoder "
+            "for sense scores"
+        )
+
+    def get_sense_keys_via_xml(
+        self, text_holder: TextHolderEN, token_indexes_to_disambiguate: list[int]
+    ) -> dict[int, str]:
+        raise NotImplementedError("The XML route runs the cross-encoder")
+
+    def _build_contexts(
+        self, text_holder: TextHolderEN, token_indexes_to_disambiguate: list[int]
+    ) -> tuple[list[int], list[BiEncoderContext]]:
+        """
+        Returns the instances in the order of their spans in the contexts.
+        A sentence is a single context, unless it's too long: then, like in
+        the cross-encoder, each instance gets a window of the sentence around it.
+        """
+        token_indexes_to_disambiguate_set = set(token_indexes_to_disambiguate)
+        instances: list[int] = []
+        contexts: list[BiEncoderContext] = []
+        for sentence in split_into_sentences(text_holder.tokens):
+            sentence_instances = [
+                token_i
+                for token_i in sentence
+                if token_i in token_indexes_to_disambiguate_set
+            ]
+            if not sentence_instances:
+                continue
+            context_ids, token_i__to__span = self.input_builder.encode_context(
+                [text_holder.tokens[token_i].text for token_i in sentence], sentence
+            )
+            sentence_context: Optional[BiEncoderContext] = None
+            for token_i in sentence_instances:
+                fitted_context_ids, (start, end) = self.input_builder.fit_context(
+                    context_ids, token_i__to__span[token_i]
+                )
+                input_ids = self.tokenizer.build_inputs_with_special_tokens(
+                    fitted_context_ids
+                )
+                if sentence_context is None or sentence_context.input_ids != input_ids:
+                    sentence_context = BiEncoderContext(input_ids, [])
+                    contexts.append(sentence_context)
+                # each context is preceded by a single <s> token
+                sentence_context.instance_spans.append((start + 1, end + 1))
+                instances.append(token_i)
+        return instances, contexts
+
+    def _encode_instances(self, contexts: list[BiEncoderContext]) -> torch.Tensor:
+        """
+        The contexts are encoded in micro-batches (like the cross-encoder examples),
+        each instance is represented by the mean of the outputs over its subword
+        tokens.
+        """
+        embeddings: list[torch.Tensor] = []
+        for micro_batch in split_into_micro_batches(
+            contexts, self.max_batch_examples, self.max_batch_tokens
+        ):
+            max_len = max(len(context) for context in micro_batch)
+            input_ids = torch.full(
+                (len(micro_batch), max_len),
+                self.tokenizer.pad_token_id,
+                dtype=torch.long,
+            )
+            attention_mask = torch.zeros((len(micro_batch), max_len), dtype=torch.long)
+            for context_i, context in enumerate(micro_batch):
+                input_ids[context_i, : len(context)] = torch.tensor(context.input_ids)
+                attention_mask[context_i, : len(context)] = 1
+            with torch.no_grad():
+                hidden_states = self.model.roberta(
+                    input_ids, attention_mask=attention_mask
+                )[0]
+            embeddings.extend(
+                hidden_states[context_i, start:end].mean(dim=0)
+                for context_i, context in enumerate(micro_batch)
+                for start, end in context.instance_spans
+            )
+        return torch.nn.functional.normalize(torch.stack(embeddings), dim=1)
+
+    def _get_best_sense_key(
+        self, candidate_sense_keys: list[str], context_embedding: torch.Tensor
+    ) -> str | None:
+        candidates = [
+            sense_key
+            for sense_key in candidate_sense_keys
+            if sense_key in self.sense_key__to__row
+        ]
+        if not candidates:
+            return None
+        candidate_embeddings = torch.from_numpy(
+            self.sense_embeddings[[self.sense_key__to__row[key] for key in candidates]]
+        ).float()
+        scores = candidate_embeddings @ context_embedding
+        return candidates[int(scores.argmax())]
+
+
+def build_sense_embeddings(model_name: ESRModels, embeddings_dir: Path) -> None:
+    """
+    A row per synset: the mean of the encoder outputs over the gloss tokens,
+    L2-normalized and stored as float16.
+    """
+    sense_provider = ESRSenseProvider(model_name)
+    sense_key__to__row: dict[str, int] = {}
+    glosses: list[str] = []
+    for synset in wn.all_synsets():
+        for lemma in synset.lemmas():
+            sense_key__to__row[lemma.key()] = len(glosses)
+        glosses.append(get_synset_gloss(synset))
+
+    embeddings = np.zeros((len(glosses), sense_provider.config.hidden_size), np.float16)
+    for start in range(0, len(glosses), SENSE_EMBEDDINGS_BUILD_BATCH_SIZE):
+        batch = sense_provider.tokenizer(
+            glosses[start : start + SENSE_EMBEDDINGS_BUILD_BATCH_SIZE],
+            padding=True,
+            return_tensors="pt",
+        )
+        with torch.no_grad():
+            hidden_states = sense_provider.model.roberta(**batch)[0]
+        mask = batch["attention_mask"].unsqueeze(2)
+        batch_embeddings = (hidden_states * mask).sum(dim=1) / mask.sum(dim=1)
+        embeddings[
+            start : start + len(batch_embeddings)
+        ] = torch.nn.functional.normalize(batch_embeddings, dim=1).numpy()
+
+    embeddings_dir.mkdir(parents=True, exist_ok=True)
+    # the evaluation was of the previous embeddings
+    (embeddings_dir / SENSE_EMBEDDINGS_EVALUATION_FILENAME).unlink(missing_ok=True)
+    np.save(embeddings_dir / SENSE_EMBEDDINGS_FILENAME, embeddings)
+    with open(embeddings_dir / SENSE_EMBEDDINGS_SENSE_KEYS_FILENAME, "w") as f:
+        for sense_key, row in sense_key__to__row.items():
+            f.write(f"{sense_key}\t{row}\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("model_names", nargs="+")
+    args = parser.parse_args()
+    for model_name in args.model_names:
+        build_sense_embeddings(model_name, get_sense_embeddings_dir(model_name))
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import threading
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from smart_word_hints_api.app.esr_sense_provider import ESRSenseProvider
+    from smart_word_hints_api.app.text_holder import TextHolderEN
+
+
+class CascadeSenseProvider:
+    """
+    Every token is first disambiguated with the (small) first sense provider.
+    Only the tokens for which the gap between the scores of the two best senses
+    is below escalation_margin are disambiguated again with the (large)
+    escalation sense provider.
+    """
+
+    def __init__(
+        self,
+        first_sense_provider: ESRSenseProvider,
+        escalation_sense_provider: ESRSenseProvider,
+        escalation_margin: float,
+    ) -> None:
+        self.first_sense_provider = first_sense_provider
+        self.escalation_sense_provider = escalation_sense_provider
+        self.escalation_margin = escalation_margin
+        self._metrics_lock = threading.Lock()
+        self._tokens = 0
+        self._escalated_tokens = 0
+
+    def get_sense_keys(
+        self, text_holder: TextHolderEN, token_indexes_to_disambiguate: list[int]
+    ) -> dict[int, str]:
+        token_i__to__sense_scores = self.first_sense_provider.get_sense_scores(
+            text_holder, token_indexes_to_disambiguate
+        )
+        token_indexes_to_escalate = [
+            token_i
+            for token_i, sense_scores in token_i__to__sense_scores.items()
+            if get_margin(sense_scores) < self.escalation_margin
+        ]
+        if token_indexes_to_escalate:
+            token_i__to__sense_scores.update(
+                self.escalation_sense_provider.get_sense_scores(
+                    text_holder, token_indexes_to_escalate
+                )
+            )
+
+        with self._metrics_lock:
+            self._tokens += len(token_i__to__sense_scores)
+            self._escalated_tokens += len(token_indexes_to_escalate)
+
+        return {
+            token_i: max(sense_scores, key=sense_scores.get)
+            for token_i, sense_scores in token_i__to__sense_scores.items()
+        }
+
+    def close(self) -> None:
+        self.first_sense_provider.close()
+        self.escalation_sense_provider.close()
+
+    def get_model_memory_mb(self) -> float:
+        return (
+            self.first_sense_provider.get_model_memory_mb()
+            + self.escalation_sense_provider.get_model_memory_mb()
+        )
+
+    def get_model_version(self) -> str:
+        return (
+            f"{self.first_sense_provider.get_model_version()}+"
+            f"{self.escalation_sense_provider.get_model_version()}:"
+            f"{self.escalation_margin}"
+        )
+
+    def get_metrics(self) -> dict[str, dict[str, float]]:
+        with self._metrics_lock:
+            metrics = {
+                "cascade": {
+                    "tokens": self._tokens,
+                    "escalated_tokens": self._escalated_tokens,
+                    "escalation_rate": (
+                        self._escalated_tokens / self._tokens if self._tokens else 0.0
+                    ),
+                }
+            }
+        for prefix, sense_provider in [
+            ("first", self.first_sense_provider),
+            ("escalation", self.escalation_sense_provider),
+        ]:
+            for name, provider_metrics in sense_provider.get_metrics().items():
+                metrics[f"{prefix}_{name}"] = provider_metrics
+        return metrics
+
+
+def get_margin(sense_scores: dict[str, float]) -> float:
+    """
+    The gap between the two best scores, infinite if there is a single candidate.
+    """
+    if len(sense_scores) < 2:
+        return float("inf")
+    best, second_best = sorted(sense_scores.values(), reverse=True)[:2]
+    return best - second_best
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+from typing import Callable
+
+import torch
+import torch.nn as nn
+
+from smart_word_hints_api.app.constants import (
+    WSD_COMPILE_INDUCTOR,
+    WSD_COMPILE_TORCHSCRIPT,
+    WSD_COMPILE_WARMUP_SHAPES,
+    WSD_MODEL_INPUT_NAMES,
+)
+from smart_word_hints_api.app.wsd_input import get_dummy_batch
+
+
+class CompiledWsdModel:
+    """
+    Wraps a WSD model in a graph captured with TorchScript (traced, frozen
+    and optimized for inference, which folds and fuses the pooling and classifier
+    ops) or with torch.compile (inductor), for inference only.
+
+    The compiled model is warmed up over representative batch shapes, so that
+    the specializations are done at startup rather than on the first requests.
+    """
+
+    def __init__(
+        self,
+        model: nn.Module,
+        compile_mode: str,
+        warmup_shapes: list[tuple[int, int]] = WSD_COMPILE_WARMUP_SHAPES,
+    ) -> None:
+        self.model = model.eval()
+        self.compile_mode = compile_mode
+        self._compiled = self._compile(self.model, compile_mode)
+        for batch_size, sequence_length in warmup_shapes:
+            self(**get_dummy_batch(batch_size, sequence_length))
+
+    @property
+    def roberta(self) -> nn.Module:
+        return self.model.roberta
+
+    @staticmethod
+    def _compile(model: nn.Module, compile_mode: str) -> Callable:
+        if compile_mode == WSD_COMPILE_TORCHSCRIPT:
+            example_batch = get_dummy_batch(batch_size=2, sequence_length=16)
+            with torch.no_grad():
+                traced = torch.jit.trace(
+                    model,
+                    tuple(example_batch[name] for name in WSD_MODEL_INPUT_NAMES),
+                    strict=False,
+                )
+            return torch.jit.optimize_for_inference(torch.jit.freeze(traced))
+        if compile_mode == WSD_COMPILE_INDUCTOR:
+            return torch.compile(model, dynamic=True)
+        raise ValueError(f"Unknown compile mode {compile_mode}")
+
+    def __call__(self, **batch: torch.Tensor) -> tuple[torch.Tensor]:
+        with torch.no_grad():
+            return self._compiled(*(batch[name] for name in WSD_MODEL_INPUT_NAMES))
@@ -7,6 +7,48 @@ EN_SIMPLE_DEFINITIONS_RELATIVE_PATH: str = "assets/simplified_definitions.csv"
 DISTILROBERTA_MODEL_RELATIVE_PATH: str = "assets/models/wsd_distilroberta.bin"
 ROBERTA_BASE_MODEL_RELATIVE_PATH: str = "assets/models/wsd_roberta_base.bin"
 ROBERTA_LARGE_MODEL_RELATIVE_PATH: str = "assets/models/wsd_roberta_large.bin"
+MODEL_NAME__TO__ONNX_MODEL_RELATIVE_PATH: dict[str, str] = {
+    "distilroberta-base": "assets/models/wsd_distilroberta.onnx",
+    "roberta-base": "assets/models/wsd_roberta_base.onnx",
+    "roberta-large": "assets/models/wsd_roberta_large.onnx",
+}
+MODEL_NAME__TO__INT8_MODEL_RELATIVE_PATH: dict[str, str] = {
+    "distilroberta-base": "assets/models/wsd_distilroberta.int8.pt",
+    "roberta-base": "assets/models/wsd_roberta_base.int8.pt",
+    "roberta-large": "assets/models/wsd_roberta_large.int8.pt",
+}
+MODEL_NAME__TO__SAFETENSORS_MODEL_RELATIVE_PATH: dict[str, str] = {
+    "distilroberta-base": "assets/models/wsd_distilroberta.safetensors",
+    "roberta-base": "assets/models/wsd_roberta_base.safetensors",
+    "roberta-large": "assets/models/wsd_roberta_large.safetensors",
+}
+MODEL_NAME__TO__EARLY_EXIT_HEADS_RELATIVE_PATH: dict[str, str] = {
+    "distilroberta-base": "assets/models/wsd_distilroberta.early_exit.pt",
+    "roberta-base": "assets/models/wsd_roberta_base.early_exit.pt",
+    "roberta-large": "assets/models/wsd_roberta_large.early_exit.pt",
+}
+MODEL_NAME__TO__PRUNING_RELATIVE_PATH: dict[str, str] = {
+    "distilroberta-base": "assets/models/wsd_distilroberta.pruning.json",
+    "roberta-base": "assets/models/wsd_roberta_base.pruning.json",
+    "roberta-large": "assets/models/wsd_roberta_large.pruning.json",
+}
+MODEL_NAME__TO__TRIMMED_VOCAB_RELATIVE_PATH: dict[str, str] = {
+    "distilroberta-base": "assets/models/wsd_distilroberta.vocab.npy",
+    "roberta-base": "assets/models/wsd_roberta_base.vocab.npy",
+    "roberta-large": "assets/models/wsd_roberta_large.vocab.npy",
+}
+WSD_MODEL_FILES_RELATIVE_PATH: str = "assets/models"
+EN_GLOSS_CACHE_RELATIVE_PATH: str = "assets/gloss_cache"
+EN_MONOSEMOUS_INDEX_RELATIVE_PATH: str = "assets/monosemous_senses.tsv"
+GLOSS_CACHE_IDS_FILENAME = "gloss_ids.npy"
+GLOSS_CACHE_OFFSETS_FILENAME = "offsets.npy"
+GLOSS_CACHE_SENSE_KEYS_FILENAME = "sense_keys.tsv"
+EN_SENSE_EMBEDDINGS_RELATIVE_PATH: str = "assets/sense_embeddings"
+SENSE_EMBEDDINGS_FILENAME = "embeddings.npy"
+SENSE_EMBEDDINGS_SENSE_KEYS_FILENAME = "sense_keys.tsv"
+SENSE_EMBEDDINGS_BUILD_BATCH_SIZE = 256
+SENSE_EMBEDDINGS_EVALUATION_FILENAME = "evaluation.json"
+BI_ENCODER_MAX_ACCURACY_DROP = 0.02
 
 MAX_FREQUENCY_RANKING_SCORE_TO_CONSIDER_AS_EASY = 2000
 
@@ -16,6 +58,32 @@ CONFIG_PROD_SECTION = "prod"
 CONFIG_DEBUG_SECTION = "debug"
 CONFIG_KEY_LAMBDAWARMER_SEND_METRIC = "lambdawarmer_send_metric"
 CONFIG_KEY_MODEL_NAME = "model_name"
+CONFIG_KEY_WSD_ENGINE = "wsd_engine"
+CONFIG_KEY_ASSERT_NO_NETWORK_AT_STARTUP = "assert_no_network_at_startup"
+CONFIG_KEY_SENSE_CACHE_MAX_SENTENCES = "sense_cache_max_sentences"
+CONFIG_KEY_SENSE_CACHE_BACKEND = "sense_cache_backend"
+CONFIG_KEY_SENSE_CACHE_SQLITE_PATH = "sense_cache_sqlite_path"
+CONFIG_KEY_SENSE_CACHE_TTL_HOURS = "sense_cache_ttl_hours"
+CONFIG_KEY_WSD_CASCADE_ESCALATION_MODEL_NAME = "wsd_cascade_escalation_model_name"
+CONFIG_KEY_WSD_CASCADE_ESCALATION_MARGIN = "wsd_cascade_escalation_margin"
+CONFIG_KEY_WSD_BACKEND = "wsd_backend"
+CONFIG_KEY_WSD_PRECISION = "wsd_precision"
+CONFIG_KEY_WSD_COMPILE = "wsd_compile"
+CONFIG_KEY_WSD_MAX_BATCH_EXAMPLES = "wsd_max_batch_examples"
+CONFIG_KEY_WSD_MAX_BATCH_TOKENS = "wsd_max_batch_tokens"
+CONFIG_KEY_WSD_MEMORY_BUDGET_MB = "wsd_memory_budget_mb"
+CONFIG_KEY_WSD_LENGTH_BUCKET_WIDTH = "wsd_length_bucket_width"
+CONFIG_KEY_WSD_PACKED_ROW_LENGTH = "wsd_packed_row_length"
+CONFIG_KEY_WSD_EARLY_EXIT = "wsd_early_exit"
+CONFIG_KEY_WSD_TRIMMED_VOCAB = "wsd_trimmed_vocab"
+CONFIG_KEY_WSD_MAX_CANDIDATE_SENSES = "wsd_max_candidate_senses"
+CONFIG_KEY_WSD_BATCH_SCHEDULER = "wsd_batch_scheduler"
+CONFIG_KEY_WSD_BATCH_SCHEDULER_MAX_WAIT_MS = "wsd_batch_scheduler_max_wait_ms"
+CONFIG_KEY_WSD_BATCH_SCHEDULER_MAX_BATCH_EXAMPLES = (
+    "wsd_batch_scheduler_max_batch_examples"
+)
+CONFIG_KEY_WSD_MODEL_POOL_MAX_MEMORY_MB = "wsd_model_pool_max_memory_mb"
+CONFIG_KEY_WSD_MODEL_POOL_PRELOAD = "wsd_model_pool_preload"
 
 EN: str = "english"
 PL: str = "polish"
@@ -109,6 +177,61 @@ TAG__TO__WSD_XML_EXPECTED_POS = {
 }
 DEFAULT_WSD_XML_EXPECTED_POS = ""
 
+WSD_XML_EXPECTED_POS__TO__WORDNET_POS = {
+    "NOUN": NOUN,
+    "VERB": VERB,
+    "ADJ": ADJ,
+    "ADV": ADV,
+}
+
+# max length of a context/gloss sequence, the same as the limit passed to WsdDataset
+WSD_SEQUENCE_LENGTH_LIMIT = 432
+
+# used to estimate the activation memory of a forward pass
+WSD_ACTIVATION_BYTES_PER_ELEMENT = 4
+WSD_BFLOAT16_ACTIVATION_BYTES_PER_ELEMENT = 2
+WSD_HIDDEN_STATES_PER_TOKEN = 6
+
+WSD_BATCH_SCHEDULER_DEFAULT_MAX_BATCH_EXAMPLES = 256
+
+WSD_ENGINE_CROSS_ENCODER = "cross-encoder"
+WSD_ENGINE_BI_ENCODER = "bi-encoder"
+WSD_ENGINE_CASCADE = "cascade"
+WSD_ENGINE_SHARED_CONTEXT = "shared-context"
+
+WSD_MODEL_TIER__TO__MODEL_NAME = {
+    "fast": "distilroberta-base",
+    "balanced": "roberta-base",
+    "best": "roberta-large",
+}
+
+WSD_BACKEND_TORCH = "torch"
+WSD_BACKEND_ONNX = "onnx"
+
+WSD_PRECISION_FP32 = "fp32"
+WSD_PRECISION_INT8 = "int8"
+WSD_PRECISION_BF16 = "bf16"
+
+SENSE_CACHE_BACKEND_MEMORY = "memory"
+SENSE_CACHE_BACKEND_SQLITE = "sqlite"
+SENSE_CACHE_EVICTION_INTERVAL_PUTS = 1000
+SENSE_CACHE_SQLITE_TIMEOUT_S = 5.0
+
+WSD_MODEL_INPUT_NAMES = (
+    "input_ids",
+    "attention_mask",
+    "token_type_ids",
+    "instance_mask",
+    "instance_lens",
+)
+ONNX_OPSET_VERSION = 14
+
+WSD_COMPILE_NONE = "none"
+WSD_COMPILE_TORCHSCRIPT = "torchscript"
+WSD_COMPILE_INDUCTOR = "inductor"
+# (batch size, sequence length)
+WSD_COMPILE_WARMUP_SHAPES = [(1, 32), (8, 64), (32, 64), (64, 96), (64, 128)]
+
 TRANSLATABLE_EN_POS = LEMMATIZABLE_EN_POS_TO_POS_SIMPLE.keys()
 
 UNIVERSAL_POS_VERB = "VERB"
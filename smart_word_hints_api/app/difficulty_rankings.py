@@ -13,6 +13,7 @@ class DifficultyRankingEN(object):
     def __init__(self) -> None:
         self.sense_key__to__ranking_score: dict[str, int] = {}
         self.lemma_pos__to__first_ranking_score: dict[tuple[str, str], int] = {}
+        self.lemma_pos__to__last_ranking_score: dict[tuple[str, str], int] = {}
         self.lemma__to__first_ranking_score: dict[str, int] = {}
 
         amalgum_freq_ranking_path = (
@@ -25,6 +26,9 @@ class DifficultyRankingEN(object):
                 self.lemma_pos__to__first_ranking_score.setdefault(
                     (row["lemma"].lower(), row["pos"]), i
                 )
+                self.lemma_pos__to__last_ranking_score[
+                    (row["lemma"].lower(), row["pos"])
+                ] = i
 
         naive_freq_ranking_path = (
             Path(__file__).parent / EN_FREQUENCY_RANKING_RELATIVE_PATH
@@ -46,3 +50,12 @@ class DifficultyRankingEN(object):
             return ranking_by_lemma_pos
 
         return self.lemma__to__first_ranking_score.get(lemma_lowercase)
+
+    def get_hardest_ranking_score(self, lemma: str, pos: str) -> int | None:
+        """
+        An upper bound on the ranking score of any sense of the lemma with the POS:
+        the ranking score of its least frequent sense in the AMALGUM list
+        (its senses missing from the list get the score of its most frequent one).
+        None if the lemma with the POS isn't in the list.
+        """
+        return self.lemma_pos__to__last_ranking_score.get((lemma.lower(), pos))
@@ -9,6 +9,9 @@ class DistilRobertaForWsd(RobertaPreTrainedModel):
         super().__init__(config)
         self.hidden_size = config.hidden_size
         self.roberta = RobertaModel(config)
+        # set on the checkpoints with pruned feed-forward neurons, see pruning.py
+        if getattr(config, "intermediate_sizes", None):
+            self._resize_feed_forward_layers(config.intermediate_sizes)
         self.dropout = nn.Dropout(config.hidden_dropout_prob)
         self.classifier = nn.Linear(config.hidden_size * 2, 2)
         self.criterion = nn.CrossEntropyLoss()
@@ -26,9 +29,16 @@ class DistilRobertaForWsd(RobertaPreTrainedModel):
         labels=None,
     ):
         outputs = self.roberta(input_ids, attention_mask=attention_mask)
-        instance_mask = instance_mask.unsqueeze(dim=2).repeat(1, 1, self.hidden_size)
-        instance_lens = instance_lens.unsqueeze(dim=1).repeat(1, self.hidden_size)
-        preds = (outputs[0] * instance_mask).sum(dim=1) / instance_lens
+        if labels is None and not torch.is_grad_enabled():
+            preds = self._pool_instances_in_place(
+                outputs[0], instance_mask, instance_lens
+            )
+        else:
+            instance_mask = instance_mask.unsqueeze(dim=2).repeat(
+                1, 1, self.hidden_size
+            )
+            instance_lens = instance_lens.unsqueeze(dim=1).repeat(1, self.hidden_size)
+            preds = (outputs[0] * instance_mask).sum(dim=1) / instance_lens
         preds = torch.cat((outputs[1], preds), dim=1)
         preds = self.dropout(preds)
         logits = self.classifier(preds)
@@ -37,3 +47,62 @@ class DistilRobertaForWsd(RobertaPreTrainedModel):
             return (self.criterion(logits, labels), probs[:, 1].contiguous())
         else:
             return (probs[:, 1].contiguous(),)
+
+    def forward_packed(
+        self,
+        input_ids: torch.Tensor,
+        attention_mask: torch.Tensor,
+        position_ids: torch.Tensor,
+        cls_indexes: torch.Tensor,
+        instance_token_indexes: torch.Tensor,
+        instance_token_sequence_indexes: torch.Tensor,
+    ) -> tuple[torch.Tensor]:
+        """
+        Inference over rows that hold several sequences each, kept apart
+        by the [batch, length, length] attention_mask and position_ids.
+        The indexes point into the hidden states flattened to [batch * length]:
+        cls_indexes to the first token of each sequence, instance_token_indexes
+        to the instance tokens, of the sequences instance_token_sequence_indexes.
+        Returns the probabilities of the sequences in the order of cls_indexes.
+        """
+        hidden_states = self.roberta(
+            input_ids, attention_mask=attention_mask, position_ids=position_ids
+        )[0].flatten(end_dim=1)
+        pooled = self.roberta.pooler(hidden_states[cls_indexes].unsqueeze(dim=1))
+        instance_sums = torch.zeros_like(pooled).index_add_(
+            0, instance_token_sequence_indexes, hidden_states[instance_token_indexes]
+        )
+        instance_lens = torch.bincount(
+            instance_token_sequence_indexes, minlength=len(cls_indexes)
+        )
+        preds = torch.cat(
+            (pooled, instance_sums / instance_lens.unsqueeze(dim=1)), dim=1
+        )
+        probs = self.softmax(self.classifier(self.dropout(preds)))
+        return (probs[:, 1].contiguous(),)
+
+    def _resize_feed_forward_layers(self, intermediate_sizes: list[int]) -> None:
+        for layer, intermediate_size in zip(
+            self.roberta.encoder.layer, intermediate_sizes
+        ):
+            layer.intermediate.dense = nn.Linear(self.hidden_size, intermediate_size)
+            layer.output.dense = nn.Linear(intermediate_size, self.hidden_size)
+
+    @staticmethod
+    def _pool_instances_in_place(
+        last_hidden_state: torch.Tensor,
+        instance_mask: torch.Tensor,
+        instance_lens: torch.Tensor,
+    ) -> torch.Tensor:
+        """
+        The mean of the hidden states of the instance tokens, for inference only.
+        The mask and the lengths are broadcast instead of being repeated
+        over the hidden size, and the hidden states are masked in place,
+        so no [batch, sequence, hidden] tensor is allocated. The products
+        and the reduction are the same as in training, so are the results.
+        """
+        return (
+            last_hidden_state.mul_(instance_mask.unsqueeze(dim=2))
+            .sum(dim=1)
+            .div_(instance_lens.unsqueeze(dim=1))
+        )
@@ -0,0 +1,188 @@
+"""
+Early-exit inference (wsd_early_exit = yes in config.ini): lightweight classifier
+heads after some intermediate encoder layers. An instance whose candidate senses
+are already told apart by a head (the gap between the scores of its two best
+senses is at least the threshold of that layer) isn't run through the remaining
+layers, its scores are the ones of the head.
+
+The heads and their thresholds are calibrated offline on SemCor-format data,
+which also reports the average exit layer and the accuracy vs full depth:
+PYTHONPATH=. python scripts/wsd_inference/calibrate_early_exit.py \
+    --xml semcor.data.xml --gold_keys semcor.gold.key.txt
+"""
+from __future__ import annotations
+
+import hashlib
+from pathlib import Path
+from typing import Optional
+
+import torch
+import torch.nn as nn
+
+from smart_word_hints_api.app.cascade_sense_provider import get_margin
+from smart_word_hints_api.app.constants import (
+    MODEL_NAME__TO__EARLY_EXIT_HEADS_RELATIVE_PATH,
+)
+from smart_word_hints_api.app.distilroberta_for_wsd import DistilRobertaForWsd
+
+
+def get_early_exit_heads_path(model_name: str) -> Path:
+    return (
+        Path(__file__).parent
+        / MODEL_NAME__TO__EARLY_EXIT_HEADS_RELATIVE_PATH[model_name]
+    )
+
+
+def get_default_exit_layers(num_hidden_layers: int) -> list[int]:
+    """
+    Every quarter of the encoder, rounded up: layers 3, 6 and 9 of a 12-layer
+    model, layers 2 and 4 of a 6-layer model.
+    """
+    step = -(-num_hidden_layers // 4)
+    return list(range(step, num_hidden_layers, step))
+
+
+class EarlyExitHeads(nn.Module):
+    """
+    A linear head per exit layer (1-based, as in hidden_states[exit_layer]
+    of the encoder outputs) over the same features as the final classifier:
+    the pooled first token and the mean of the instance tokens.
+    """
+
+    def __init__(
+        self,
+        hidden_size: int,
+        exit_layers: list[int],
+        thresholds: Optional[list[float]] = None,
+    ) -> None:
+        super().__init__()
+        self.exit_layers = exit_layers
+        self.thresholds = thresholds or [float("inf")] * len(exit_layers)
+        self.heads = nn.ModuleList(nn.Linear(hidden_size * 2, 2) for _ in exit_layers)
+
+    @classmethod
+    def load_if_built(cls, model_name: str) -> Optional[EarlyExitHeads]:
+        heads_path = get_early_exit_heads_path(model_name)
+        if not heads_path.exists():
+            return None
+        saved = torch.load(heads_path)
+        heads = cls(saved["hidden_size"], saved["exit_layers"], saved["thresholds"])
+        heads.load_state_dict(saved["state_dict"])
+        return heads.eval()
+
+    def get_hash(self) -> str:
+        """
+        Changes with the exit layers, the thresholds and the weights of the heads.
+        """
+        heads_hash = hashlib.sha256(repr((self.exit_layers, self.thresholds)).encode())
+        for tensor in self.state_dict().values():
+            heads_hash.update(tensor.detach().cpu().numpy().tobytes())
+        return heads_hash.hexdigest()[:16]
+
+    def save(self, heads_path: Path) -> None:
+        torch.save(
+            {
+                "hidden_size": self.heads[0].in_features // 2,
+                "exit_layers": self.exit_layers,
+                "thresholds": self.thresholds,
+                "state_dict": self.state_dict(),
+            },
+            heads_path,
+        )
+
+
+def get_exit_features(
+    model: DistilRobertaForWsd,
+    hidden_states: torch.Tensor,
+    instance_mask: torch.Tensor,
+    instance_lens: torch.Tensor,
+) -> torch.Tensor:
+    pooled = model.roberta.pooler(hidden_states)
+    instance_means = (hidden_states * instance_mask.unsqueeze(dim=2)).sum(
+        dim=1
+    ) / instance_lens.unsqueeze(dim=1)
+    return torch.cat((pooled, instance_means), dim=1)
+
+
+def get_decided_examples(
+    example_groups: torch.Tensor, probs: torch.Tensor, threshold: float
+) -> torch.Tensor:
+    """
+    A boolean mask of the examples whose group (instance) has a gap of
+    at least threshold between the scores of its two best senses.
+    """
+    decided = torch.zeros(len(probs), dtype=torch.bool)
+    for group in example_groups.unique():
+        group_mask = example_groups == group
+        margin = get_margin(dict(enumerate(probs[group_mask].tolist())))
+        if margin >= threshold:
+            decided |= group_mask
+    return decided
+
+
+def predict_with_early_exit(
+    model: DistilRobertaForWsd,
+    heads: EarlyExitHeads,
+    batch: dict[str, torch.Tensor],
+    example_groups: torch.Tensor,
+) -> tuple[torch.Tensor, torch.Tensor]:
+    """
+    Runs the encoder layer by layer, dropping from the batch the examples of the
+    instances (example_groups) decided by the head of an exit layer.
+    All the examples of an instance have to be in the batch.
+
+    Returns the probabilities and the layer each example exited at.
+    """
+    roberta = model.roberta
+    num_layers = len(roberta.encoder.layer)
+    layer__to__head = {
+        exit_layer: (head, threshold)
+        for exit_layer, head, threshold in zip(
+            heads.exit_layers, heads.heads, heads.thresholds
+        )
+        if exit_layer < num_layers
+    }
+
+    batch_size = batch["input_ids"].shape[0]
+    probs = torch.empty(batch_size)
+    exit_layers = torch.full((batch_size,), num_layers)
+    active = torch.arange(batch_size)
+    attention_mask = roberta.get_extended_attention_mask(
+        batch["attention_mask"], batch["input_ids"].shape
+    )
+    instance_mask = batch["instance_mask"]
+    instance_lens = batch["instance_lens"]
+
+    with torch.no_grad():
+        hidden_states = roberta.embeddings(input_ids=batch["input_ids"])
+        for layer_i, layer in enumerate(roberta.encoder.layer, start=1):
+            hidden_states = layer(hidden_states, attention_mask=attention_mask)[0]
+            if layer_i not in layer__to__head:
+                continue
+            head, threshold = layer__to__head[layer_i]
+            head_probs = model.softmax(
+                head(
+                    get_exit_features(
+                        model, hidden_states, instance_mask, instance_lens
+                    )
+                )
+            )[:, 1]
+            decided = get_decided_examples(
+                example_groups[active], head_probs, threshold
+            )
+            if not decided.any():
+                continue
+            probs[active[decided]] = head_probs[decided]
+            exit_layers[active[decided]] = layer_i
+            remaining = ~decided
+            if not remaining.any():
+                return probs, exit_layers
+            active = active[remaining]
+            hidden_states = hidden_states[remaining]
+            attention_mask = attention_mask[remaining]
+            instance_mask = instance_mask[remaining]
+            instance_lens = instance_lens[remaining]
+
+        features = get_exit_features(model, hidden_states, instance_mask, instance_lens)
+        probs[active] = model.softmax(model.classifier(model.dropout(features)))[:, 1]
+    return probs, exit_layers
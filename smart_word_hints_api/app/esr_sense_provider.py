@@ -1,62 +1,504 @@
 from __future__ import annotations
 
+import logging
 import tempfile
+import threading
 import uuid
 from pathlib import Path
-from typing import Literal
+from typing import Literal, Optional
 from xml.etree import ElementTree as ET
 
+import numpy as np
 import torch
-import transformers
-from nltk.corpus import wordnet as wn
+import torch.nn as nn
 
+from smart_word_hints_api.app.bfloat16 import is_bfloat16_supported, to_bfloat16_model
+from smart_word_hints_api.app.compiled_wsd_model import CompiledWsdModel
 from smart_word_hints_api.app.constants import (
     DEFAULT_WSD_XML_EXPECTED_POS,
     DISTILROBERTA_MODEL_RELATIVE_PATH,
     ROBERTA_BASE_MODEL_RELATIVE_PATH,
     ROBERTA_LARGE_MODEL_RELATIVE_PATH,
     TAG__TO__WSD_XML_EXPECTED_POS,
+    WSD_ACTIVATION_BYTES_PER_ELEMENT,
+    WSD_BACKEND_ONNX,
+    WSD_BACKEND_TORCH,
+    WSD_BATCH_SCHEDULER_DEFAULT_MAX_BATCH_EXAMPLES,
+    WSD_BFLOAT16_ACTIVATION_BYTES_PER_ELEMENT,
+    WSD_COMPILE_NONE,
+    WSD_PRECISION_BF16,
+    WSD_PRECISION_FP32,
+    WSD_PRECISION_INT8,
+    WSD_SEQUENCE_LENGTH_LIMIT,
 )
 from smart_word_hints_api.app.distilroberta_for_wsd import DistilRobertaForWsd
+from smart_word_hints_api.app.early_exit import EarlyExitHeads, predict_with_early_exit
 from smart_word_hints_api.app.esr.code.esr.dataset.dataset_semcor_wngc import (
     DataCollatorForWsd,
     WsdDataset,
 )
 from smart_word_hints_api.app.esr.code.esr.model import RobertaForWsd
+from smart_word_hints_api.app.gloss_cache import GlossTokenCache
+from smart_word_hints_api.app.mmap_weights import load_mmapped_model
+from smart_word_hints_api.app.model_files import load_model_config, load_tokenizer
+from smart_word_hints_api.app.onnx_wsd_model import OnnxWsdModel, get_onnx_model_path
+from smart_word_hints_api.app.quantization import load_int8_model
 from smart_word_hints_api.app.text_holder import TextHolderEN
 from smart_word_hints_api.app.token_wrappers import TokenEN
+from smart_word_hints_api.app.vocab_trimming import (
+    hash_trimmed_vocab,
+    load_trimmed_vocab,
+    trim_vocab,
+)
+from smart_word_hints_api.app.wsd_batching import (
+    get_max_batch_tokens_for_memory_budget,
+    get_padding_ratio,
+    group_into_length_buckets,
+    pack_into_rows,
+    split_instances_into_micro_batches,
+    split_into_micro_batches,
+)
+from smart_word_hints_api.app.wsd_input import (
+    WsdExample,
+    WsdInputBuilder,
+    collate_packed_rows,
+    collate_wsd_examples,
+    lemma_extended_if_is_in_wordnet_else_lemma,
+)
+from smart_word_hints_api.app.wsd_scheduler import WsdBatchScheduler
 
 ESRModels = Literal["distilroberta-base", "roberta-base", "roberta-large"]
 
+logger = logging.getLogger(__name__)
+
 
 class ESRSenseProvider:
-    def __init__(self, model_name: ESRModels) -> None:
+    def __init__(
+        self,
+        model_name: ESRModels,
+        backend: str = WSD_BACKEND_TORCH,
+        precision: str = WSD_PRECISION_FP32,
+        compile_mode: str = WSD_COMPILE_NONE,
+        max_batch_examples: Optional[int] = None,
+        max_batch_tokens: Optional[int] = None,
+        memory_budget_mb: Optional[int] = None,
+        length_bucket_width: Optional[int] = None,
+        packed_row_length: Optional[int] = None,
+        early_exit: bool = False,
+        trimmed_vocab: bool = False,
+        batch_scheduler_max_wait_ms: Optional[float] = None,
+        batch_scheduler_max_batch_examples: Optional[int] = None,
+        max_candidate_senses: Optional[int] = None,
+        sense_key__to__ranking_score: Optional[dict[str, int]] = None,
+    ) -> None:
+        """
+        backend is either WSD_BACKEND_TORCH (eager PyTorch) or WSD_BACKEND_ONNX
+        (ONNX Runtime, the model has to be exported first, see onnx_wsd_model.py).
+        precision is WSD_PRECISION_FP32, WSD_PRECISION_INT8 (torch backend
+        only, Linear layers dynamically quantized, see quantization.py)
+        or WSD_PRECISION_BF16 (torch backend only, the encoder in bfloat16,
+        see bfloat16.py). bf16 falls back to fp32 on CPUs without bfloat16 support.
+        compile_mode is one of WSD_COMPILE_NONE (eager), WSD_COMPILE_TORCHSCRIPT
+        or WSD_COMPILE_INDUCTOR (torch backend only, see compiled_wsd_model.py).
+
+        Inference is split into micro-batches of at most max_batch_examples
+        examples and max_batch_tokens padded tokens. If memory_budget_mb is given,
+        max_batch_tokens is additionally capped so that the activations
+        of a micro-batch fit in the budget.
+
+        If length_bucket_width is given (0 means no bucketing), the examples are
+        first sorted by length and grouped into buckets of similar length, each
+        padded only to its own longest example.
+
+        If packed_row_length is given, several examples are instead concatenated
+        into rows of at most packed_row_length tokens, kept apart by block-diagonal
+        attention masks and position ids restarting at each example (eager torch
+        backend in fp32 or int8 only, see DistilRobertaForWsd.forward_packed).
+
+        If early_exit is set and the early-exit heads of the model are calibrated,
+        the instances decided by the head of an intermediate layer don't go through
+        the remaining layers (eager torch backend in fp32 or int8 only, without
+        sequence packing or the batch scheduler, see early_exit.py).
+
+        If trimmed_vocab is set and the trimmed vocabulary of the model is built,
+        the word embeddings keep only its tokens (torch backend only,
+        see vocab_trimming.py).
+
+        If batch_scheduler_max_wait_ms is given, the examples of concurrent
+        requests are collected by a WsdBatchScheduler and predicted together.
+
+        If max_candidate_senses is given, only that many of the most frequent
+        candidate senses of each token (by sense_key__to__ranking_score,
+        see DifficultyRankingEN) are scored.
+        """
         self.model_name = model_name
-        self.config = transformers.AutoConfig.from_pretrained(self.model_name)
-        self.tokenizer = transformers.AutoTokenizer.from_pretrained(self.model_name)
+        self.backend = backend
+        self.precision = precision
+        if precision == WSD_PRECISION_BF16 and not is_bfloat16_supported():
+            logger.warning(
+                "bfloat16 is not supported on this CPU, falling back to fp32"
+            )
+            self.precision = WSD_PRECISION_FP32
+        self.compile_mode = compile_mode
+        if (packed_row_length or early_exit) and (
+            backend != WSD_BACKEND_TORCH
+            or self.precision == WSD_PRECISION_BF16
+            or compile_mode != WSD_COMPILE_NONE
+        ):
+            raise ValueError(
+                "Sequence packing and early exit need the eager torch backend "
+                "in fp32 or int8"
+            )
+        if packed_row_length and early_exit:
+            raise ValueError("Sequence packing and early exit can't be combined")
+        if trimmed_vocab and backend != WSD_BACKEND_TORCH:
+            raise ValueError("The trimmed vocabulary needs the torch backend")
+        self.config = load_model_config(self.model_name)
+        self.tokenizer = load_tokenizer(self.model_name)
+        self.trimmed_vocab: Optional[np.ndarray] = None
+        if trimmed_vocab:
+            self.trimmed_vocab = load_trimmed_vocab(self.model_name)
+            if self.trimmed_vocab is None:
+                logger.warning(
+                    "The trimmed vocabulary of %s isn't built, "
+                    "using the full vocabulary",
+                    self.model_name,
+                )
         self.model = self._get_model()
-
-    def _get_model(self) -> RobertaForWsd | DistilRobertaForWsd:
-        if self.model_name == "distilroberta-base":
-            return DistilRobertaForWsd.from_pretrained(
-                Path(__file__).parent / DISTILROBERTA_MODEL_RELATIVE_PATH,
-                config=self.config,
+        self.input_builder = WsdInputBuilder(
+            self.tokenizer,
+            gloss_cache=GlossTokenCache.load_if_built(self.model_name),
+            max_candidate_senses=max_candidate_senses,
+            sense_key__to__ranking_score=sense_key__to__ranking_score,
+        )
+        self.max_batch_examples = max_batch_examples
+        self.length_bucket_width = length_bucket_width
+        self.packed_row_length = packed_row_length
+        self._metrics_lock = threading.Lock()
+        self._packed_rows = 0
+        self._packed_examples = 0
+        self._packed_tokens = 0
+        self._packed_row_tokens = 0
+        self.early_exit_heads: Optional[EarlyExitHeads] = None
+        if early_exit:
+            self.early_exit_heads = EarlyExitHeads.load_if_built(self.model_name)
+            if self.early_exit_heads is None:
+                logger.warning(
+                    "The early-exit heads of %s aren't calibrated, "
+                    "running at full depth",
+                    self.model_name,
+                )
+        self._early_exit_instances = 0
+        self._early_exit_layers_sum = 0
+        self._early_exited_instances = 0
+        self.max_batch_tokens = max_batch_tokens
+        if memory_budget_mb:
+            max_batch_tokens_for_budget = get_max_batch_tokens_for_memory_budget(
+                self.config,
+                memory_budget_mb,
+                bytes_per_element=WSD_BFLOAT16_ACTIVATION_BYTES_PER_ELEMENT
+                if self.precision == WSD_PRECISION_BF16
+                else WSD_ACTIVATION_BYTES_PER_ELEMENT,
             )
-        if self.model_name == "roberta-base":
-            return DistilRobertaForWsd.from_pretrained(
-                Path(__file__).parent / ROBERTA_BASE_MODEL_RELATIVE_PATH,
-                config=self.config,
+            self.max_batch_tokens = min(
+                max_batch_tokens or max_batch_tokens_for_budget,
+                max_batch_tokens_for_budget,
             )
-        if self.model_name == "roberta-large":
-            return DistilRobertaForWsd.from_pretrained(
-                Path(__file__).parent / ROBERTA_LARGE_MODEL_RELATIVE_PATH,
-                config=self.config,
+        self.batch_scheduler: Optional[WsdBatchScheduler] = None
+        # early exit decides per instance, all its examples have to come together
+        if batch_scheduler_max_wait_ms is not None and self.early_exit_heads is None:
+            self.batch_scheduler = WsdBatchScheduler(
+                self._predict,
+                max_wait_ms=batch_scheduler_max_wait_ms,
+                max_batch_examples=batch_scheduler_max_batch_examples
+                or WSD_BATCH_SCHEDULER_DEFAULT_MAX_BATCH_EXAMPLES,
             )
-        raise ValueError(f"Unknown model name {self.model_name}")
+
+    def _get_model(self) -> nn.Module | OnnxWsdModel | CompiledWsdModel:
+        if self.backend == WSD_BACKEND_ONNX:
+            return OnnxWsdModel(get_onnx_model_path(self.model_name))
+        if self.backend != WSD_BACKEND_TORCH:
+            raise ValueError(f"Unknown backend {self.backend}")
+        model = self._get_torch_model()
+        if self.compile_mode == WSD_COMPILE_NONE:
+            return model
+        return CompiledWsdModel(model, self.compile_mode)
+
+    def _get_torch_model(self) -> nn.Module:
+        if self.precision == WSD_PRECISION_INT8:
+            return self._trim_vocab(
+                load_int8_model(
+                    self.model_name,
+                    self.config,
+                    self._get_fp32_model,
+                    get_checkpoint_path(self.model_name),
+                )
+            )
+        if self.precision == WSD_PRECISION_BF16:
+            return to_bfloat16_model(self._trim_vocab(self._get_fp32_model().eval()))
+        if self.precision != WSD_PRECISION_FP32:
+            raise ValueError(f"Unknown precision {self.precision}")
+        return self._trim_vocab(self._get_fp32_model())
+
+    def _trim_vocab(
+        self, model: RobertaForWsd | DistilRobertaForWsd
+    ) -> RobertaForWsd | DistilRobertaForWsd:
+        """
+        Before the encoder is wrapped for bf16 or compiled. The int8 model
+        is trimmed after quantization, which leaves the embeddings in fp32.
+        """
+        if self.trimmed_vocab is not None:
+            trim_vocab(model, self.trimmed_vocab, self.tokenizer.unk_token_id)
+        return model
+
+    def _get_fp32_model(self) -> RobertaForWsd | DistilRobertaForWsd:
+        mmapped_model = load_mmapped_model(self.model_name, self.config)
+        if mmapped_model is not None:
+            return mmapped_model
+        return DistilRobertaForWsd.from_pretrained(
+            get_checkpoint_path(self.model_name), config=self.config
+        )
+
+    def get_model_version(self) -> str:
+        """
+        Changes whenever the predictions may change: with the checkpoint file
+        (by its size and modification time), the inference settings or the loaded
+        early-exit heads.
+        """
+        checkpoint_stat = get_checkpoint_path(self.model_name).stat()
+        trimmed_vocab_hash = (
+            0 if self.trimmed_vocab is None else hash_trimmed_vocab(self.trimmed_vocab)
+        )
+        early_exit_heads_hash = (
+            0 if self.early_exit_heads is None else self.early_exit_heads.get_hash()
+        )
+        return (
+            f"{self.model_name}:{checkpoint_stat.st_size}:"
+            f"{int(checkpoint_stat.st_mtime)}:{self.backend}:{self.precision}:"
+            f"{self.input_builder.max_candidate_senses or 0}:"
+            f"{trimmed_vocab_hash}:{early_exit_heads_hash}"
+        )
+
+    def get_model_memory_mb(self) -> float:
+        """
+        The size of the model weights: the parameters and buffers of the torch
+        model (memory-mapped weights included) or the ONNX model file.
+        """
+        if isinstance(self.model, OnnxWsdModel):
+            return get_onnx_model_path(self.model_name).stat().st_size / 2**20
+        model = (
+            self.model.model if isinstance(self.model, CompiledWsdModel) else self.model
+        )
+        return (
+            sum(
+                tensor.numel() * tensor.element_size()
+                for value in model.state_dict().values()
+                # the packed weights of the int8 Linear layers are tuples of tensors
+                for tensor in (value if isinstance(value, tuple) else (value,))
+                if isinstance(tensor, torch.Tensor)
+            )
+            / 2**20
+        )
+
+    def close(self) -> None:
+        """
+        Stops the batch scheduler thread. The sense provider can still be used,
+        the examples are then predicted in the calling thread.
+        """
+        if self.batch_scheduler is not None:
+            self.batch_scheduler.close()
 
     def get_sense_keys(
         self, text_holder: TextHolderEN, token_indexes_to_disambiguate: list[int]
     ) -> dict[int, str]:
+        token_i__to__sense_scores = self.get_sense_scores(
+            text_holder, token_indexes_to_disambiguate
+        )
+        return {
+            token_i: max(sense_scores, key=sense_scores.get)
+            for token_i, sense_scores in token_i__to__sense_scores.items()
+        }
+
+    def get_sense_scores(
+        self, text_holder: TextHolderEN, token_indexes_to_disambiguate: list[int]
+    ) -> dict[int, dict[str, float]]:
+        """
+        The score (the probability of being the correct sense) of each candidate
+        sense of each token.
+        """
+        examples = self.input_builder.build_examples(
+            text_holder.tokens, token_indexes_to_disambiguate
+        )
+        if not examples:
+            return {}
+        return self._get_sense_scores_from_examples(examples)
+
+    def _get_sense_scores_from_examples(
+        self, examples: list[WsdExample]
+    ) -> dict[int, dict[str, float]]:
+        if self.batch_scheduler is not None:
+            preds = self.batch_scheduler.predict(examples)
+        else:
+            preds = self._predict(examples)
+
+        assert len(preds) == len(examples)
+        token_i__to__sense_scores: dict[int, dict[str, float]] = {}
+        for example, pred in zip(examples, preds.tolist()):
+            token_i__to__sense_scores.setdefault(example.instance_id, {})
+            token_i__to__sense_scores[example.instance_id][example.sense_key] = pred
+        return token_i__to__sense_scores
+
+    def get_metrics(self) -> dict[str, dict[str, float]]:
+        metrics = {}
+        if self.batch_scheduler is not None:
+            metrics["batch_scheduler"] = self.batch_scheduler.get_metrics()
+        if self.packed_row_length:
+            with self._metrics_lock:
+                metrics["sequence_packing"] = {
+                    "rows": self._packed_rows,
+                    "examples": self._packed_examples,
+                    "examples_per_row": (
+                        self._packed_examples / self._packed_rows
+                        if self._packed_rows
+                        else 0.0
+                    ),
+                    "utilization": (
+                        self._packed_tokens / self._packed_row_tokens
+                        if self._packed_row_tokens
+                        else 0.0
+                    ),
+                }
+        if self.early_exit_heads is not None:
+            with self._metrics_lock:
+                metrics["early_exit"] = {
+                    "instances": self._early_exit_instances,
+                    "layers": self.config.num_hidden_layers,
+                    "average_exit_layer": (
+                        self._early_exit_layers_sum / self._early_exit_instances
+                        if self._early_exit_instances
+                        else 0.0
+                    ),
+                    "exited_early_fraction": (
+                        self._early_exited_instances / self._early_exit_instances
+                        if self._early_exit_instances
+                        else 0.0
+                    ),
+                }
+        return metrics
+
+    def _predict(self, examples: list[WsdExample]) -> torch.Tensor:
+        if self.packed_row_length:
+            return self._predict_packed(examples)
+        if self.early_exit_heads is not None:
+            return self._predict_early_exit(examples)
+        if not self.length_bucket_width:
+            buckets, order = [examples], list(range(len(examples)))
+        else:
+            buckets, order = group_into_length_buckets(
+                examples, self.length_bucket_width
+            )
+
+        micro_batches = [
+            micro_batch
+            for bucket in buckets
+            for micro_batch in split_into_micro_batches(
+                bucket, self.max_batch_examples, self.max_batch_tokens
+            )
+        ]
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "Padding ratio: %.3f without bucketing, %.3f in %d micro-batches",
+                get_padding_ratio([examples]),
+                get_padding_ratio(micro_batches),
+                len(micro_batches),
+            )
+
+        preds_in_batch_order = []
+        with torch.no_grad():
+            for micro_batch in micro_batches:
+                batch = collate_wsd_examples(micro_batch, self.tokenizer.pad_token_id)
+                preds_in_batch_order.append(self.model(**batch)[0])
+
+        preds_in_bucket_order = torch.cat(preds_in_batch_order)
+        preds = torch.empty_like(preds_in_bucket_order)
+        preds[torch.tensor(order)] = preds_in_bucket_order
+        return preds
+
+    def _predict_packed(self, examples: list[WsdExample]) -> torch.Tensor:
+        rows = pack_into_rows(examples, self.packed_row_length)
+        micro_batches = split_into_micro_batches(rows, max_tokens=self.max_batch_tokens)
+        tokens = sum(len(example) for example in examples)
+        row_tokens = sum(
+            len(micro_batch) * max(len(row) for row in micro_batch)
+            for micro_batch in micro_batches
+        )
+        with self._metrics_lock:
+            self._packed_rows += len(rows)
+            self._packed_examples += len(examples)
+            self._packed_tokens += tokens
+            self._packed_row_tokens += row_tokens
+        logger.debug(
+            "Sequence packing: %d examples in %d rows, tokens per row utilization %.3f",
+            len(examples),
+            len(rows),
+            tokens / row_tokens,
+        )
+
+        preds_in_row_order = []
+        with torch.no_grad():
+            for micro_batch in micro_batches:
+                batch = collate_packed_rows(
+                    examples,
+                    micro_batch,
+                    self.tokenizer.pad_token_id,
+                    self.model.roberta.embeddings.padding_idx,
+                )
+                preds_in_row_order.append(self.model.forward_packed(**batch)[0])
+
+        order = [
+            example_i
+            for micro_batch in micro_batches
+            for row in micro_batch
+            for example_i in row.example_indexes
+        ]
+        preds = torch.empty(len(examples))
+        preds[torch.tensor(order)] = torch.cat(preds_in_row_order)
+        return preds
+
+    def _predict_early_exit(self, examples: list[WsdExample]) -> torch.Tensor:
+        preds = torch.empty(len(examples))
+        exit_layers = torch.empty(len(examples), dtype=torch.long)
+        for micro_batch in split_instances_into_micro_batches(
+            examples, self.max_batch_examples, self.max_batch_tokens
+        ):
+            micro_batch_examples = [examples[example_i] for example_i in micro_batch]
+            preds[micro_batch], exit_layers[micro_batch] = predict_with_early_exit(
+                self.model,
+                self.early_exit_heads,
+                collate_wsd_examples(micro_batch_examples, self.tokenizer.pad_token_id),
+                torch.tensor([example.instance_id for example in micro_batch_examples]),
+            )
+
+        instance_id__to__exit_layer = {
+            example.instance_id: exit_layer
+            for example, exit_layer in zip(examples, exit_layers.tolist())
+        }
+        with self._metrics_lock:
+            self._early_exit_instances += len(instance_id__to__exit_layer)
+            self._early_exit_layers_sum += sum(instance_id__to__exit_layer.values())
+            self._early_exited_instances += sum(
+                exit_layer < self.config.num_hidden_layers
+                for exit_layer in instance_id__to__exit_layer.values()
+            )
+        return preds
+
+    def get_sense_keys_via_xml(
+        self, text_holder: TextHolderEN, token_indexes_to_disambiguate: list[int]
+    ) -> dict[int, str]:
+        """
+        The original route through a temporary SemCor-style XML file and
+        ESR's WsdDataset. Kept as the reference for parity checks.
+        """
         with tempfile.NamedTemporaryFile(
             prefix=f"prefix_{uuid.uuid4()}_", mode="w+t"
         ) as f:
@@ -68,7 +510,7 @@ class ESRSenseProvider:
 
             temporary_dataset = WsdDataset(
                 self.tokenizer,
-                limit=432,
+                limit=WSD_SEQUENCE_LENGTH_LIMIT,
                 wsd_xml=f.name,
                 wsd_label=None,
                 annotators=None,
@@ -99,6 +541,16 @@ class ESRSenseProvider:
         return {key: max(value, key=value.get) for key, value in result_softmax.items()}
 
 
+def get_checkpoint_path(model_name: ESRModels) -> Path:
+    if model_name == "distilroberta-base":
+        return Path(__file__).parent / DISTILROBERTA_MODEL_RELATIVE_PATH
+    if model_name == "roberta-base":
+        return Path(__file__).parent / ROBERTA_BASE_MODEL_RELATIVE_PATH
+    if model_name == "roberta-large":
+        return Path(__file__).parent / ROBERTA_LARGE_MODEL_RELATIVE_PATH
+    raise ValueError(f"Unknown model name {model_name}")
+
+
 def save_input_as_xml(
     input_tokens: list[TokenEN],
     token_indexes_to_disambiguate: list[int],
@@ -157,10 +609,3 @@ def save_input_as_xml(
     tree.write(temporary_xml_file_name)
 
     return dataset_id__to__token_id
-
-
-def lemma_extended_if_is_in_wordnet_else_lemma(token: TokenEN) -> str:
-    lemma_extended = "_".join(token.lemma_extended.split())
-    if len(wn.synsets(lemma_extended)) > 0:
-        return lemma_extended
-    return token.lemma
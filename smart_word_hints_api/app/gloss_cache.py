@@ -0,0 +1,99 @@
+"""
+Pre-tokenized WordNet glosses, stored per tokenizer as a flat memory-mapped
+array of token ids with the offsets of each synset's gloss.
+
+Build (done when building the Docker images):
+python -m smart_word_hints_api.app.gloss_cache distilroberta-base roberta-base
+"""
+
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from nltk.corpus import wordnet as wn
+
+from smart_word_hints_api.app.constants import (
+    EN_GLOSS_CACHE_RELATIVE_PATH,
+    GLOSS_CACHE_IDS_FILENAME,
+    GLOSS_CACHE_OFFSETS_FILENAME,
+    GLOSS_CACHE_SENSE_KEYS_FILENAME,
+)
+from smart_word_hints_api.app.model_files import load_tokenizer
+from smart_word_hints_api.app.wsd_input import get_synset_gloss
+
+
+def get_gloss_cache_dir(model_name: str) -> Path:
+    return Path(__file__).parent / EN_GLOSS_CACHE_RELATIVE_PATH / model_name
+
+
+class GlossTokenCache:
+    def __init__(self, cache_dir: Path) -> None:
+        self.gloss_ids: np.ndarray = np.load(
+            cache_dir / GLOSS_CACHE_IDS_FILENAME, mmap_mode="r"
+        )
+        self.offsets: np.ndarray = np.load(
+            cache_dir / GLOSS_CACHE_OFFSETS_FILENAME, mmap_mode="r"
+        )
+        self.sense_key__to__row: dict[str, int] = {}
+        with open(cache_dir / GLOSS_CACHE_SENSE_KEYS_FILENAME, "r") as f:
+            for line in f.read().splitlines():
+                sense_key, row = line.split("\t")
+                self.sense_key__to__row[sense_key] = int(row)
+
+    @classmethod
+    def load_if_built(cls, model_name: str) -> Optional[GlossTokenCache]:
+        cache_dir = get_gloss_cache_dir(model_name)
+        if not (cache_dir / GLOSS_CACHE_IDS_FILENAME).exists():
+            return None
+        return cls(cache_dir)
+
+    def get(self, sense_key: str) -> Optional[list[int]]:
+        row = self.sense_key__to__row.get(sense_key)
+        if row is None:
+            return None
+        return self.gloss_ids[self.offsets[row] : self.offsets[row + 1]].tolist()
+
+
+def build_gloss_cache(model_name: str, cache_dir: Path) -> None:
+    """
+    The gloss depends only on the synset, so each synset is tokenized once
+    and all its sense keys point to the same row.
+    """
+    tokenizer = load_tokenizer(model_name)
+    sense_key__to__row: dict[str, int] = {}
+    glosses: list[str] = []
+    for synset in wn.all_synsets():
+        for lemma in synset.lemmas():
+            sense_key__to__row[lemma.key()] = len(glosses)
+        glosses.append(get_synset_gloss(synset))
+
+    encoded_glosses = tokenizer(glosses, add_special_tokens=False)["input_ids"]
+    offsets = np.zeros(len(encoded_glosses) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(ids) for ids in encoded_glosses])
+    gloss_ids = np.fromiter(
+        (token_id for ids in encoded_glosses for token_id in ids),
+        dtype=np.int32,
+        count=offsets[-1],
+    )
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    np.save(cache_dir / GLOSS_CACHE_IDS_FILENAME, gloss_ids)
+    np.save(cache_dir / GLOSS_CACHE_OFFSETS_FILENAME, offsets)
+    with open(cache_dir / GLOSS_CACHE_SENSE_KEYS_FILENAME, "w") as f:
+        for sense_key, row in sense_key__to__row.items():
+            f.write(f"{sense_key}\t{row}\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "model_names",
+        nargs="*",
+        default=["distilroberta-base", "roberta-base", "roberta-large"],
+    )
+    args = parser.parse_args()
+    for model_name in args.model_names:
+        build_gloss_cache(model_name, get_gloss_cache_dir(model_name))
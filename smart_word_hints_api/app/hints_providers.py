@@ -1,13 +1,117 @@
 from __future__ import annotations
 
+import contextlib
+import functools
+import logging
+import threading
 from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
 
+from smart_word_hints_api.app.bi_encoder_sense_provider import BiEncoderSenseProvider
+from smart_word_hints_api.app.cascade_sense_provider import CascadeSenseProvider
 from smart_word_hints_api.app.config import config
-from smart_word_hints_api.app.constants import CONFIG_KEY_MODEL_NAME
+from smart_word_hints_api.app.constants import (
+    CONFIG_KEY_ASSERT_NO_NETWORK_AT_STARTUP,
+    CONFIG_KEY_MODEL_NAME,
+    CONFIG_KEY_SENSE_CACHE_BACKEND,
+    CONFIG_KEY_SENSE_CACHE_MAX_SENTENCES,
+    CONFIG_KEY_SENSE_CACHE_SQLITE_PATH,
+    CONFIG_KEY_SENSE_CACHE_TTL_HOURS,
+    CONFIG_KEY_WSD_BACKEND,
+    CONFIG_KEY_WSD_BATCH_SCHEDULER,
+    CONFIG_KEY_WSD_BATCH_SCHEDULER_MAX_BATCH_EXAMPLES,
+    CONFIG_KEY_WSD_BATCH_SCHEDULER_MAX_WAIT_MS,
+    CONFIG_KEY_WSD_CASCADE_ESCALATION_MARGIN,
+    CONFIG_KEY_WSD_CASCADE_ESCALATION_MODEL_NAME,
+    CONFIG_KEY_WSD_COMPILE,
+    CONFIG_KEY_WSD_EARLY_EXIT,
+    CONFIG_KEY_WSD_ENGINE,
+    CONFIG_KEY_WSD_LENGTH_BUCKET_WIDTH,
+    CONFIG_KEY_WSD_MAX_BATCH_EXAMPLES,
+    CONFIG_KEY_WSD_MAX_BATCH_TOKENS,
+    CONFIG_KEY_WSD_MAX_CANDIDATE_SENSES,
+    CONFIG_KEY_WSD_MEMORY_BUDGET_MB,
+    CONFIG_KEY_WSD_MODEL_POOL_MAX_MEMORY_MB,
+    CONFIG_KEY_WSD_MODEL_POOL_PRELOAD,
+    CONFIG_KEY_WSD_PACKED_ROW_LENGTH,
+    CONFIG_KEY_WSD_PRECISION,
+    CONFIG_KEY_WSD_TRIMMED_VOCAB,
+    SENSE_CACHE_BACKEND_MEMORY,
+    SENSE_CACHE_BACKEND_SQLITE,
+    WSD_ENGINE_BI_ENCODER,
+    WSD_ENGINE_CASCADE,
+    WSD_ENGINE_CROSS_ENCODER,
+    WSD_ENGINE_SHARED_CONTEXT,
+    WSD_MODEL_TIER__TO__MODEL_NAME,
+)
 from smart_word_hints_api.app.definitions import DefinitionProviderEN
 from smart_word_hints_api.app.difficulty_rankings import DifficultyRankingEN
-from smart_word_hints_api.app.esr_sense_provider import ESRSenseProvider
+from smart_word_hints_api.app.esr_sense_provider import (
+    ESRSenseProvider,
+    get_checkpoint_path,
+)
+from smart_word_hints_api.app.model_files import no_network_access
+from smart_word_hints_api.app.monosemous_index import MonosemousSenseIndex
+from smart_word_hints_api.app.sense_cache import (
+    SentenceSenseCache,
+    SqliteSentenceSenseCache,
+    get_sentence_cache_key,
+)
+from smart_word_hints_api.app.sense_provider_pool import SenseProviderPool
+from smart_word_hints_api.app.shared_context_sense_provider import (
+    SharedContextSenseProvider,
+)
 from smart_word_hints_api.app.text_holder import TextHolderEN
+from smart_word_hints_api.app.token_wrappers import TokenEN
+from smart_word_hints_api.app.wsd_input import split_into_sentences
+
+logger = logging.getLogger(__name__)
+
+WSD_ENGINE__TO__SENSE_PROVIDER: dict[str, type[ESRSenseProvider]] = {
+    WSD_ENGINE_CROSS_ENCODER: ESRSenseProvider,
+    WSD_ENGINE_BI_ENCODER: BiEncoderSenseProvider,
+    WSD_ENGINE_SHARED_CONTEXT: SharedContextSenseProvider,
+}
+
+
+class ModelTierUnavailableError(ValueError):
+    pass
+
+
+def get_available_model_tiers(
+    resident_model_names: set[str],
+    resident_memory_mb: float,
+    max_memory_mb: int,
+) -> dict[str, str]:
+    """
+    The model tiers whose checkpoints are downloaded (roberta-base and
+    roberta-large are optional) and, unless the model is already resident
+    (held by the default sense provider), whose weights fit into max_memory_mb
+    next to the resident models. The weights are estimated by the checkpoint
+    size, a model that would only fit by going over the limit isn't loaded at all.
+    """
+    model_tier__to__model_name = {}
+    for model_tier, model_name in WSD_MODEL_TIER__TO__MODEL_NAME.items():
+        checkpoint_path = get_checkpoint_path(model_name)
+        if not checkpoint_path.exists():
+            continue
+        if (
+            max_memory_mb
+            and model_name not in resident_model_names
+            and resident_memory_mb + checkpoint_path.stat().st_size / 2**20
+            > max_memory_mb
+        ):
+            logger.warning(
+                "%s doesn't fit into wsd_model_pool_max_memory_mb = %d "
+                "next to the default model, the %s tier isn't available",
+                model_name,
+                max_memory_mb,
+                model_tier,
+            )
+            continue
+        model_tier__to__model_name[model_tier] = model_name
+    return model_tier__to__model_name
 
 
 @dataclass(frozen=True)
@@ -24,27 +128,332 @@ class Hint:
 class EnglishToEnglishHintsProvider:
     def __init__(self):
         self.difficulty_ranking = DifficultyRankingEN()
-        self.sense_provider = ESRSenseProvider(config.get(CONFIG_KEY_MODEL_NAME))
+        with (
+            no_network_access()
+            if config.getboolean(CONFIG_KEY_ASSERT_NO_NETWORK_AT_STARTUP)
+            else contextlib.nullcontext()
+        ):
+            sense_provider_kwargs = self._get_sense_provider_kwargs(
+                self.difficulty_ranking.sense_key__to__ranking_score
+            )
+            self.sense_provider = self._get_sense_provider(sense_provider_kwargs)
+        # the default model is never evicted, but counts against the memory limit
+        resident_memory_mb = self.sense_provider.get_model_memory_mb()
+        self.sense_provider_pool = SenseProviderPool(
+            functools.partial(
+                self._create_pooled_sense_provider,
+                sense_provider_kwargs=sense_provider_kwargs,
+            ),
+            max_memory_mb=config.getint(CONFIG_KEY_WSD_MODEL_POOL_MAX_MEMORY_MB),
+            resident_memory_mb=resident_memory_mb,
+        )
+        self.model_tier__to__model_name = get_available_model_tiers(
+            set(self._get_resident_sense_providers()),
+            resident_memory_mb,
+            config.getint(CONFIG_KEY_WSD_MODEL_POOL_MAX_MEMORY_MB),
+        )
+        logger.info("Available model tiers: %s", self.model_tier__to__model_name)
         self.definitions_provider = DefinitionProviderEN(self.difficulty_ranking)
+        self.monosemous_index = MonosemousSenseIndex.load_if_built()
+        self.sense_cache_model_id = (
+            f"{config.get(CONFIG_KEY_WSD_ENGINE)}/{config.get(CONFIG_KEY_MODEL_NAME)}"
+        )
+        self.sense_cache = self._get_sense_cache(self.sense_provider)
+        self._metrics_lock = threading.Lock()
+        self._translatable_tokens = 0
+        self._disambiguated_tokens = 0
+        self._monosemous_tokens = 0
+        # loading a model on its first request can take longer than a request
+        if config.getboolean(CONFIG_KEY_WSD_MODEL_POOL_PRELOAD):
+            for model_tier in self.model_tier__to__model_name:
+                self._get_sense_provider_for_tier(model_tier)
+
+    @staticmethod
+    def _get_sense_provider_kwargs(
+        sense_key__to__ranking_score: dict[str, int]
+    ) -> dict:
+        return dict(
+            backend=config.get(CONFIG_KEY_WSD_BACKEND),
+            precision=config.get(CONFIG_KEY_WSD_PRECISION),
+            compile_mode=config.get(CONFIG_KEY_WSD_COMPILE),
+            max_batch_examples=config.getint(CONFIG_KEY_WSD_MAX_BATCH_EXAMPLES),
+            max_batch_tokens=config.getint(CONFIG_KEY_WSD_MAX_BATCH_TOKENS),
+            memory_budget_mb=config.getint(CONFIG_KEY_WSD_MEMORY_BUDGET_MB),
+            length_bucket_width=config.getint(CONFIG_KEY_WSD_LENGTH_BUCKET_WIDTH),
+            packed_row_length=config.getint(CONFIG_KEY_WSD_PACKED_ROW_LENGTH),
+            early_exit=config.getboolean(CONFIG_KEY_WSD_EARLY_EXIT),
+            trimmed_vocab=config.getboolean(CONFIG_KEY_WSD_TRIMMED_VOCAB),
+            batch_scheduler_max_wait_ms=(
+                config.getfloat(CONFIG_KEY_WSD_BATCH_SCHEDULER_MAX_WAIT_MS)
+                if config.getboolean(CONFIG_KEY_WSD_BATCH_SCHEDULER)
+                else None
+            ),
+            batch_scheduler_max_batch_examples=config.getint(
+                CONFIG_KEY_WSD_BATCH_SCHEDULER_MAX_BATCH_EXAMPLES
+            ),
+            max_candidate_senses=config.getint(CONFIG_KEY_WSD_MAX_CANDIDATE_SENSES),
+            sense_key__to__ranking_score=sense_key__to__ranking_score,
+        )
+
+    @staticmethod
+    def _get_sense_provider(
+        sense_provider_kwargs: dict,
+    ) -> ESRSenseProvider | CascadeSenseProvider:
+        wsd_engine = config.get(CONFIG_KEY_WSD_ENGINE)
+        if wsd_engine == WSD_ENGINE_CASCADE:
+            return CascadeSenseProvider(
+                ESRSenseProvider(
+                    config.get(CONFIG_KEY_MODEL_NAME), **sense_provider_kwargs
+                ),
+                ESRSenseProvider(
+                    config.get(CONFIG_KEY_WSD_CASCADE_ESCALATION_MODEL_NAME),
+                    **sense_provider_kwargs,
+                ),
+                escalation_margin=config.getfloat(
+                    CONFIG_KEY_WSD_CASCADE_ESCALATION_MARGIN
+                ),
+            )
+        if wsd_engine not in WSD_ENGINE__TO__SENSE_PROVIDER:
+            raise ValueError(f"Unknown WSD engine {wsd_engine}")
+        return WSD_ENGINE__TO__SENSE_PROVIDER[wsd_engine](
+            config.get(CONFIG_KEY_MODEL_NAME), **sense_provider_kwargs
+        )
+
+    @staticmethod
+    def _create_pooled_sense_provider(
+        model_name: str, sense_provider_kwargs: dict
+    ) -> ESRSenseProvider:
+        """
+        With the cascade engine, a model requested by its tier
+        is used on its own, as a cross-encoder.
+        """
+        return WSD_ENGINE__TO__SENSE_PROVIDER.get(
+            config.get(CONFIG_KEY_WSD_ENGINE), ESRSenseProvider
+        )(model_name, **sense_provider_kwargs)
+
+    def _get_resident_sense_providers(
+        self,
+    ) -> dict[str, ESRSenseProvider | CascadeSenseProvider]:
+        """
+        The sense providers of the tiers served without the pool, by model name.
+        With the cascade engine, the tiers of its two models are served by
+        that model alone, without loading it a second time.
+        """
+        model_name = config.get(CONFIG_KEY_MODEL_NAME)
+        if isinstance(self.sense_provider, CascadeSenseProvider):
+            escalation_model_name = config.get(
+                CONFIG_KEY_WSD_CASCADE_ESCALATION_MODEL_NAME
+            )
+            return {
+                model_name: self.sense_provider.first_sense_provider,
+                escalation_model_name: self.sense_provider.escalation_sense_provider,
+            }
+        return {model_name: self.sense_provider}
+
+    def _get_sense_provider_for_tier(
+        self, model_tier: Optional[str]
+    ) -> tuple[ESRSenseProvider | CascadeSenseProvider, str]:
+        """
+        Returns the sense provider and its model id in the sense cache keys.
+        Without a model tier, or if the tier's model is the configured model_name,
+        the default sense provider is used. With the cascade engine, the tiers of
+        its models use them on their own. The other models come from the pool.
+        """
+        if model_tier is None:
+            return self.sense_provider, self.sense_cache_model_id
+        model_name = self.model_tier__to__model_name[model_tier]
+        sense_provider = self._get_resident_sense_providers().get(model_name)
+        if sense_provider is self.sense_provider:
+            return self.sense_provider, self.sense_cache_model_id
+        if sense_provider is None:
+            sense_provider = self.sense_provider_pool.get(model_name)
+        # the model version goes into the cache keys,
+        # as the SQLite cache only tracks the version of the default model
+        return (
+            sense_provider,
+            f"{config.get(CONFIG_KEY_WSD_ENGINE)}/{sense_provider.get_model_version()}",
+        )
 
-    def get_hints(self, text: str, avoid_repetitions: bool = True) -> list[Hint]:
+    @staticmethod
+    def _get_sense_cache(
+        sense_provider: ESRSenseProvider | CascadeSenseProvider,
+    ) -> SentenceSenseCache | SqliteSentenceSenseCache | None:
+        max_sentences = config.getint(CONFIG_KEY_SENSE_CACHE_MAX_SENTENCES)
+        if not max_sentences:
+            return None
+        sense_cache_backend = config.get(CONFIG_KEY_SENSE_CACHE_BACKEND)
+        if sense_cache_backend == SENSE_CACHE_BACKEND_MEMORY:
+            return SentenceSenseCache(max_sentences)
+        if sense_cache_backend == SENSE_CACHE_BACKEND_SQLITE:
+            return SqliteSentenceSenseCache(
+                Path(config.get(CONFIG_KEY_SENSE_CACHE_SQLITE_PATH)),
+                model_version=sense_provider.get_model_version(),
+                max_sentences=max_sentences,
+                ttl_hours=config.getfloat(CONFIG_KEY_SENSE_CACHE_TTL_HOURS),
+            )
+        raise ValueError(f"Unknown sense cache backend {sense_cache_backend}")
+
+    def get_hints(
+        self,
+        text: str,
+        avoid_repetitions: bool = True,
+        difficulty: Optional[int] = None,
+        model_tier: Optional[str] = None,
+    ) -> list[Hint]:
+        """
+        If difficulty is given, hints with a lower difficulty ranking
+        are not returned, and the tokens that can only get such hints
+        aren't disambiguated at all.
+
+        model_tier (one of WSD_MODEL_TIER__TO__MODEL_NAME) selects the WSD model,
+        by default the one configured in config.ini. Raises ModelTierUnavailableError
+        if the tier's model isn't downloaded.
+        """
+        if model_tier is not None and model_tier not in self.model_tier__to__model_name:
+            raise ModelTierUnavailableError(
+                f"The {model_tier} model tier isn't available, available tiers: "
+                f"{sorted(self.model_tier__to__model_name)}"
+            )
         text_holder = TextHolderEN(text, flag_phrasal_verbs=True)
 
+        translatable_tokens = 0
         token_indexes_to_disambiguate = []
         for i, token in enumerate(text_holder.tokens):
-            if token.is_translatable():
+            if not token.is_translatable():
+                continue
+            translatable_tokens += 1
+            if not self._is_easier_than(token, difficulty):
                 token_indexes_to_disambiguate.append(i)
+        with self._metrics_lock:
+            self._translatable_tokens += translatable_tokens
 
-        token_i__to__sense_key: dict[i, str] = self.sense_provider.get_sense_keys(
+        token_i__to__sense_key = self._get_monosemous_sense_keys(
             text_holder, token_indexes_to_disambiguate
         )
+        ambiguous_token_indexes = [
+            i for i in token_indexes_to_disambiguate if i not in token_i__to__sense_key
+        ]
+        if ambiguous_token_indexes:
+            sense_provider, sense_cache_model_id = self._get_sense_provider_for_tier(
+                model_tier
+            )
+            token_i__to__sense_key.update(
+                self._get_ambiguous_sense_keys(
+                    text_holder,
+                    ambiguous_token_indexes,
+                    sense_provider,
+                    sense_cache_model_id,
+                )
+            )
         hints: list[Hint] = self._get_hints(text_holder, token_i__to__sense_key)
+        if difficulty is not None:
+            hints = [
+                hint
+                for hint in hints
+                if hint.difficulty_ranking is None
+                or hint.difficulty_ranking >= difficulty
+            ]
 
         if avoid_repetitions:
             hints = self._deduplicate_hints(hints)
 
         return hints
 
+    def _is_easier_than(self, token: TokenEN, difficulty: Optional[int]) -> bool:
+        """
+        Whether every sense of the token has a lower ranking score than difficulty.
+        Phrasal verbs are never skipped, as their senses are ranked
+        by the phrasal verb while the fallback ranking uses the verb.
+        """
+        if difficulty is None or token.lemma_extended != token.lemma:
+            return False
+        hardest_ranking_score = self.difficulty_ranking.get_hardest_ranking_score(
+            token.lemma, token.pos_simple
+        )
+        return hardest_ranking_score is not None and hardest_ranking_score < difficulty
+
+    def _get_monosemous_sense_keys(
+        self, text_holder: TextHolderEN, token_indexes_to_disambiguate: list[int]
+    ) -> dict[int, str]:
+        """
+        Tokens with a single candidate sense don't need the model.
+        """
+        token_i__to__sense_key: dict[int, str] = {}
+        if self.monosemous_index is not None:
+            for token_i in token_indexes_to_disambiguate:
+                sense_key = self.monosemous_index.get_sense_key(
+                    text_holder.tokens[token_i]
+                )
+                if sense_key is not None:
+                    token_i__to__sense_key[token_i] = sense_key
+        with self._metrics_lock:
+            self._disambiguated_tokens += len(token_indexes_to_disambiguate)
+            self._monosemous_tokens += len(token_i__to__sense_key)
+        return token_i__to__sense_key
+
+    def _get_ambiguous_sense_keys(
+        self,
+        text_holder: TextHolderEN,
+        token_indexes_to_disambiguate: list[int],
+        sense_provider: ESRSenseProvider | CascadeSenseProvider,
+        sense_cache_model_id: str,
+    ) -> dict[int, str]:
+        """
+        The sentences found in the sense cache aren't sent to the sense provider.
+        The sense provider disambiguates each sentence independently,
+        so the cached results don't depend on the rest of the text.
+        The tokens the sense provider gives no sense are cached as None.
+        """
+        if self.sense_cache is None:
+            return sense_provider.get_sense_keys(
+                text_holder, token_indexes_to_disambiguate
+            )
+
+        token_indexes_to_disambiguate_set = set(token_indexes_to_disambiguate)
+        token_i__to__sense_key: dict[int, str] = {}
+        uncached_sentences: list[tuple[str, list[int]]] = []
+        for sentence in split_into_sentences(text_holder.tokens):
+            sentence_indexes = [
+                sentence_i
+                for sentence_i, token_i in enumerate(sentence)
+                if token_i in token_indexes_to_disambiguate_set
+            ]
+            if not sentence_indexes:
+                continue
+            key = get_sentence_cache_key(
+                text_holder.tokens, sentence, sense_cache_model_id
+            )
+            sentence_i__to__sense_key = self.sense_cache.get(key, sentence_indexes)
+            if sentence_i__to__sense_key is None:
+                uncached_sentences.append((key, sentence))
+                continue
+            for sentence_i in sentence_indexes:
+                sense_key = sentence_i__to__sense_key[sentence_i]
+                if sense_key is not None:
+                    token_i__to__sense_key[sentence[sentence_i]] = sense_key
+
+        if not uncached_sentences:
+            return token_i__to__sense_key
+        predicted_token_i__to__sense_key = sense_provider.get_sense_keys(
+            text_holder,
+            [
+                token_i
+                for _, sentence in uncached_sentences
+                for token_i in sentence
+                if token_i in token_indexes_to_disambiguate_set
+            ],
+        )
+        for key, sentence in uncached_sentences:
+            self.sense_cache.put(
+                key,
+                {
+                    sentence_i: predicted_token_i__to__sense_key.get(token_i)
+                    for sentence_i, token_i in enumerate(sentence)
+                    if token_i in token_indexes_to_disambiguate_set
+                },
+            )
+        return token_i__to__sense_key | predicted_token_i__to__sense_key
+
     def _get_hints(
         self, text_holder: TextHolderEN, token_i__to__sense_key: dict[int, str]
     ) -> list[Hint]:
@@ -69,6 +478,44 @@ class EnglishToEnglishHintsProvider:
             hints.append(hint)
         return hints
 
+    def get_metrics(self) -> dict[str, dict[str, float]]:
+        with self._metrics_lock:
+            metrics = {
+                "difficulty_pushdown": {
+                    "tokens": self._translatable_tokens,
+                    "skipped_tokens": self._translatable_tokens
+                    - self._disambiguated_tokens,
+                    "skipped_fraction": (
+                        1 - self._disambiguated_tokens / self._translatable_tokens
+                        if self._translatable_tokens
+                        else 0.0
+                    ),
+                },
+                "monosemous_fast_path": {
+                    "tokens": self._disambiguated_tokens,
+                    "monosemous_tokens": self._monosemous_tokens,
+                    "monosemous_fraction": (
+                        self._monosemous_tokens / self._disambiguated_tokens
+                        if self._disambiguated_tokens
+                        else 0.0
+                    ),
+                },
+            }
+        if self.sense_cache is not None:
+            metrics["sense_cache"] = self.sense_cache.get_metrics()
+        return (
+            metrics
+            | self.sense_provider.get_metrics()
+            | self.sense_provider_pool.get_metrics()
+        )
+
+    def close(self) -> None:
+        """
+        Stops the batch scheduler threads of the sense providers (at shutdown).
+        """
+        self.sense_provider.close()
+        self.sense_provider_pool.close()
+
     @staticmethod
     def _deduplicate_hints(hints: list[Hint]) -> list[Hint]:
         deduplicated: list[Hint] = []
@@ -1,8 +1,8 @@
 import dataclasses
-from typing import Optional
+from typing import Literal, Optional
 
 import lambdawarmer
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import RedirectResponse
 from mangum import Mangum
@@ -10,7 +10,10 @@ from pydantic import BaseModel, Field, root_validator
 
 from smart_word_hints_api.app.config import config
 from smart_word_hints_api.app.constants import CONFIG_KEY_LAMBDAWARMER_SEND_METRIC, EN
-from smart_word_hints_api.app.hints_providers import EnglishToEnglishHintsProvider
+from smart_word_hints_api.app.hints_providers import (
+    EnglishToEnglishHintsProvider,
+    ModelTierUnavailableError,
+)
 
 VALID_LANG_PAIRS = [(EN, EN)]
 
@@ -40,6 +43,21 @@ class HintsOptions(BaseModel):
         default=True,
         description="Specifies if repeating the same hints should be avoided",
     )
+    difficulty: Optional[int] = Field(
+        default=None,
+        description=(
+            "If specified, only hints with a difficulty ranking "
+            "of at least this value are returned"
+        ),
+    )
+
+    model_tier: Optional[Literal["fast", "balanced", "best"]] = Field(
+        default=None,
+        description=(
+            "The WSD model: fast, balanced or best. "
+            "If not specified, the default model of the server is used"
+        ),
+    )
 
     @root_validator
     def are_valid_languages(cls, values):
@@ -58,16 +76,32 @@ class WordHintsRequest(BaseModel):
 en_to_en_hints_provider = EnglishToEnglishHintsProvider()
 
 
+@app.on_event("shutdown")
+def close_hints_provider():
+    en_to_en_hints_provider.close()
+
+
 @app.post(f"/api/v{MAJOR_VERSION}/get_hints")
 @app.post("/api/latest/get_hints")
-async def get_hints(request_body: WordHintsRequest):
-    hints = en_to_en_hints_provider.get_hints(
-        request_body.text,
-        request_body.options.avoid_repetitions,  # type: ignore
-    )
+def get_hints(request_body: WordHintsRequest):
+    try:
+        hints = en_to_en_hints_provider.get_hints(
+            request_body.text,
+            request_body.options.avoid_repetitions,  # type: ignore
+            request_body.options.difficulty,  # type: ignore
+            request_body.options.model_tier,  # type: ignore
+        )
+    except ModelTierUnavailableError as e:
+        raise HTTPException(status_code=422, detail=str(e))
     return {"hints": [dataclasses.asdict(hint) for hint in hints]}
 
 
+@app.get(f"/api/v{MAJOR_VERSION}/metrics")
+@app.get("/api/latest/metrics")
+def metrics():
+    return en_to_en_hints_provider.get_metrics()
+
+
 @app.get(f"/api/v{MAJOR_VERSION}/available_languages")
 @app.get("/api/latest/available_languages")
 def available_languages():
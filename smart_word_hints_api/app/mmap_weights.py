@@ -0,0 +1,120 @@
+"""
+Loading of the WSD models from safetensors files through mmap, so that the weights
+aren't copied into the memory of each process: they are shared between the gunicorn
+workers through the OS page cache, and loaded lazily.
+
+Convert the .bin checkpoints (done when building the Docker images):
+python -m smart_word_hints_api.app.mmap_weights
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+from pathlib import Path
+from typing import Iterator, Optional
+
+import torch
+import torch.nn as nn
+from safetensors.torch import load_file, save_file
+from transformers import PretrainedConfig
+from transformers.modeling_utils import no_init_weights
+
+from smart_word_hints_api.app.constants import (
+    MODEL_NAME__TO__SAFETENSORS_MODEL_RELATIVE_PATH,
+)
+from smart_word_hints_api.app.distilroberta_for_wsd import DistilRobertaForWsd
+
+# the torch.nn.init functions used by the default initialization of the layers
+TORCH_RANDOM_INIT_FUNCTION_NAMES = [
+    "uniform_",
+    "normal_",
+    "trunc_normal_",
+    "kaiming_uniform_",
+    "kaiming_normal_",
+    "xavier_uniform_",
+    "xavier_normal_",
+]
+
+
+def get_safetensors_model_path(model_name: str) -> Path:
+    return (
+        Path(__file__).parent
+        / MODEL_NAME__TO__SAFETENSORS_MODEL_RELATIVE_PATH[model_name]
+    )
+
+
+@contextlib.contextmanager
+def skip_random_init() -> Iterator[None]:
+    """
+    The weights are about to be replaced, so the layers are created without
+    initializing (and so without touching the memory of) their weights.
+    """
+    original_functions = {
+        name: getattr(nn.init, name) for name in TORCH_RANDOM_INIT_FUNCTION_NAMES
+    }
+    for name in TORCH_RANDOM_INIT_FUNCTION_NAMES:
+        setattr(nn.init, name, lambda tensor, *args, **kwargs: tensor)
+    try:
+        with no_init_weights():
+            yield
+    finally:
+        for name, function in original_functions.items():
+            setattr(nn.init, name, function)
+
+
+def load_mmapped_model(
+    model_name: str, model_config: PretrainedConfig
+) -> Optional[DistilRobertaForWsd]:
+    """
+    None if the safetensors file wasn't built.
+    """
+    safetensors_path = get_safetensors_model_path(model_name)
+    if not safetensors_path.exists():
+        return None
+
+    with skip_random_init():
+        model = DistilRobertaForWsd(model_config)
+    # safetensors maps the file with MAP_PRIVATE, the tensors are views of the mapping
+    state_dict = load_file(safetensors_path)
+    model_tensors = model.state_dict(keep_vars=True)
+    if state_dict.keys() != model_tensors.keys():
+        raise ValueError(
+            f"{safetensors_path} doesn't match the model: "
+            f"missing {sorted(model_tensors.keys() - state_dict.keys())}, "
+            f"unexpected {sorted(state_dict.keys() - model_tensors.keys())}"
+        )
+    for name, tensor in state_dict.items():
+        model_tensors[name].data = tensor
+    return model.eval()
+
+
+def convert_to_safetensors(model: nn.Module, safetensors_path: Path) -> None:
+    save_file(
+        {name: tensor.contiguous() for name, tensor in model.state_dict().items()},
+        str(safetensors_path),
+    )
+
+
+if __name__ == "__main__":
+    from smart_word_hints_api.app.esr_sense_provider import get_checkpoint_path
+    from smart_word_hints_api.app.model_files import load_model_config
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "model_names",
+        nargs="*",
+        default=list(MODEL_NAME__TO__SAFETENSORS_MODEL_RELATIVE_PATH),
+    )
+    args = parser.parse_args()
+    for model_name in args.model_names:
+        if not get_checkpoint_path(model_name).exists():
+            print(f"{get_checkpoint_path(model_name)} not found, skipping {model_name}")
+            continue
+        with torch.no_grad():
+            convert_to_safetensors(
+                DistilRobertaForWsd.from_pretrained(
+                    get_checkpoint_path(model_name),
+                    config=load_model_config(model_name),
+                ),
+                get_safetensors_model_path(model_name),
+            )
@@ -0,0 +1,96 @@
+"""
+The configs and the fast tokenizers of the WSD models, bundled next to the weights
+so that loading them doesn't go through the Hugging Face hub (cache).
+
+Bundle (done when building the Docker images, needs network access):
+python -m smart_word_hints_api.app.model_files
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import socket
+from pathlib import Path
+from typing import Iterator
+
+import transformers
+from transformers import PretrainedConfig, PreTrainedTokenizerFast
+
+from smart_word_hints_api.app.constants import WSD_MODEL_FILES_RELATIVE_PATH
+from smart_word_hints_api.app.pruning import apply_pruning
+
+
+def get_model_files_dir(model_name: str) -> Path:
+    return Path(__file__).parent / WSD_MODEL_FILES_RELATIVE_PATH / model_name
+
+
+def load_model_config(model_name: str) -> PretrainedConfig:
+    """
+    From the bundled files if they exist, otherwise from the hub.
+    With the structure of the checkpoint applied if it is pruned.
+    """
+    model_files_dir = get_model_files_dir(model_name)
+    if model_files_dir.exists():
+        model_config = transformers.AutoConfig.from_pretrained(
+            model_files_dir, local_files_only=True
+        )
+    else:
+        model_config = transformers.AutoConfig.from_pretrained(model_name)
+    apply_pruning(model_config, model_name)
+    return model_config
+
+
+def load_tokenizer(model_name: str) -> PreTrainedTokenizerFast:
+    """
+    From the bundled files if they exist, otherwise from the hub.
+    """
+    model_files_dir = get_model_files_dir(model_name)
+    if model_files_dir.exists():
+        return transformers.AutoTokenizer.from_pretrained(
+            model_files_dir, local_files_only=True, use_fast=True
+        )
+    return transformers.AutoTokenizer.from_pretrained(model_name, use_fast=True)
+
+
+class NetworkAccessError(RuntimeError):
+    pass
+
+
+@contextlib.contextmanager
+def no_network_access() -> Iterator[None]:
+    """
+    Any attempt to open a connection inside the block raises NetworkAccessError.
+    """
+
+    def connect(*args, **kwargs):
+        raise NetworkAccessError(f"Network access at startup: {args}")
+
+    original_connect = socket.socket.connect
+    original_create_connection = socket.create_connection
+    socket.socket.connect = connect
+    socket.create_connection = connect
+    try:
+        yield
+    finally:
+        socket.socket.connect = original_connect
+        socket.create_connection = original_create_connection
+
+
+def bundle_model_files(model_name: str) -> None:
+    model_files_dir = get_model_files_dir(model_name)
+    transformers.AutoConfig.from_pretrained(model_name).save_pretrained(model_files_dir)
+    transformers.AutoTokenizer.from_pretrained(
+        model_name, use_fast=True
+    ).save_pretrained(model_files_dir)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "model_names",
+        nargs="*",
+        default=["distilroberta-base", "roberta-base", "roberta-large"],
+    )
+    args = parser.parse_args()
+    for model_name in args.model_names:
+        bundle_model_files(model_name)
@@ -0,0 +1,72 @@
+"""
+Index of the (lemma, WordNet POS) pairs that have exactly one WordNet sense.
+Tokens whose candidate senses are just one sense are resolved without the model.
+
+Build (done when building the Docker images):
+python -m smart_word_hints_api.app.monosemous_index
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Optional
+
+from nltk.corpus import wordnet as wn
+
+from smart_word_hints_api.app.constants import EN_MONOSEMOUS_INDEX_RELATIVE_PATH
+from smart_word_hints_api.app.token_wrappers import TokenEN
+from smart_word_hints_api.app.wsd_input import get_wordnet_lemma_and_pos
+
+
+def get_monosemous_index_path() -> Path:
+    return Path(__file__).parent / EN_MONOSEMOUS_INDEX_RELATIVE_PATH
+
+
+class MonosemousSenseIndex:
+    def __init__(self, index_path: Path) -> None:
+        self.lemma_pos__to__sense_key: dict[tuple[str, str], str] = {}
+        with open(index_path, "r") as f:
+            for line in f.read().splitlines():
+                lemma, pos, sense_key = line.split("\t")
+                self.lemma_pos__to__sense_key[(lemma, pos)] = sense_key
+
+    @classmethod
+    def load_if_built(cls) -> Optional[MonosemousSenseIndex]:
+        index_path = get_monosemous_index_path()
+        if not index_path.exists():
+            return None
+        return cls(index_path)
+
+    def get_sense_key(self, token: TokenEN) -> Optional[str]:
+        """
+        The only candidate sense of the token, None if it has more than one
+        (or none, or its POS isn't a WordNet POS).
+        """
+        lemma, wordnet_pos = get_wordnet_lemma_and_pos(token)
+        if wordnet_pos is None:
+            return None
+        return self.lemma_pos__to__sense_key.get((lemma.lower(), wordnet_pos))
+
+
+def build_monosemous_index(index_path: Path) -> None:
+    """
+    Matches wn.lemmas(lemma, pos), which compares lemma names case-insensitively
+    and returns the adjective satellites for the adjective POS.
+    """
+    lemma_pos__to__sense_keys: dict[tuple[str, str], list[str]] = {}
+    for synset in wn.all_synsets():
+        pos = wn.ADJ if synset.pos() == wn.ADJ_SAT else synset.pos()
+        for lemma in synset.lemmas():
+            lemma_pos__to__sense_keys.setdefault(
+                (lemma.name().lower(), pos), []
+            ).append(lemma.key())
+
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(index_path, "w") as f:
+        for (lemma, pos), sense_keys in sorted(lemma_pos__to__sense_keys.items()):
+            if len(sense_keys) == 1:
+                f.write(f"{lemma}\t{pos}\t{sense_keys[0]}\n")
+
+
+if __name__ == "__main__":
+    build_monosemous_index(get_monosemous_index_path())
@@ -0,0 +1,115 @@
+"""
+ONNX Runtime backend for the WSD models (wsd_backend = onnx in config.ini).
+
+Export a model to ONNX and optimize its graph before switching wsd_backend to onnx:
+python -m smart_word_hints_api.app.onnx_wsd_model distilroberta-base
+"""
+from __future__ import annotations
+
+import argparse
+import tempfile
+from pathlib import Path
+
+import onnxruntime as ort
+import torch
+from onnxruntime.transformers import optimizer
+from transformers import PretrainedConfig
+
+from smart_word_hints_api.app.constants import (
+    MODEL_NAME__TO__ONNX_MODEL_RELATIVE_PATH,
+    ONNX_OPSET_VERSION,
+    WSD_BACKEND_TORCH,
+    WSD_MODEL_INPUT_NAMES,
+)
+from smart_word_hints_api.app.distilroberta_for_wsd import DistilRobertaForWsd
+from smart_word_hints_api.app.wsd_input import get_dummy_batch
+
+
+def get_onnx_model_path(model_name: str) -> Path:
+    return Path(__file__).parent / MODEL_NAME__TO__ONNX_MODEL_RELATIVE_PATH[model_name]
+
+
+class OnnxWsdModel:
+    """
+    Called the same way as DistilRobertaForWsd in inference,
+    returns a tuple with the probabilities of each example being correct.
+    """
+
+    def __init__(self, onnx_path: Path) -> None:
+        session_options = ort.SessionOptions()
+        session_options.graph_optimization_level = (
+            ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        )
+        self.session = ort.InferenceSession(
+            str(onnx_path), session_options, providers=["CPUExecutionProvider"]
+        )
+        # inputs not used by the model (token_type_ids) are dropped by the export
+        self.input_names = {
+            model_input.name for model_input in self.session.get_inputs()
+        }
+
+    def __call__(self, **batch: torch.Tensor) -> tuple[torch.Tensor]:
+        (probs,) = self.session.run(
+            None,
+            {
+                name: tensor.numpy()
+                for name, tensor in batch.items()
+                if name in self.input_names
+            },
+        )
+        return (torch.from_numpy(probs),)
+
+
+def export_to_onnx(
+    model: DistilRobertaForWsd, model_config: PretrainedConfig, onnx_path: Path
+) -> None:
+    """
+    Batch size and sequence length are dynamic axes. The exported graph
+    is then optimized with the transformer-specific fusions of ONNX Runtime.
+    """
+    model.eval()
+    dummy_batch = get_dummy_batch(batch_size=2, sequence_length=16)
+    dynamic_axes = {
+        name: {0: "batch", 1: "sequence"}
+        for name in WSD_MODEL_INPUT_NAMES
+        if name != "instance_lens"
+    }
+    dynamic_axes["instance_lens"] = {0: "batch"}
+    dynamic_axes["probs"] = {0: "batch"}
+
+    with tempfile.TemporaryDirectory() as temporary_dir:
+        raw_onnx_path = Path(temporary_dir) / "model.onnx"
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                tuple(dummy_batch[name] for name in WSD_MODEL_INPUT_NAMES),
+                str(raw_onnx_path),
+                input_names=list(WSD_MODEL_INPUT_NAMES),
+                output_names=["probs"],
+                dynamic_axes=dynamic_axes,
+                opset_version=ONNX_OPSET_VERSION,
+                do_constant_folding=True,
+            )
+        optimized_model = optimizer.optimize_model(
+            str(raw_onnx_path),
+            model_type="bert",
+            num_heads=model_config.num_attention_heads,
+            hidden_size=model_config.hidden_size,
+        )
+        onnx_path.parent.mkdir(parents=True, exist_ok=True)
+        optimized_model.save_model_to_file(str(onnx_path))
+
+
+if __name__ == "__main__":
+    from smart_word_hints_api.app.esr_sense_provider import ESRSenseProvider
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("model_names", nargs="+")
+    args = parser.parse_args()
+    for model_name in args.model_names:
+        sense_provider = ESRSenseProvider(model_name, backend=WSD_BACKEND_TORCH)
+        export_to_onnx(
+            sense_provider.model,
+            sense_provider.config,
+            get_onnx_model_path(model_name),
+        )
@@ -0,0 +1,94 @@
+"""
+Structured pruning of the WSD models: whole attention heads and feed-forward
+neurons are removed, so the pruned model has smaller weight matrices.
+
+The structure of a pruned checkpoint (the pruned heads and the number of
+feed-forward neurons left in each layer) is saved next to it, in the
+.pruning.json file of the model. load_model_config applies it to the config,
+so DistilRobertaForWsd is created with the pruned structure wherever it is loaded.
+
+Prune a model, reporting the parameters, latency and accuracy of each pruning level,
+and install one of the levels in place of the checkpoint:
+PYTHONPATH=. python scripts/wsd_inference/prune_wsd_model.py \
+    --xml semcor.data.xml --gold_keys semcor.gold.key.txt --install_level 0.3
+"""
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Optional
+
+import torch
+from transformers import PretrainedConfig
+from transformers.pytorch_utils import prune_linear_layer
+
+from smart_word_hints_api.app.constants import MODEL_NAME__TO__PRUNING_RELATIVE_PATH
+from smart_word_hints_api.app.distilroberta_for_wsd import DistilRobertaForWsd
+
+
+def get_pruning_path(model_name: str) -> Path:
+    return Path(__file__).parent / MODEL_NAME__TO__PRUNING_RELATIVE_PATH[model_name]
+
+
+def load_pruning(model_name: str) -> Optional[dict]:
+    """
+    None if the checkpoint of model_name isn't pruned.
+    """
+    pruning_path = get_pruning_path(model_name)
+    if not pruning_path.exists():
+        return None
+    with open(pruning_path, "r") as f:
+        return json.load(f)
+
+
+def apply_pruning(model_config: PretrainedConfig, model_name: str) -> None:
+    """
+    Sets the pruned structure of the checkpoint of model_name (if it is pruned)
+    on its config.
+    """
+    pruning = load_pruning(model_name)
+    if pruning is None:
+        return
+    model_config.pruned_heads = {
+        int(layer_i): heads for layer_i, heads in pruning["pruned_heads"].items()
+    }
+    model_config.intermediate_sizes = pruning["intermediate_sizes"]
+
+
+def prune_model(
+    model: DistilRobertaForWsd,
+    layer__to__heads_to_prune: dict[int, list[int]],
+    layer__to__neurons_to_keep: dict[int, list[int]],
+) -> None:
+    """
+    Prunes in place the given heads (indexes of the unpruned model)
+    and all the feed-forward neurons but the given ones.
+    """
+    model.prune_heads(layer__to__heads_to_prune)
+    for layer_i, neurons_to_keep in layer__to__neurons_to_keep.items():
+        layer = model.roberta.encoder.layer[layer_i]
+        index = torch.tensor(sorted(neurons_to_keep))
+        layer.intermediate.dense = prune_linear_layer(
+            layer.intermediate.dense, index, dim=0
+        )
+        layer.output.dense = prune_linear_layer(layer.output.dense, index, dim=1)
+    model.config.intermediate_sizes = [
+        layer.intermediate.dense.out_features for layer in model.roberta.encoder.layer
+    ]
+
+
+def save_pruned_model(
+    model: DistilRobertaForWsd, checkpoint_path: Path, pruning_path: Path
+) -> None:
+    torch.save(model.state_dict(), checkpoint_path)
+    with open(pruning_path, "w") as f:
+        json.dump(
+            {
+                "pruned_heads": {
+                    str(layer_i): sorted(heads)
+                    for layer_i, heads in model.config.pruned_heads.items()
+                },
+                "intermediate_sizes": model.config.intermediate_sizes,
+            },
+            f,
+        )
@@ -0,0 +1,108 @@
+"""
+Dynamic int8 quantization of the Linear layers of the WSD models for CPU inference
+(wsd_precision = int8 in config.ini).
+
+The quantized weights are cached next to the fp32 checkpoint, so that the conversion
+doesn't run at startup. The cache is tied to the checkpoint it was built from
+(by its size and modification time). Build it (done when building the Docker images):
+python -m smart_word_hints_api.app.quantization
+"""
+from __future__ import annotations
+
+import argparse
+import functools
+import logging
+from pathlib import Path
+from typing import Callable
+
+import torch
+import torch.nn as nn
+from transformers import PretrainedConfig
+
+from smart_word_hints_api.app.constants import MODEL_NAME__TO__INT8_MODEL_RELATIVE_PATH
+from smart_word_hints_api.app.distilroberta_for_wsd import DistilRobertaForWsd
+
+logger = logging.getLogger(__name__)
+
+
+def get_int8_model_path(model_name: str) -> Path:
+    return Path(__file__).parent / MODEL_NAME__TO__INT8_MODEL_RELATIVE_PATH[model_name]
+
+
+def get_checkpoint_version(checkpoint_path: Path) -> str:
+    checkpoint_stat = checkpoint_path.stat()
+    return f"{checkpoint_stat.st_size}:{int(checkpoint_stat.st_mtime)}"
+
+
+def quantize_dynamic_int8(model: nn.Module) -> nn.Module:
+    return torch.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+def load_int8_model(
+    model_name: str,
+    model_config: PretrainedConfig,
+    load_fp32_model: Callable[[], nn.Module],
+    checkpoint_path: Path,
+) -> nn.Module:
+    """
+    If the quantized weights of the checkpoint are cached, the fp32 checkpoint isn't
+    loaded at all: an empty model with the quantized structure is created and the
+    cached weights are loaded into it. Otherwise, the fp32 model is quantized
+    at startup. The result isn't cached then: the app directory can be read-only
+    (AWS Lambda) and is shared by the gunicorn workers.
+    """
+    int8_model_path = get_int8_model_path(model_name)
+    if not int8_model_path.exists():
+        logger.warning("%s isn't built, quantizing %s", int8_model_path, model_name)
+        return quantize_dynamic_int8(load_fp32_model().eval())
+    cached = torch.load(int8_model_path)
+    if cached["checkpoint_version"] != get_checkpoint_version(checkpoint_path):
+        logger.warning(
+            "%s was built from another checkpoint, quantizing %s",
+            int8_model_path,
+            model_name,
+        )
+        return quantize_dynamic_int8(load_fp32_model().eval())
+    model = quantize_dynamic_int8(DistilRobertaForWsd(model_config).eval())
+    model.load_state_dict(cached["state_dict"])
+    return model
+
+
+def build_int8_model(
+    model_name: str, load_fp32_model: Callable[[], nn.Module], checkpoint_path: Path
+) -> None:
+    model = quantize_dynamic_int8(load_fp32_model().eval())
+    torch.save(
+        {
+            "checkpoint_version": get_checkpoint_version(checkpoint_path),
+            "state_dict": model.state_dict(),
+        },
+        get_int8_model_path(model_name),
+    )
+
+
+if __name__ == "__main__":
+    from smart_word_hints_api.app.esr_sense_provider import get_checkpoint_path
+    from smart_word_hints_api.app.model_files import load_model_config
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "model_names",
+        nargs="*",
+        default=list(MODEL_NAME__TO__INT8_MODEL_RELATIVE_PATH),
+    )
+    args = parser.parse_args()
+    for model_name in args.model_names:
+        checkpoint_path = get_checkpoint_path(model_name)
+        if not checkpoint_path.exists():
+            print(f"{checkpoint_path} not found, skipping {model_name}")
+            continue
+        build_int8_model(
+            model_name,
+            functools.partial(
+                DistilRobertaForWsd.from_pretrained,
+                checkpoint_path,
+                config=load_model_config(model_name),
+            ),
+            checkpoint_path,
+        )
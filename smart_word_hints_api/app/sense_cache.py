@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from smart_word_hints_api.app.constants import (
+    SENSE_CACHE_EVICTION_INTERVAL_PUTS,
+    SENSE_CACHE_SQLITE_TIMEOUT_S,
+)
+from smart_word_hints_api.app.token_wrappers import TokenEN
+
+
+def get_sentence_cache_key(
+    tokens: list[TokenEN], sentence: list[int], model_id: str
+) -> str:
+    """
+    The sentence text normalized to its tokens (with their tags, on which
+    the candidate senses depend), so that whitespace differences don't matter.
+    """
+    return (
+        model_id
+        + "\t"
+        + " ".join(
+            f"{tokens[token_i].text}/{tokens[token_i].tag}" for token_i in sentence
+        )
+    )
+
+
+class SentenceSenseCache:
+    """
+    In-process LRU cache of the sense keys of the disambiguated tokens
+    of a sentence, by their index within the sentence. A token that got
+    no sense (e.g. it has no WordNet candidates) is stored as None, so that
+    its sentence is still a hit.
+    """
+
+    def __init__(self, max_sentences: int) -> None:
+        self.max_sentences = max_sentences
+        self._sentences: OrderedDict[str, dict[int, Optional[str]]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(
+        self, key: str, token_indexes: list[int]
+    ) -> Optional[dict[int, Optional[str]]]:
+        """
+        A hit only if all of token_indexes were disambiguated before.
+        """
+        with self._lock:
+            sentence_i__to__sense_key = self._sentences.get(key)
+            if sentence_i__to__sense_key is None or not all(
+                token_i in sentence_i__to__sense_key for token_i in token_indexes
+            ):
+                self._misses += 1
+                return None
+            self._sentences.move_to_end(key)
+            self._hits += 1
+            return sentence_i__to__sense_key
+
+    def put(
+        self, key: str, sentence_i__to__sense_key: dict[int, Optional[str]]
+    ) -> None:
+        with self._lock:
+            self._sentences[key] = (
+                self._sentences.pop(key, {}) | sentence_i__to__sense_key
+            )
+            while len(self._sentences) > self.max_sentences:
+                self._sentences.popitem(last=False)
+
+    def get_metrics(self) -> dict[str, float]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "sentences": len(self._sentences),
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+            }
+
+
+class SqliteSentenceSenseCache:
+    """
+    The same as SentenceSenseCache, but persistent and shared between processes
+    (the gunicorn workers on a node, or the consecutive Lambda containers
+    if the database is on a mounted volume), stored in SQLite in WAL mode,
+    so that readers don't block each other or the writer.
+
+    Entries older than ttl_hours are ignored and deleted, and the oldest
+    entries are deleted above max_sentences. Entries of other model versions
+    are deleted at startup.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sentences (
+            key TEXT PRIMARY KEY,
+            model_version TEXT NOT NULL,
+            sense_keys TEXT NOT NULL,
+            created_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS sentences_created_at ON sentences (created_at);
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        model_version: str,
+        max_sentences: int,
+        ttl_hours: float,
+        eviction_interval_puts: int = SENSE_CACHE_EVICTION_INTERVAL_PUTS,
+    ) -> None:
+        self.db_path = db_path
+        self.model_version = model_version
+        self.max_sentences = max_sentences
+        self.ttl_s = ttl_hours * 3600
+        self.eviction_interval_puts = eviction_interval_puts
+        self._local = threading.local()
+        self._metrics_lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._puts = 0
+
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connection() as connection:
+            connection.executescript(self.SCHEMA)
+            connection.execute(
+                "DELETE FROM sentences WHERE model_version != ?", (model_version,)
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        sqlite3 connections can't be shared between threads, so there is
+        one per thread.
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(
+                self.db_path, timeout=SENSE_CACHE_SQLITE_TIMEOUT_S
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get(
+        self, key: str, token_indexes: list[int]
+    ) -> Optional[dict[int, Optional[str]]]:
+        row = (
+            self._connection()
+            .execute(
+                "SELECT sense_keys FROM sentences "
+                "WHERE key = ? AND model_version = ? AND created_at >= ?",
+                (key, self.model_version, time.time() - self.ttl_s),
+            )
+            .fetchone()
+        )
+        sentence_i__to__sense_key = None if row is None else _loads(row[0])
+        with self._metrics_lock:
+            if sentence_i__to__sense_key is None or not all(
+                token_i in sentence_i__to__sense_key for token_i in token_indexes
+            ):
+                self._misses += 1
+                return None
+            self._hits += 1
+            return sentence_i__to__sense_key
+
+    def put(
+        self, key: str, sentence_i__to__sense_key: dict[int, Optional[str]]
+    ) -> None:
+        connection = self._connection()
+        with connection:
+            row = connection.execute(
+                "SELECT sense_keys FROM sentences WHERE key = ? AND model_version = ?",
+                (key, self.model_version),
+            ).fetchone()
+            if row is not None:
+                sentence_i__to__sense_key = _loads(row[0]) | sentence_i__to__sense_key
+            connection.execute(
+                "INSERT OR REPLACE INTO sentences "
+                "(key, model_version, sense_keys, created_at) VALUES (?, ?, ?, ?)",
+                (
+                    key,
+                    self.model_version,
+                    json.dumps(sentence_i__to__sense_key),
+                    time.time(),
+                ),
+            )
+        with self._metrics_lock:
+            self._puts += 1
+            evict = self._puts % self.eviction_interval_puts == 0
+        if evict:
+            self.evict()
+
+    def evict(self) -> None:
+        connection = self._connection()
+        with connection:
+            connection.execute(
+                "DELETE FROM sentences WHERE created_at < ?",
+                (time.time() - self.ttl_s,),
+            )
+            connection.execute(
+                "DELETE FROM sentences WHERE key IN ("
+                "SELECT key FROM sentences ORDER BY created_at DESC "
+                "LIMIT -1 OFFSET ?)",
+                (self.max_sentences,),
+            )
+
+    def get_metrics(self) -> dict[str, float]:
+        (sentences,) = (
+            self._connection().execute("SELECT COUNT(*) FROM sentences").fetchone()
+        )
+        with self._metrics_lock:
+            lookups = self._hits + self._misses
+            return {
+                "sentences": sentences,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+            }
+
+
+def _loads(sense_keys: str) -> dict[int, Optional[str]]:
+    """
+    JSON object keys are strings.
+    """
+    return {
+        int(sentence_i): sense_key
+        for sentence_i, sense_key in json.loads(sense_keys).items()
+    }
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import logging
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Callable, Optional
+
+if TYPE_CHECKING:
+    from smart_word_hints_api.app.esr_sense_provider import ESRSenseProvider
+
+logger = logging.getLogger(__name__)
+
+
+class SenseProviderPool:
+    """
+    Sense providers of several models, each created on the first request for
+    its model. When the estimated memory of the loaded models, plus
+    resident_memory_mb of the models kept outside of the pool (the default
+    model), exceeds max_memory_mb, the least recently used ones are closed
+    and dropped (never the one just requested). max_memory_mb = 0 means no limit.
+
+    A model is loaded outside of the pool lock, so that requests for the models
+    already loaded aren't blocked by it. Concurrent first requests for the same
+    model wait for a single load.
+    """
+
+    def __init__(
+        self,
+        create_sense_provider: Callable[[str], ESRSenseProvider],
+        max_memory_mb: int,
+        resident_memory_mb: float = 0.0,
+    ) -> None:
+        self.create_sense_provider = create_sense_provider
+        self.max_memory_mb = max_memory_mb
+        self.resident_memory_mb = resident_memory_mb
+        self._lock = threading.Lock()
+        self._model_name__to__load_lock: dict[str, threading.Lock] = {}
+        self._model_name__to__sense_provider: OrderedDict[
+            str, ESRSenseProvider
+        ] = OrderedDict()
+        self._model_name__to__memory_mb: dict[str, float] = {}
+        self._loads = 0
+        self._evictions = 0
+
+    def get(self, model_name: str) -> ESRSenseProvider:
+        sense_provider = self._get_loaded(model_name)
+        if sense_provider is not None:
+            return sense_provider
+
+        with self._lock:
+            load_lock = self._model_name__to__load_lock.setdefault(
+                model_name, threading.Lock()
+            )
+        with load_lock:
+            sense_provider = self._get_loaded(model_name)
+            if sense_provider is not None:
+                return sense_provider
+            sense_provider = self.create_sense_provider(model_name)
+            memory_mb = sense_provider.get_model_memory_mb()
+            logger.info("Loaded WSD model %s (%.0f MB)", model_name, memory_mb)
+            with self._lock:
+                self._model_name__to__sense_provider[model_name] = sense_provider
+                self._model_name__to__memory_mb[model_name] = memory_mb
+                self._loads += 1
+                evicted = self._evict_over_memory_limit()
+        for evicted_model_name, evicted_sense_provider in evicted:
+            evicted_sense_provider.close()
+            logger.info("Evicted WSD model %s", evicted_model_name)
+        return sense_provider
+
+    def close(self) -> None:
+        """
+        Closes and drops all the loaded sense providers.
+        """
+        with self._lock:
+            sense_providers = list(self._model_name__to__sense_provider.values())
+            self._model_name__to__sense_provider.clear()
+            self._model_name__to__memory_mb.clear()
+        for sense_provider in sense_providers:
+            sense_provider.close()
+
+    def _get_loaded(self, model_name: str) -> Optional[ESRSenseProvider]:
+        with self._lock:
+            sense_provider = self._model_name__to__sense_provider.get(model_name)
+            if sense_provider is not None:
+                self._model_name__to__sense_provider.move_to_end(model_name)
+            return sense_provider
+
+    def _evict_over_memory_limit(self) -> list[tuple[str, ESRSenseProvider]]:
+        """
+        Called with the pool lock held, right after a load.
+        The evicted sense providers are closed by the caller, outside of the lock.
+        Requests already holding an evicted sense provider still finish with it.
+        """
+        evicted: list[tuple[str, ESRSenseProvider]] = []
+        if not self.max_memory_mb:
+            return evicted
+        while (
+            len(self._model_name__to__sense_provider) > 1
+            and self.resident_memory_mb + sum(self._model_name__to__memory_mb.values())
+            > self.max_memory_mb
+        ):
+            model_name, sense_provider = self._model_name__to__sense_provider.popitem(
+                last=False
+            )
+            del self._model_name__to__memory_mb[model_name]
+            self._evictions += 1
+            evicted.append((model_name, sense_provider))
+        return evicted
+
+    def get_metrics(self) -> dict[str, dict[str, float]]:
+        with self._lock:
+            metrics = {
+                "model_pool": {
+                    "loaded_models": len(self._model_name__to__sense_provider),
+                    "loads": self._loads,
+                    "evictions": self._evictions,
+                    "models_memory_mb": sum(self._model_name__to__memory_mb.values()),
+                    "resident_memory_mb": self.resident_memory_mb,
+                    "max_memory_mb": self.max_memory_mb,
+                },
+                "model_pool_memory_mb": dict(self._model_name__to__memory_mb),
+            }
+            sense_providers = list(self._model_name__to__sense_provider.items())
+        process_rss_mb = get_process_rss_mb()
+        if process_rss_mb is not None:
+            metrics["model_pool"]["process_rss_mb"] = process_rss_mb
+        for model_name, sense_provider in sense_providers:
+            for name, provider_metrics in sense_provider.get_metrics().items():
+                metrics[f"model_pool_{model_name}_{name}"] = provider_metrics
+        return metrics
+
+
+def get_process_rss_mb() -> Optional[float]:
+    """
+    The resident memory of the whole process, None where /proc isn't available.
+    """
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS"):
+                    return int(line.split(":")[1].split()[0]) / 1024
+    except OSError:
+        pass
+    return None
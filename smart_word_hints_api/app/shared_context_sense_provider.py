@@ -0,0 +1,236 @@
+"""
+Shared-context inference (wsd_engine = shared-context in config.ini): instead of
+one (context, gloss) sequence per candidate sense, the context of an instance
+is encoded once in a pack followed by all of its candidate glosses.
+
+Each gloss gets its own copies of the tokens the score is read from (<s> and the
+instance tokens) at their original positions. A structured attention mask keeps
+the glosses apart: the context attends only to itself, the copies and the gloss
+of a sense attend to each other and to the context. The position ids of each gloss
+are the ones it would have right after the context, so a gloss is scored the same
+way whichever other glosses are packed with it.
+
+Unlike in the cross-encoder, the context doesn't attend to the gloss, so with
+more than one encoder layer the scores are an approximation of the cross-encoder
+ones (see scripts/wsd_inference/evaluate_shared_context.py).
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+import torch
+
+from smart_word_hints_api.app.constants import (
+    WSD_BACKEND_TORCH,
+    WSD_COMPILE_NONE,
+    WSD_PRECISION_BF16,
+)
+from smart_word_hints_api.app.distilroberta_for_wsd import DistilRobertaForWsd
+from smart_word_hints_api.app.esr_sense_provider import ESRModels, ESRSenseProvider
+from smart_word_hints_api.app.wsd_batching import split_into_micro_batches
+from smart_word_hints_api.app.wsd_input import WsdExample
+
+if TYPE_CHECKING:
+    from smart_word_hints_api.app.text_holder import TextHolderEN
+
+# the block of the tokens shared by all the senses of a pack
+SHARED_BLOCK = 0
+PADDING_BLOCK = -1
+
+
+@dataclass
+class SharedContextPack:
+    """
+    The context of an instance followed by the copies and the gloss of each sense.
+
+    positions are the indexes the tokens have in the per-sense cross-encoder input.
+    blocks is SHARED_BLOCK for the context, sense index + 1 for the tokens of a sense.
+    replaced marks the context tokens that each sense has its own copy of.
+    cls_indexes and instance_spans locate the copies of each sense in input_ids.
+    """
+
+    instance_id: int
+    sense_keys: list[str]
+    input_ids: list[int]
+    positions: list[int]
+    blocks: list[int]
+    replaced: list[bool]
+    cls_indexes: list[int]
+    instance_spans: list[tuple[int, int]]
+
+    def __len__(self) -> int:
+        return len(self.input_ids)
+
+
+def build_packs(
+    examples: list[WsdExample], sep_token_id: int, max_pack_length: int
+) -> list[SharedContextPack]:
+    """
+    Packs the cross-encoder examples of each instance. The examples of an instance
+    share the context, i.e. the prefix up to and including the first </s>.
+    A pack holds as many senses as fit in max_pack_length tokens (at least one).
+    """
+    instance_id__to__examples: dict[int, list[WsdExample]] = {}
+    for example in examples:
+        instance_id__to__examples.setdefault(example.instance_id, []).append(example)
+
+    packs: list[SharedContextPack] = []
+    for instance_id, instance_examples in instance_id__to__examples.items():
+        context_len = instance_examples[0].input_ids.index(sep_token_id) + 1
+        instance_start = instance_examples[0].instance_start
+        instance_end = instance_examples[0].instance_end
+        copied_positions = [0, *range(instance_start, instance_end)]
+
+        pack = _new_pack(instance_id, instance_examples[0], context_len)
+        for example in instance_examples:
+            sense_len = len(copied_positions) + len(example) - context_len
+            if pack.sense_keys and len(pack) + sense_len > max_pack_length:
+                packs.append(pack)
+                pack = _new_pack(instance_id, example, context_len)
+            block = len(pack.sense_keys) + 1
+            pack.sense_keys.append(example.sense_key)
+            pack.cls_indexes.append(len(pack))
+            pack.instance_spans.append(
+                (len(pack) + 1, len(pack) + len(copied_positions))
+            )
+            sense_positions = [*copied_positions, *range(context_len, len(example))]
+            pack.input_ids.extend(example.input_ids[i] for i in sense_positions)
+            pack.positions.extend(sense_positions)
+            pack.blocks.extend([block] * len(sense_positions))
+            pack.replaced.extend([False] * len(sense_positions))
+        packs.append(pack)
+    return packs
+
+
+def _new_pack(
+    instance_id: int, example: WsdExample, context_len: int
+) -> SharedContextPack:
+    return SharedContextPack(
+        instance_id=instance_id,
+        sense_keys=[],
+        input_ids=example.input_ids[:context_len],
+        positions=list(range(context_len)),
+        blocks=[SHARED_BLOCK] * context_len,
+        replaced=[
+            i == 0 or example.instance_start <= i < example.instance_end
+            for i in range(context_len)
+        ],
+        cls_indexes=[],
+        instance_spans=[],
+    )
+
+
+def collate_packs(
+    packs: list[SharedContextPack], pad_token_id: int, padding_idx: int
+) -> dict[str, torch.Tensor]:
+    """
+    Pads the packs to the longest one and builds the [batch, length, length]
+    attention mask and the (RoBERTa-style, offset by padding_idx + 1) position ids.
+    """
+    batch_size = len(packs)
+    max_len = max(len(pack) for pack in packs)
+    input_ids = torch.full((batch_size, max_len), pad_token_id, dtype=torch.long)
+    position_ids = torch.full((batch_size, max_len), padding_idx, dtype=torch.long)
+    blocks = torch.full((batch_size, max_len), PADDING_BLOCK, dtype=torch.long)
+    replaced = torch.zeros((batch_size, max_len), dtype=torch.bool)
+    for pack_i, pack in enumerate(packs):
+        input_ids[pack_i, : len(pack)] = torch.tensor(pack.input_ids)
+        position_ids[pack_i, : len(pack)] = torch.tensor(pack.positions) + (
+            padding_idx + 1
+        )
+        blocks[pack_i, : len(pack)] = torch.tensor(pack.blocks)
+        replaced[pack_i, : len(pack)] = torch.tensor(pack.replaced)
+
+    query_blocks = blocks.unsqueeze(2)
+    key_blocks = blocks.unsqueeze(1)
+    key_is_shared = key_blocks == SHARED_BLOCK
+    attention_mask = torch.where(
+        query_blocks == SHARED_BLOCK,
+        key_is_shared,
+        (query_blocks > SHARED_BLOCK)
+        & ((key_blocks == query_blocks) | (key_is_shared & ~replaced.unsqueeze(1))),
+    )
+    return {
+        "input_ids": input_ids,
+        "attention_mask": attention_mask.long(),
+        "position_ids": position_ids,
+    }
+
+
+def predict_packs(
+    model: DistilRobertaForWsd, packs: list[SharedContextPack], pad_token_id: int
+) -> torch.Tensor:
+    """
+    The probability of each sense of each pack (in order) being correct,
+    read off its copies of the first token and the instance tokens.
+    """
+    batch = collate_packs(packs, pad_token_id, model.roberta.embeddings.padding_idx)
+    pack_len = batch["input_ids"].shape[1]
+    # indexes into the hidden states flattened to [batch * length, hidden]
+    cls_indexes: list[int] = []
+    instance_token_indexes: list[int] = []
+    instance_token_sense_indexes: list[int] = []
+    for pack_i, pack in enumerate(packs):
+        for cls_index, (start, end) in zip(pack.cls_indexes, pack.instance_spans):
+            instance_token_sense_indexes.extend([len(cls_indexes)] * (end - start))
+            cls_indexes.append(pack_i * pack_len + cls_index)
+            instance_token_indexes.extend(
+                range(pack_i * pack_len + start, pack_i * pack_len + end)
+            )
+
+    with torch.no_grad():
+        return model.forward_packed(
+            batch["input_ids"],
+            attention_mask=batch["attention_mask"],
+            position_ids=batch["position_ids"],
+            cls_indexes=torch.tensor(cls_indexes),
+            instance_token_indexes=torch.tensor(instance_token_indexes),
+            instance_token_sequence_indexes=torch.tensor(instance_token_sense_indexes),
+        )[0]
+
+
+class SharedContextSenseProvider(ESRSenseProvider):
+    def __init__(self, model_name: ESRModels, **kwargs) -> None:
+        # the packs aren't collected across requests by the batch scheduler
+        kwargs["batch_scheduler_max_wait_ms"] = None
+        super().__init__(model_name, **kwargs)
+        if (
+            self.backend != WSD_BACKEND_TORCH
+            or self.precision == WSD_PRECISION_BF16
+            or self.compile_mode != WSD_COMPILE_NONE
+        ):
+            raise ValueError(
+                "The shared-context engine needs the eager torch backend "
+                "in fp32 or int8"
+            )
+
+    def get_sense_scores(
+        self, text_holder: TextHolderEN, token_indexes_to_disambiguate: list[int]
+    ) -> dict[int, dict[str, float]]:
+        examples = self.input_builder.build_examples(
+            text_holder.tokens, token_indexes_to_disambiguate
+        )
+        if not examples:
+            return {}
+        packs = build_packs(
+            examples, self.tokenizer.sep_token_id, self.input_builder.limit
+        )
+        packs.sort(key=len)
+
+        token_i__to__sense_scores: dict[int, dict[str, float]] = {}
+        for micro_batch in split_into_micro_batches(
+            packs, self.max_batch_examples, self.max_batch_tokens
+        ):
+            preds = predict_packs(
+                self.model, micro_batch, self.tokenizer.pad_token_id
+            ).tolist()
+            pred_i = 0
+            for pack in micro_batch:
+                sense_scores = token_i__to__sense_scores.setdefault(
+                    pack.instance_id, {}
+                )
+                for sense_key in pack.sense_keys:
+                    sense_scores[sense_key] = preds[pred_i]
+                    pred_i += 1
+        return token_i__to__sense_scores
@@ -0,0 +1,157 @@
+"""
+Vocabulary trimming (wsd_trimmed_vocab = yes in config.ini): the word embedding
+matrix keeps only the rows of the tokens the WSD inputs can contain, i.e. the tokens
+of all the WordNet glosses and of English words, tokenized the way WsdInputBuilder
+tokenizes the context (with and without the leading space, lowercase and capitalized).
+
+The rows are looked up through a mapping from the tokenizer ids, in front of
+the embedding, so the tokenizer and the rest of the model are unchanged.
+A token outside of the trimmed vocabulary is embedded as <unk>.
+
+Build (the word list in assets and optionally text files of an English corpus):
+python -m smart_word_hints_api.app.vocab_trimming distilroberta-base roberta-base \
+    --corpus corpus.txt
+Agreement with the full vocabulary and memory saved:
+PYTHONPATH=. python scripts/wsd_inference/evaluate_vocab_trimming.py \
+    --xml ALL.data.xml --gold_keys ALL.gold.key.txt
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+import torch
+import torch.nn as nn
+from nltk.corpus import wordnet as wn
+from transformers import PreTrainedTokenizerBase
+
+from smart_word_hints_api.app.constants import (
+    EN_FREQUENCY_RANKING_RELATIVE_PATH,
+    MODEL_NAME__TO__TRIMMED_VOCAB_RELATIVE_PATH,
+)
+from smart_word_hints_api.app.distilroberta_for_wsd import DistilRobertaForWsd
+from smart_word_hints_api.app.model_files import load_tokenizer
+from smart_word_hints_api.app.wsd_input import get_synset_gloss
+
+
+def get_trimmed_vocab_path(model_name: str) -> Path:
+    return (
+        Path(__file__).parent / MODEL_NAME__TO__TRIMMED_VOCAB_RELATIVE_PATH[model_name]
+    )
+
+
+def load_trimmed_vocab(model_name: str) -> Optional[np.ndarray]:
+    """
+    The sorted ids of the kept tokens, None if the trimmed vocabulary wasn't built.
+    """
+    trimmed_vocab_path = get_trimmed_vocab_path(model_name)
+    if not trimmed_vocab_path.exists():
+        return None
+    return np.load(trimmed_vocab_path)
+
+
+def hash_trimmed_vocab(kept_token_ids: np.ndarray) -> str:
+    """
+    Changes with the kept tokens, not only with their number.
+    """
+    return hashlib.sha256(kept_token_ids.astype(np.int64).tobytes()).hexdigest()[:16]
+
+
+class RemappedEmbedding(nn.Module):
+    """
+    An embedding of the kept tokens only, indexed by the original token ids.
+    """
+
+    def __init__(
+        self,
+        embedding: nn.Embedding,
+        kept_token_ids: torch.Tensor,
+        fallback_token_id: int,
+    ) -> None:
+        super().__init__()
+        token_id__to__row = torch.full(
+            (embedding.num_embeddings,), -1, dtype=torch.long
+        )
+        token_id__to__row[kept_token_ids] = torch.arange(len(kept_token_ids))
+        token_id__to__row[token_id__to__row == -1] = token_id__to__row[
+            fallback_token_id
+        ]
+        self.register_buffer("token_id__to__row", token_id__to__row)
+        self.embedding = nn.Embedding.from_pretrained(
+            embedding.weight.detach()[kept_token_ids].clone(),
+            freeze=True,
+            padding_idx=(
+                None
+                if embedding.padding_idx is None
+                else int(token_id__to__row[embedding.padding_idx])
+            ),
+        )
+
+    def forward(self, input_ids: torch.Tensor) -> torch.Tensor:
+        return self.embedding(self.token_id__to__row[input_ids])
+
+
+def trim_vocab(
+    model: DistilRobertaForWsd, kept_token_ids: np.ndarray, fallback_token_id: int
+) -> None:
+    """
+    Replaces in place the word embeddings with the rows of kept_token_ids,
+    which have to include fallback_token_id and the special tokens.
+    """
+    embeddings = model.roberta.embeddings
+    embeddings.word_embeddings = RemappedEmbedding(
+        embeddings.word_embeddings,
+        torch.from_numpy(kept_token_ids).long(),
+        fallback_token_id,
+    )
+
+
+def get_word_variants(word: str) -> list[str]:
+    """
+    The forms a word can be tokenized in by WsdInputBuilder.encode_context.
+    """
+    variants = []
+    for form in {word, word.lower(), word.capitalize()}:
+        variants.extend([form, f" {form}"])
+    return variants
+
+
+def build_trimmed_vocab(
+    tokenizer: PreTrainedTokenizerBase, corpus_lines: Iterable[str]
+) -> np.ndarray:
+    texts = [get_synset_gloss(synset) for synset in wn.all_synsets()]
+    with open(Path(__file__).parent / EN_FREQUENCY_RANKING_RELATIVE_PATH, "r") as f:
+        words = f.read().splitlines()
+    for line in corpus_lines:
+        texts.append(line)
+        words.extend(line.split())
+    texts.extend(variant for word in set(words) for variant in get_word_variants(word))
+
+    kept_token_ids = set(tokenizer.all_special_ids)
+    for ids in tokenizer(texts, add_special_tokens=False)["input_ids"]:
+        kept_token_ids.update(ids)
+    return np.array(sorted(kept_token_ids), dtype=np.int64)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "model_names",
+        nargs="*",
+        default=["distilroberta-base", "roberta-base", "roberta-large"],
+    )
+    parser.add_argument("--corpus", nargs="*", default=[])
+    args = parser.parse_args()
+
+    corpus_lines: list[str] = []
+    for corpus_path in args.corpus:
+        with open(corpus_path, "r") as f:
+            corpus_lines.extend(line.strip() for line in f if line.strip())
+    for model_name in args.model_names:
+        tokenizer = load_tokenizer(model_name)
+        kept_token_ids = build_trimmed_vocab(tokenizer, corpus_lines)
+        np.save(get_trimmed_vocab_path(model_name), kept_token_ids)
+        print(f"{model_name}: kept {len(kept_token_ids)} of {len(tokenizer)} tokens")
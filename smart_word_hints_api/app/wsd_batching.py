@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Optional
+
+from transformers import PretrainedConfig
+
+from smart_word_hints_api.app.constants import (
+    WSD_ACTIVATION_BYTES_PER_ELEMENT,
+    WSD_HIDDEN_STATES_PER_TOKEN,
+    WSD_SEQUENCE_LENGTH_LIMIT,
+)
+from smart_word_hints_api.app.wsd_input import WsdExample
+
+
+def split_into_micro_batches(
+    examples: list[WsdExample],
+    max_examples: Optional[int] = None,
+    max_tokens: Optional[int] = None,
+) -> list[list[WsdExample]]:
+    """
+    Greedily splits the examples (keeping their order) into batches of at most
+    max_examples examples and at most max_tokens tokens after padding,
+    i.e. number of examples * length of the longest example.
+    An example longer than max_tokens gets a batch of its own.
+    """
+    batches: list[list[WsdExample]] = []
+    current_batch: list[WsdExample] = []
+    current_max_len = 0
+    for example in examples:
+        max_len_with_example = max(current_max_len, len(example))
+        if current_batch and (
+            (max_examples is not None and len(current_batch) >= max_examples)
+            or (
+                max_tokens is not None
+                and max_len_with_example * (len(current_batch) + 1) > max_tokens
+            )
+        ):
+            batches.append(current_batch)
+            current_batch = []
+            max_len_with_example = len(example)
+        current_batch.append(example)
+        current_max_len = max_len_with_example
+    if current_batch:
+        batches.append(current_batch)
+    return batches
+
+
+def split_instances_into_micro_batches(
+    examples: list[WsdExample],
+    max_examples: Optional[int] = None,
+    max_tokens: Optional[int] = None,
+) -> list[list[int]]:
+    """
+    Like split_into_micro_batches, but never splits the (consecutive) examples
+    of an instance between batches. Returns the indexes of the examples.
+    An instance over the limits gets a batch of its own.
+    """
+    instances: list[list[int]] = []
+    for example_i, example in enumerate(examples):
+        if example_i == 0 or example.instance_id != examples[example_i - 1].instance_id:
+            instances.append([])
+        instances[-1].append(example_i)
+
+    batches: list[list[int]] = []
+    current_batch: list[int] = []
+    current_max_len = 0
+    for instance in instances:
+        max_len_with_instance = max(
+            current_max_len, *(len(examples[example_i]) for example_i in instance)
+        )
+        if current_batch and (
+            (
+                max_examples is not None
+                and len(current_batch) + len(instance) > max_examples
+            )
+            or (
+                max_tokens is not None
+                and max_len_with_instance * (len(current_batch) + len(instance))
+                > max_tokens
+            )
+        ):
+            batches.append(current_batch)
+            current_batch = []
+            max_len_with_instance = max(
+                len(examples[example_i]) for example_i in instance
+            )
+        current_batch.extend(instance)
+        current_max_len = max_len_with_instance
+    if current_batch:
+        batches.append(current_batch)
+    return batches
+
+
+def group_into_length_buckets(
+    examples: list[WsdExample], bucket_width: int
+) -> tuple[list[list[WsdExample]], list[int]]:
+    """
+    Sorts the examples by length and groups them into buckets in which
+    lengths differ by at most bucket_width tokens, so that padding a bucket
+    to its own longest example wastes little.
+
+    Also returns the original index of each example in the order of the buckets,
+    to scatter the predictions back.
+    """
+    order = sorted(range(len(examples)), key=lambda i: len(examples[i]))
+    buckets: list[list[WsdExample]] = []
+    bucket_min_len = 0
+    for example_i in order:
+        example = examples[example_i]
+        if not buckets or len(example) - bucket_min_len > bucket_width:
+            buckets.append([])
+            bucket_min_len = len(example)
+        buckets[-1].append(example)
+    return buckets, order
+
+
+@dataclass
+class PackedRow:
+    """
+    The indexes of the examples packed into a single row and their total length.
+    """
+
+    example_indexes: list[int] = field(default_factory=list)
+    length: int = 0
+
+    def __len__(self) -> int:
+        return self.length
+
+
+def pack_into_rows(examples: list[WsdExample], row_length: int) -> list[PackedRow]:
+    """
+    First-fit decreasing: the examples, longest first, go to the first row
+    with room for them. An example longer than row_length gets a row of its own.
+    """
+    rows: list[PackedRow] = []
+    for example_i in sorted(
+        range(len(examples)), key=lambda i: len(examples[i]), reverse=True
+    ):
+        example_len = len(examples[example_i])
+        row = next(
+            (row for row in rows if row.length + example_len <= row_length), None
+        )
+        if row is None:
+            row = PackedRow()
+            rows.append(row)
+        row.example_indexes.append(example_i)
+        row.length += example_len
+    return rows
+
+
+def get_padding_ratio(batches: list[list[WsdExample]]) -> float:
+    """
+    The fraction of padding tokens among all tokens of the padded batches
+    (of examples or of packed rows).
+    """
+    padded_tokens = sum(
+        len(batch) * max(len(example) for example in batch) for batch in batches
+    )
+    if padded_tokens == 0:
+        return 0.0
+    real_tokens = sum(len(example) for batch in batches for example in batch)
+    return 1 - real_tokens / padded_tokens
+
+
+def get_max_batch_tokens_for_memory_budget(
+    model_config: PretrainedConfig,
+    memory_budget_mb: int,
+    max_sequence_length: int = WSD_SEQUENCE_LENGTH_LIMIT,
+    bytes_per_element: int = WSD_ACTIVATION_BYTES_PER_ELEMENT,
+) -> int:
+    """
+    Rough upper bound on the number of padded tokens whose activations fit
+    in memory_budget_mb during a no_grad forward pass of a single layer:
+    the hidden states (with queries, keys, values and residuals), the FFN
+    intermediate activations and a row of attention scores per head.
+    """
+    elements_per_token = (
+        WSD_HIDDEN_STATES_PER_TOKEN * model_config.hidden_size
+        + model_config.intermediate_size
+        + model_config.num_attention_heads * max_sequence_length
+    )
+    bytes_per_token = elements_per_token * bytes_per_element
+    return max(memory_budget_mb * 1024 * 1024 // bytes_per_token, max_sequence_length)
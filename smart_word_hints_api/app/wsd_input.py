@@ -0,0 +1,341 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Optional
+
+import torch
+from nltk.corpus import wordnet as wn
+from nltk.corpus.reader import Synset
+from transformers import PreTrainedTokenizerBase
+
+from smart_word_hints_api.app.constants import (
+    DEFAULT_WSD_XML_EXPECTED_POS,
+    TAG__TO__WSD_XML_EXPECTED_POS,
+    WSD_SEQUENCE_LENGTH_LIMIT,
+    WSD_XML_EXPECTED_POS__TO__WORDNET_POS,
+)
+from smart_word_hints_api.app.token_wrappers import TokenEN
+
+if TYPE_CHECKING:
+    from smart_word_hints_api.app.gloss_cache import GlossTokenCache
+    from smart_word_hints_api.app.wsd_batching import PackedRow
+
+
+@dataclass(frozen=True)
+class WsdExample:
+    """
+    A single (context, candidate sense) pair for the cross-encoder.
+
+    instance_id is the index of the disambiguated token in TextHolderEN.tokens,
+    instance_start and instance_end delimit its subword tokens in input_ids.
+    """
+
+    instance_id: int
+    sense_key: str
+    input_ids: list[int]
+    instance_start: int
+    instance_end: int
+
+    def __len__(self) -> int:
+        return len(self.input_ids)
+
+
+class WsdInputBuilder:
+    """
+    Builds the ESR context/gloss examples straight from the tokens, without
+    the SemCor-style XML file and the WsdDataset re-parse.
+
+    Glosses are taken from the pre-tokenized gloss_cache if it's given,
+    only the sentences are tokenized per request.
+
+    If max_candidate_senses is given, only the max_candidate_senses most frequent
+    candidate senses of each token (by sense_key__to__ranking_score) are scored.
+    """
+
+    def __init__(
+        self,
+        tokenizer: PreTrainedTokenizerBase,
+        limit: int = WSD_SEQUENCE_LENGTH_LIMIT,
+        gloss_cache: Optional[GlossTokenCache] = None,
+        max_candidate_senses: Optional[int] = None,
+        sense_key__to__ranking_score: Optional[dict[str, int]] = None,
+    ) -> None:
+        self.tokenizer = tokenizer
+        self.limit = limit
+        self.gloss_cache = gloss_cache
+        self.max_candidate_senses = max_candidate_senses
+        self.sense_key__to__ranking_score = sense_key__to__ranking_score or {}
+        self.number_of_special_tokens = tokenizer.num_special_tokens_to_add(pair=True)
+
+    def build_examples(
+        self, tokens: list[TokenEN], token_indexes_to_disambiguate: list[int]
+    ) -> list[WsdExample]:
+        token_indexes_to_disambiguate_set = set(token_indexes_to_disambiguate)
+        examples: list[WsdExample] = []
+        for sentence in split_into_sentences(tokens):
+            instances = [
+                token_i
+                for token_i in sentence
+                if token_i in token_indexes_to_disambiguate_set
+            ]
+            if not instances:
+                continue
+            context_ids, token_i__to__span = self.encode_context(
+                [tokens[token_i].text for token_i in sentence], sentence
+            )
+            for token_i in instances:
+                for sense_key in self.get_candidate_sense_keys(tokens[token_i]):
+                    examples.append(
+                        self.build_example(
+                            token_i,
+                            sense_key,
+                            context_ids,
+                            token_i__to__span[token_i],
+                            self.encode_gloss(sense_key),
+                        )
+                    )
+        return examples
+
+    def get_candidate_sense_keys(self, token: TokenEN) -> list[str]:
+        candidate_sense_keys = get_candidate_sense_keys(token)
+        if not self.max_candidate_senses:
+            return candidate_sense_keys
+        return prune_candidate_sense_keys(
+            candidate_sense_keys,
+            self.max_candidate_senses,
+            self.sense_key__to__ranking_score,
+        )
+
+    def encode_context(
+        self, words: list[str], token_indexes: list[int]
+    ) -> tuple[list[int], dict[int, tuple[int, int]]]:
+        context_ids: list[int] = []
+        token_i__to__span: dict[int, tuple[int, int]] = {}
+        for word_i, (word, token_i) in enumerate(zip(words, token_indexes)):
+            word_ids = self.tokenizer.encode(
+                word if word_i == 0 else f" {word}", add_special_tokens=False
+            )
+            token_i__to__span[token_i] = (
+                len(context_ids),
+                len(context_ids) + len(word_ids),
+            )
+            context_ids.extend(word_ids)
+        return context_ids, token_i__to__span
+
+    def encode_gloss(self, sense_key: str) -> list[int]:
+        if self.gloss_cache is not None:
+            gloss_ids = self.gloss_cache.get(sense_key)
+            if gloss_ids is not None:
+                return gloss_ids
+        return self.tokenizer.encode(
+            get_sense_gloss(sense_key), add_special_tokens=False
+        )
+
+    def build_example(
+        self,
+        instance_id: int,
+        sense_key: str,
+        context_ids: list[int],
+        instance_span: tuple[int, int],
+        gloss_ids: list[int],
+    ) -> WsdExample:
+        context_ids, instance_span = self.fit_context(context_ids, instance_span)
+        max_gloss_len = self.limit - self.number_of_special_tokens - len(context_ids)
+        input_ids = self.tokenizer.build_inputs_with_special_tokens(
+            context_ids, gloss_ids[: max(max_gloss_len, 0)]
+        )
+        # the context is preceded by a single <s> token
+        return WsdExample(
+            instance_id=instance_id,
+            sense_key=sense_key,
+            input_ids=input_ids,
+            instance_start=instance_span[0] + 1,
+            instance_end=instance_span[1] + 1,
+        )
+
+    def fit_context(
+        self, context_ids: list[int], instance_span: tuple[int, int]
+    ) -> tuple[list[int], tuple[int, int]]:
+        """
+        Very long sentences are cut to a window around the instance,
+        so that at least half of the limit is left for the gloss.
+        """
+        max_context_len = (self.limit - self.number_of_special_tokens) // 2
+        if len(context_ids) <= max_context_len:
+            return context_ids, instance_span
+        start, end = instance_span
+        window_start = max(
+            0,
+            min(
+                start - (max_context_len - (end - start)) // 2,
+                len(context_ids) - max_context_len,
+            ),
+        )
+        return (
+            context_ids[window_start : window_start + max_context_len],
+            (start - window_start, end - window_start),
+        )
+
+
+def collate_wsd_examples(
+    examples: list[WsdExample], pad_token_id: int
+) -> dict[str, torch.Tensor]:
+    """
+    In-memory counterpart of ESR's DataCollatorForWsd: pads the examples
+    to the longest one and builds the masks expected by the WSD models.
+    """
+    batch_size = len(examples)
+    max_len = max(len(example) for example in examples)
+    input_ids = torch.full((batch_size, max_len), pad_token_id, dtype=torch.long)
+    attention_mask = torch.zeros((batch_size, max_len), dtype=torch.long)
+    instance_mask = torch.zeros((batch_size, max_len), dtype=torch.long)
+    for example_i, example in enumerate(examples):
+        input_ids[example_i, : len(example)] = torch.tensor(
+            example.input_ids, dtype=torch.long
+        )
+        attention_mask[example_i, : len(example)] = 1
+        instance_mask[example_i, example.instance_start : example.instance_end] = 1
+    return {
+        "input_ids": input_ids,
+        "attention_mask": attention_mask,
+        "token_type_ids": torch.zeros_like(input_ids),
+        "instance_mask": instance_mask,
+        "instance_lens": instance_mask.sum(dim=1).float(),
+    }
+
+
+def collate_packed_rows(
+    examples: list[WsdExample],
+    rows: list[PackedRow],
+    pad_token_id: int,
+    padding_idx: int,
+) -> dict[str, torch.Tensor]:
+    """
+    Concatenates the examples of each row and pads the rows to the longest one.
+    A block-diagonal [batch, length, length] attention mask and position ids
+    restarting at every example (RoBERTa-style, offset by padding_idx + 1)
+    keep the examples apart. The index tensors locate the first token and the
+    instance tokens of each example, in the order of the rows, in the hidden
+    states flattened to [batch * length] (see DistilRobertaForWsd.forward_packed).
+    """
+    row_len = max(len(row) for row in rows)
+    input_ids = torch.full((len(rows), row_len), pad_token_id, dtype=torch.long)
+    position_ids = torch.full((len(rows), row_len), padding_idx, dtype=torch.long)
+    # the index of the example each token belongs to, -1 for padding
+    token_sequence_indexes = torch.full((len(rows), row_len), -1, dtype=torch.long)
+    cls_indexes: list[int] = []
+    instance_token_indexes: list[int] = []
+    instance_token_sequence_indexes: list[int] = []
+    for row_i, row in enumerate(rows):
+        offset = 0
+        for example_i in row.example_indexes:
+            example = examples[example_i]
+            end = offset + len(example)
+            input_ids[row_i, offset:end] = torch.tensor(example.input_ids)
+            position_ids[row_i, offset:end] = torch.arange(
+                padding_idx + 1, padding_idx + 1 + len(example)
+            )
+            token_sequence_indexes[row_i, offset:end] = len(cls_indexes)
+            flat_offset = row_i * row_len + offset
+            instance_token_sequence_indexes.extend(
+                [len(cls_indexes)] * (example.instance_end - example.instance_start)
+            )
+            instance_token_indexes.extend(
+                range(
+                    flat_offset + example.instance_start,
+                    flat_offset + example.instance_end,
+                )
+            )
+            cls_indexes.append(flat_offset)
+            offset = end
+
+    attention_mask = (
+        token_sequence_indexes.unsqueeze(2) == token_sequence_indexes.unsqueeze(1)
+    ) & (token_sequence_indexes.unsqueeze(1) >= 0)
+    return {
+        "input_ids": input_ids,
+        "attention_mask": attention_mask.long(),
+        "position_ids": position_ids,
+        "cls_indexes": torch.tensor(cls_indexes),
+        "instance_token_indexes": torch.tensor(instance_token_indexes),
+        "instance_token_sequence_indexes": torch.tensor(
+            instance_token_sequence_indexes
+        ),
+    }
+
+
+def get_dummy_batch(batch_size: int, sequence_length: int) -> dict[str, torch.Tensor]:
+    """
+    A batch of the given shape with the inputs expected by the WSD models,
+    for tracing, exporting and warming up the models.
+    """
+    instance_mask = torch.zeros((batch_size, sequence_length), dtype=torch.long)
+    instance_mask[:, 1] = 1
+    return {
+        "input_ids": torch.ones((batch_size, sequence_length), dtype=torch.long),
+        "attention_mask": torch.ones((batch_size, sequence_length), dtype=torch.long),
+        "token_type_ids": torch.zeros((batch_size, sequence_length), dtype=torch.long),
+        "instance_mask": instance_mask,
+        "instance_lens": instance_mask.sum(dim=1).float(),
+    }
+
+
+def split_into_sentences(tokens: list[TokenEN]) -> list[list[int]]:
+    """
+    Groups token indexes into sentences the same way save_input_as_xml does.
+    """
+    sentences: list[list[int]] = []
+    for token_i, token in enumerate(tokens):
+        if token_i == 0 or token.is_sent_start():
+            sentences.append([])
+        sentences[-1].append(token_i)
+    return sentences
+
+
+def get_candidate_sense_keys(token: TokenEN) -> list[str]:
+    lemma, wordnet_pos = get_wordnet_lemma_and_pos(token)
+    return [lemma.key() for lemma in wn.lemmas(lemma, pos=wordnet_pos)]
+
+
+def prune_candidate_sense_keys(
+    candidate_sense_keys: list[str],
+    max_candidate_senses: int,
+    sense_key__to__ranking_score: dict[str, int],
+) -> list[str]:
+    """
+    Keeps the max_candidate_senses senses with the lowest ranking score
+    (the most frequent ones). The senses without a ranking score come last,
+    in the WordNet order (which is roughly by frequency as well).
+    """
+    if len(candidate_sense_keys) <= max_candidate_senses:
+        return candidate_sense_keys
+    return sorted(
+        candidate_sense_keys,
+        key=lambda sense_key: sense_key__to__ranking_score.get(sense_key, float("inf")),
+    )[:max_candidate_senses]
+
+
+def get_wordnet_lemma_and_pos(token: TokenEN) -> tuple[str, Optional[str]]:
+    """
+    The lemma and the WordNet POS (None if the tag doesn't map to one)
+    whose WordNet lemmas are the candidate senses of the token.
+    """
+    wordnet_pos = WSD_XML_EXPECTED_POS__TO__WORDNET_POS.get(
+        TAG__TO__WSD_XML_EXPECTED_POS.get(token.tag, DEFAULT_WSD_XML_EXPECTED_POS)
+    )
+    return lemma_extended_if_is_in_wordnet_else_lemma(token), wordnet_pos
+
+
+def get_sense_gloss(sense_key: str) -> str:
+    return get_synset_gloss(wn.synset_from_sense_key(sense_key))
+
+
+def get_synset_gloss(synset: Synset) -> str:
+    return synset.definition()
+
+
+def lemma_extended_if_is_in_wordnet_else_lemma(token: TokenEN) -> str:
+    lemma_extended = "_".join(token.lemma_extended.split())
+    if len(wn.synsets(lemma_extended)) > 0:
+        return lemma_extended
+    return token.lemma
@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+import torch
+
+from smart_word_hints_api.app.wsd_input import WsdExample
+
+
+@dataclass
+class _PendingRequest:
+    examples: list[WsdExample]
+    future: Future = field(default_factory=Future)
+
+
+class WsdBatchScheduler:
+    """
+    Collects the examples of concurrent requests for up to max_wait_ms
+    (or until max_batch_examples are collected), runs a single shared
+    prediction over all of them in a background thread and routes
+    the scores back to each waiting request.
+
+    A request that finds no other request queued behind it is predicted right
+    away: without concurrent traffic, requests aren't delayed by max_wait_ms.
+    """
+
+    def __init__(
+        self,
+        predict: Callable[[list[WsdExample]], torch.Tensor],
+        max_wait_ms: float,
+        max_batch_examples: int,
+    ) -> None:
+        self._predict = predict
+        self.max_wait_s = max_wait_ms / 1000
+        self.max_batch_examples = max_batch_examples
+        # None in the queue stops the worker
+        self._queue: queue.Queue[Optional[_PendingRequest]] = queue.Queue()
+        self._metrics_lock = threading.Lock()
+        self._closed = False
+        self._queued_examples = 0
+        self._batches = 0
+        self._requests = 0
+        self._examples = 0
+        self._last_batch_requests = 0
+        self._last_batch_examples = 0
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def predict(self, examples: list[WsdExample]) -> torch.Tensor:
+        pending_request = _PendingRequest(examples)
+        with self._metrics_lock:
+            closed = self._closed
+            if not closed:
+                self._queued_examples += len(examples)
+                self._queue.put(pending_request)
+        if closed:
+            return self._predict(examples)
+        return pending_request.future.result()
+
+    def close(self) -> None:
+        """
+        Stops the worker thread once the requests already queued are predicted.
+        Later requests are predicted directly in the calling thread.
+        """
+        with self._metrics_lock:
+            self._closed = True
+            self._queue.put(None)
+
+    def get_metrics(self) -> dict[str, float]:
+        with self._metrics_lock:
+            return {
+                "queue_depth_requests": self._queue.qsize(),
+                "queue_depth_examples": self._queued_examples,
+                "batches": self._batches,
+                "requests": self._requests,
+                "examples": self._examples,
+                "mean_requests_per_batch": self._requests / max(self._batches, 1),
+                "mean_examples_per_batch": self._examples / max(self._batches, 1),
+                "last_batch_requests": self._last_batch_requests,
+                "last_batch_examples": self._last_batch_examples,
+            }
+
+    def _collect_batch(self) -> tuple[list[_PendingRequest], bool]:
+        """
+        Returns the batch and whether the worker should stop after it.
+        """
+        first_pending_request = self._queue.get()
+        if first_pending_request is None:
+            return [], True
+        pending_requests = [first_pending_request]
+        number_of_examples = len(first_pending_request.examples)
+        if self._queue.empty():
+            return pending_requests, False
+        deadline = time.monotonic() + self.max_wait_s
+        while number_of_examples < self.max_batch_examples:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                pending_request = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if pending_request is None:
+                return pending_requests, True
+            pending_requests.append(pending_request)
+            number_of_examples += len(pending_request.examples)
+        return pending_requests, False
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            pending_requests, stop = self._collect_batch()
+            if not pending_requests:
+                continue
+            examples = [
+                example
+                for pending_request in pending_requests
+                for example in pending_request.examples
+            ]
+            self._update_metrics(len(pending_requests), len(examples))
+
+            try:
+                preds = self._predict(examples)
+            except Exception as e:
+                for pending_request in pending_requests:
+                    pending_request.future.set_exception(e)
+                continue
+
+            offset = 0
+            for pending_request in pending_requests:
+                number_of_examples = len(pending_request.examples)
+                pending_request.future.set_result(
+                    preds[offset : offset + number_of_examples]
+                )
+                offset += number_of_examples
+
+    def _update_metrics(self, number_of_requests: int, number_of_examples: int) -> None:
+        with self._metrics_lock:
+            self._queued_examples -= number_of_examples
+            self._batches += 1
+            self._requests += number_of_requests
+            self._examples += number_of_examples
+            self._last_batch_requests = number_of_requests
+            self._last_batch_examples = number_of_examples
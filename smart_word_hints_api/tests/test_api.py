@@ -1,7 +1,7 @@
 import pytest
 from fastapi.testclient import TestClient
 
-from smart_word_hints_api.app.main import app
+from smart_word_hints_api.app.main import app, en_to_en_hints_provider
 
 client = TestClient(app)
 
@@ -115,3 +115,47 @@ def test_hints_endpoint__without_avoiding_repetition(api_path):
     )
     assert response.status_code == 200
     assert len(response.json()["hints"]) == 2
+
+
+@pytest.mark.parametrize(
+    "api_path",
+    [
+        "/api/v1/get_hints",
+        "/api/latest/get_hints",
+    ],
+)
+def test_hints_endpoint__hints_easier_than_difficulty_are_not_returned(api_path):
+    text = "By the time we reached the opposite bank, the boat was sinking fast."
+    all_hints = client.post(api_path, json={"text": text}).json()["hints"]
+    response = client.post(
+        api_path, json={"text": text, "options": {"difficulty": 2000}}
+    )
+    assert response.status_code == 200
+    hints = response.json()["hints"]
+    assert hints == [
+        hint
+        for hint in all_hints
+        if hint["difficulty_ranking"] is None or hint["difficulty_ranking"] >= 2000
+    ]
+
+
+def test_hints_endpoint__unknown_model_tier():
+    response = client.post(
+        "/api/latest/get_hints",
+        json={"text": "A tissue.", "options": {"model_tier": "huge"}},
+    )
+    assert response.status_code == 422
+
+
+def test_hints_endpoint__model_tier_without_downloaded_model(monkeypatch):
+    monkeypatch.setattr(
+        en_to_en_hints_provider,
+        "model_tier__to__model_name",
+        {"fast": "distilroberta-base"},
+    )
+    response = client.post(
+        "/api/latest/get_hints",
+        json={"text": "A tissue.", "options": {"model_tier": "best"}},
+    )
+    assert response.status_code == 422
+    assert "best" in response.json()["detail"]
@@ -0,0 +1,51 @@
+import pytest
+import torch
+
+from smart_word_hints_api.app.bfloat16 import is_bfloat16_supported
+from smart_word_hints_api.app.constants import WSD_PRECISION_BF16, WSD_PRECISION_FP32
+from smart_word_hints_api.app.esr_sense_provider import ESRSenseProvider
+from smart_word_hints_api.app.text_holder import TextHolderEN
+from smart_word_hints_api.app.wsd_input import get_dummy_batch
+
+
+@pytest.fixture(scope="module")
+def fp32_sense_provider():
+    return ESRSenseProvider("distilroberta-base", precision=WSD_PRECISION_FP32)
+
+
+@pytest.fixture(scope="module")
+def bf16_sense_provider():
+    return ESRSenseProvider("distilroberta-base", precision=WSD_PRECISION_BF16)
+
+
+def test_bf16_falls_back_to_fp32_if_not_supported(bf16_sense_provider):
+    expected_precision = (
+        WSD_PRECISION_BF16 if is_bfloat16_supported() else WSD_PRECISION_FP32
+    )
+    assert bf16_sense_provider.precision == expected_precision
+
+
+def test_bf16_probabilities_are_float32_and_close_to_fp32(
+    fp32_sense_provider, bf16_sense_provider
+):
+    batch = get_dummy_batch(batch_size=4, sequence_length=32)
+    with torch.no_grad():
+        fp32_probs = fp32_sense_provider.model(**batch)[0]
+        bf16_probs = bf16_sense_provider.model(**batch)[0]
+    assert bf16_probs.dtype == torch.float32
+    assert torch.allclose(fp32_probs, bf16_probs, atol=5e-2)
+
+
+def test_bf16_sense_keys_are_the_same_as_fp32_sense_keys(
+    fp32_sense_provider, bf16_sense_provider
+):
+    text_holder = TextHolderEN(
+        "By the time we reached the opposite bank, the boat was sinking fast.",
+        flag_phrasal_verbs=True,
+    )
+    token_indexes = [
+        i for i, token in enumerate(text_holder.tokens) if token.is_translatable()
+    ]
+    assert bf16_sense_provider.get_sense_keys(
+        text_holder, token_indexes
+    ) == fp32_sense_provider.get_sense_keys(text_holder, token_indexes)
@@ -0,0 +1,150 @@
+from dataclasses import dataclass
+from types import SimpleNamespace
+
+import pytest
+import torch
+from transformers import RobertaConfig
+
+from smart_word_hints_api.app.bi_encoder_sense_provider import (
+    BiEncoderSenseProvider,
+    check_evaluation,
+    save_evaluation,
+)
+from smart_word_hints_api.app.distilroberta_for_wsd import DistilRobertaForWsd
+from smart_word_hints_api.app.wsd_input import WsdInputBuilder
+
+LIMIT = 20
+
+
+class FakeTokenizer:
+    """
+    A token per word, <s> = 0, <pad> = 1, </s> = 2.
+    """
+
+    pad_token_id = 1
+
+    def encode(self, word: str, add_special_tokens: bool) -> list[int]:
+        return [3 + int(word.strip()[1:])]
+
+    def build_inputs_with_special_tokens(
+        self, ids: list[int], pair_ids: list[int] | None = None
+    ) -> list[int]:
+        if pair_ids is None:
+            return [0, *ids, 2]
+        return [0, *ids, 2, 2, *pair_ids, 2]
+
+    def num_special_tokens_to_add(self, pair: bool) -> int:
+        return 4 if pair else 2
+
+
+@dataclass
+class FakeToken:
+    text: str
+    sent_start: bool
+
+    def is_sent_start(self) -> bool:
+        return self.sent_start
+
+
+def get_text_holder(sentence_lengths: list[int]) -> SimpleNamespace:
+    """
+    The text of the i-th token is wi, tokenized to the id 3 + i.
+    """
+    tokens: list[FakeToken] = []
+    for sentence_length in sentence_lengths:
+        for word_i in range(sentence_length):
+            tokens.append(FakeToken(f"w{len(tokens)}", word_i == 0))
+    return SimpleNamespace(tokens=tokens)
+
+
+@pytest.fixture
+def sense_provider():
+    torch.manual_seed(0)
+    config = RobertaConfig(
+        vocab_size=100,
+        hidden_size=32,
+        num_hidden_layers=2,
+        num_attention_heads=4,
+        intermediate_size=64,
+        max_position_embeddings=LIMIT + 4,
+        pad_token_id=1,
+    )
+    sense_provider = BiEncoderSenseProvider.__new__(BiEncoderSenseProvider)
+    sense_provider.model = DistilRobertaForWsd(config).eval()
+    sense_provider.tokenizer = FakeTokenizer()
+    sense_provider.input_builder = WsdInputBuilder(FakeTokenizer(), limit=LIMIT)
+    sense_provider.max_batch_examples = None
+    sense_provider.max_batch_tokens = None
+    return sense_provider
+
+
+def test_short_sentence_is_a_single_context(sense_provider):
+    text_holder = get_text_holder([6])
+    instances, contexts = sense_provider._build_contexts(text_holder, [1, 4])
+    assert instances == [1, 4]
+    assert len(contexts) == 1
+    assert contexts[0].input_ids == [0, 3, 4, 5, 6, 7, 8, 2]
+    assert contexts[0].instance_spans == [(2, 3), (5, 6)]
+
+
+def test_long_sentence_is_windowed_around_each_instance(sense_provider):
+    text_holder = get_text_holder([40])
+    instances, contexts = sense_provider._build_contexts(text_holder, [2, 35])
+    assert instances == [2, 35]
+    assert len(contexts) == 2
+    for token_i, context in zip(instances, contexts):
+        assert len(context) <= LIMIT
+        [(start, end)] = context.instance_spans
+        assert context.input_ids[start:end] == [3 + token_i]
+    # the windows fit in the position embeddings
+    sense_provider._encode_instances(contexts)
+
+
+def test_micro_batches_give_the_same_embeddings(sense_provider):
+    text_holder = get_text_holder([5, 8, 3, 40])
+    instances, contexts = sense_provider._build_contexts(
+        text_holder, [0, 6, 13, 15, 20, 50]
+    )
+    expected = sense_provider._encode_instances(contexts)
+
+    forward_passes = []
+    sense_provider.model.roberta.register_forward_hook(
+        lambda module, inputs, output: forward_passes.append(inputs[0].shape)
+    )
+    sense_provider.max_batch_examples = 2
+    embeddings = sense_provider._encode_instances(contexts)
+
+    assert len(embeddings) == len(instances)
+    assert len(forward_passes) == -(-len(contexts) // 2)
+    assert torch.allclose(embeddings, expected, atol=1e-5)
+
+
+def test_sense_scores_are_not_available(sense_provider):
+    with pytest.raises(NotImplementedError):
+        sense_provider.get_sense_scores(get_text_holder([6]), [1, 4])
+
+
+def test_sense_embeddings_without_evaluation_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        check_evaluation(tmp_path)
+
+
+def test_sense_embeddings_much_less_accurate_than_cross_encoder_are_rejected(
+    tmp_path,
+):
+    save_evaluation(
+        tmp_path,
+        cross_encoder_accuracy=0.7,
+        bi_encoder_accuracy=0.6,
+        agreement_rate=0.8,
+    )
+    with pytest.raises(ValueError):
+        check_evaluation(tmp_path)
+
+    save_evaluation(
+        tmp_path,
+        cross_encoder_accuracy=0.7,
+        bi_encoder_accuracy=0.69,
+        agreement_rate=0.9,
+    )
+    check_evaluation(tmp_path)
@@ -0,0 +1,68 @@
+from smart_word_hints_api.app.cascade_sense_provider import (
+    CascadeSenseProvider,
+    get_margin,
+)
+
+
+class _FakeSenseProvider:
+    def __init__(self, token_i__to__sense_scores: dict[int, dict[str, float]]):
+        self.token_i__to__sense_scores = token_i__to__sense_scores
+        self.requested_token_indexes: list[list[int]] = []
+
+    def get_sense_scores(self, text_holder, token_indexes_to_disambiguate):
+        self.requested_token_indexes.append(token_indexes_to_disambiguate)
+        return {
+            token_i: self.token_i__to__sense_scores[token_i]
+            for token_i in token_indexes_to_disambiguate
+        }
+
+    def get_metrics(self):
+        return {}
+
+
+FIRST_SCORES = {
+    0: {"a": 0.9, "b": 0.1},
+    1: {"a": 0.55, "b": 0.5},
+    2: {"a": 0.3},
+}
+ESCALATION_SCORES = {
+    0: {"a": 0.1, "b": 0.9},
+    1: {"a": 0.1, "b": 0.9},
+    2: {"a": 0.9},
+}
+
+
+def test_get_margin():
+    assert get_margin({"a": 0.9, "b": 0.1, "c": 0.7}) == 0.9 - 0.7
+    assert get_margin({"a": 0.3}) == float("inf")
+
+
+def test_only_tokens_with_low_margin_are_escalated():
+    escalation_sense_provider = _FakeSenseProvider(ESCALATION_SCORES)
+    cascade_sense_provider = CascadeSenseProvider(
+        _FakeSenseProvider(FIRST_SCORES),
+        escalation_sense_provider,
+        escalation_margin=0.2,
+    )
+    assert cascade_sense_provider.get_sense_keys(None, [0, 1, 2]) == {
+        0: "a",
+        1: "b",
+        2: "a",
+    }
+    assert escalation_sense_provider.requested_token_indexes == [[1]]
+    assert cascade_sense_provider.get_metrics()["cascade"]["escalation_rate"] == 1 / 3
+
+
+def test_nothing_is_escalated_with_zero_margin():
+    escalation_sense_provider = _FakeSenseProvider(ESCALATION_SCORES)
+    cascade_sense_provider = CascadeSenseProvider(
+        _FakeSenseProvider(FIRST_SCORES),
+        escalation_sense_provider,
+        escalation_margin=0.0,
+    )
+    assert cascade_sense_provider.get_sense_keys(None, [0, 1, 2]) == {
+        0: "a",
+        1: "a",
+        2: "a",
+    }
+    assert escalation_sense_provider.requested_token_indexes == []
@@ -0,0 +1,64 @@
+import pytest
+import torch
+
+from smart_word_hints_api.app.compiled_wsd_model import CompiledWsdModel
+from smart_word_hints_api.app.constants import WSD_COMPILE_TORCHSCRIPT
+from smart_word_hints_api.app.esr_sense_provider import ESRSenseProvider
+from smart_word_hints_api.app.wsd_input import (
+    WsdExample,
+    collate_wsd_examples,
+    get_dummy_batch,
+)
+
+
+@pytest.fixture(scope="module")
+def eager_model():
+    return ESRSenseProvider("distilroberta-base").model.eval()
+
+
+@pytest.fixture(scope="module")
+def torchscript_model(eager_model):
+    return CompiledWsdModel(
+        eager_model, WSD_COMPILE_TORCHSCRIPT, warmup_shapes=[(1, 8)]
+    )
+
+
+@pytest.mark.parametrize("batch_size,sequence_length", [(1, 8), (3, 40), (16, 97)])
+def test_torchscript_probabilities_are_close_to_eager_probabilities(
+    eager_model, torchscript_model, batch_size, sequence_length
+):
+    batch = get_dummy_batch(batch_size, sequence_length)
+    with torch.no_grad():
+        eager_probs = eager_model(**batch)[0]
+    compiled_probs = torchscript_model(**batch)[0]
+    assert compiled_probs.shape == (batch_size,)
+    assert torch.allclose(eager_probs, compiled_probs, atol=1e-5)
+
+
+def test_torchscript_probabilities_of_padded_batch_are_close_to_eager_probabilities(
+    eager_model, torchscript_model
+):
+    torch.manual_seed(0)
+    examples = [
+        WsdExample(
+            instance_id=example_i,
+            sense_key="bank%1:17:01::",
+            input_ids=[0] + torch.randint(3, 1000, (length - 2,)).tolist() + [2],
+            instance_start=instance_start,
+            instance_end=instance_start + 2,
+        )
+        for example_i, (length, instance_start) in enumerate(
+            [(9, 3), (40, 20), (17, 1), (64, 50)]
+        )
+    ]
+    batch = collate_wsd_examples(examples, eager_model.config.pad_token_id)
+    with torch.no_grad():
+        eager_probs = eager_model(**batch)[0]
+    compiled_probs = torchscript_model(**batch)[0]
+    assert compiled_probs.shape == (len(examples),)
+    assert torch.allclose(eager_probs, compiled_probs, atol=1e-5)
+
+
+def test_unknown_compile_mode_raises(eager_model):
+    with pytest.raises(ValueError):
+        CompiledWsdModel(eager_model, "unknown")
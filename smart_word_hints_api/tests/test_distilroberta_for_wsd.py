@@ -0,0 +1,75 @@
+import pytest
+import torch
+from transformers import RobertaConfig
+
+from smart_word_hints_api.app.distilroberta_for_wsd import DistilRobertaForWsd
+from smart_word_hints_api.app.wsd_batching import pack_into_rows
+from smart_word_hints_api.app.wsd_input import (
+    WsdExample,
+    collate_packed_rows,
+    collate_wsd_examples,
+    get_dummy_batch,
+)
+
+
+@pytest.fixture(scope="module")
+def model():
+    torch.manual_seed(0)
+    config = RobertaConfig(
+        vocab_size=100,
+        hidden_size=32,
+        num_hidden_layers=2,
+        num_attention_heads=4,
+        intermediate_size=64,
+        max_position_embeddings=80,
+        pad_token_id=1,
+    )
+    return DistilRobertaForWsd(config).eval()
+
+
+@pytest.mark.parametrize("batch_size,sequence_length", [(1, 8), (16, 40)])
+def test_inference_pooling_gives_identical_predictions(
+    model, batch_size, sequence_length
+):
+    batch = get_dummy_batch(batch_size, sequence_length)
+    batch["input_ids"] = torch.randint(3, 100, (batch_size, sequence_length))
+    for example_i in range(batch_size):
+        batch["instance_mask"][example_i, 1 : 2 + example_i % 5] = 1
+    batch["instance_lens"] = batch["instance_mask"].sum(dim=1).float()
+
+    with torch.enable_grad():
+        training_probs = model(**batch)[0].detach()
+    with torch.no_grad():
+        inference_probs = model(**batch)[0]
+
+    assert torch.equal(training_probs, inference_probs)
+
+
+def test_packed_rows_give_the_same_predictions_as_padded_batches(model):
+    generator = torch.Generator().manual_seed(0)
+    examples = [
+        WsdExample(
+            instance_id=example_i,
+            sense_key=str(example_i),
+            input_ids=[
+                0,
+                *torch.randint(3, 100, (length - 2,), generator=generator).tolist(),
+                2,
+            ],
+            instance_start=1,
+            instance_end=1 + example_i % 3 + 1,
+        )
+        for example_i, length in enumerate([7, 20, 5, 13, 9, 30, 6, 11])
+    ]
+    with torch.no_grad():
+        padded_probs = model(**collate_wsd_examples(examples, pad_token_id=1))[0]
+
+    rows = pack_into_rows(examples, row_length=32)
+    with torch.no_grad():
+        packed_probs = model.forward_packed(
+            **collate_packed_rows(examples, rows, pad_token_id=1, padding_idx=1)
+        )[0]
+    order = [example_i for row in rows for example_i in row.example_indexes]
+
+    assert len(rows) < len(examples)
+    assert torch.allclose(padded_probs[order], packed_probs, atol=1e-6)
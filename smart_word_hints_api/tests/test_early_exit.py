@@ -0,0 +1,92 @@
+import pytest
+import torch
+from transformers import RobertaConfig
+
+from smart_word_hints_api.app.distilroberta_for_wsd import DistilRobertaForWsd
+from smart_word_hints_api.app.early_exit import (
+    EarlyExitHeads,
+    get_decided_examples,
+    get_default_exit_layers,
+    predict_with_early_exit,
+)
+from smart_word_hints_api.app.wsd_input import get_dummy_batch
+
+
+@pytest.fixture(scope="module")
+def model():
+    torch.manual_seed(0)
+    config = RobertaConfig(
+        vocab_size=100,
+        hidden_size=32,
+        num_hidden_layers=4,
+        num_attention_heads=4,
+        intermediate_size=64,
+        max_position_embeddings=80,
+    )
+    return DistilRobertaForWsd(config).eval()
+
+
+@pytest.fixture(scope="module")
+def batch():
+    batch = get_dummy_batch(batch_size=6, sequence_length=20)
+    batch["input_ids"] = torch.randint(3, 100, (6, 20))
+    batch["attention_mask"][::2, 15:] = 0
+    return batch
+
+
+# three instances with two candidate senses each
+EXAMPLE_GROUPS = torch.tensor([0, 0, 1, 1, 2, 2])
+
+
+def test_default_exit_layers():
+    assert get_default_exit_layers(6) == [2, 4]
+    assert get_default_exit_layers(12) == [3, 6, 9]
+    assert get_default_exit_layers(24) == [6, 12, 18]
+
+
+def test_decided_examples_are_the_whole_instances_over_the_threshold():
+    probs = torch.tensor([0.9, 0.1, 0.5, 0.45, 0.3])
+    decided = get_decided_examples(torch.tensor([0, 0, 1, 1, 2]), probs, 0.5)
+    # a single candidate sense is always decided
+    assert decided.tolist() == [True, True, False, False, True]
+
+
+def test_without_confident_heads_predictions_are_full_depth(model, batch):
+    heads = EarlyExitHeads(hidden_size=32, exit_layers=[1, 2])
+    with torch.no_grad():
+        full_depth_probs = model(**batch)[0]
+
+    probs, exit_layers = predict_with_early_exit(model, heads, batch, EXAMPLE_GROUPS)
+
+    assert torch.allclose(full_depth_probs, probs, atol=1e-6)
+    assert exit_layers.tolist() == [4] * 6
+
+
+def test_decided_instances_exit_at_the_shallowest_confident_layer(model, batch):
+    heads = EarlyExitHeads(hidden_size=32, exit_layers=[1, 2], thresholds=[1.0, 0.0])
+    with torch.no_grad():
+        heads.heads[0].weight.zero_()
+        heads.heads[0].bias.zero_()
+        # the first instance is decided by the first head
+        heads.heads[0].bias[1] = 1.0
+
+    groups = torch.tensor([0, 1, 1, 2, 2, 2])
+    probs, exit_layers = predict_with_early_exit(model, heads, batch, groups)
+
+    assert exit_layers.tolist() == [1, 2, 2, 2, 2, 2]
+    assert probs[0] == torch.softmax(torch.tensor([0.0, 1.0]), dim=0)[1]
+
+
+def test_heads_hash_changes_with_the_thresholds_and_the_weights():
+    torch.manual_seed(0)
+    heads = EarlyExitHeads(hidden_size=32, exit_layers=[1, 2], thresholds=[0.5, 0.5])
+    heads_hash = heads.get_hash()
+    assert heads.get_hash() == heads_hash
+
+    heads.thresholds = [0.5, 0.4]
+    thresholds_hash = heads.get_hash()
+    assert thresholds_hash != heads_hash
+
+    with torch.no_grad():
+        heads.heads[1].bias[0] += 1.0
+    assert heads.get_hash() not in (heads_hash, thresholds_hash)
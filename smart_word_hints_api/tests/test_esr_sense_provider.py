@@ -0,0 +1,107 @@
+import tempfile
+
+import pytest
+
+from smart_word_hints_api.app import esr_sense_provider
+from smart_word_hints_api.app.early_exit import EarlyExitHeads
+from smart_word_hints_api.app.esr.code.esr.dataset.dataset_semcor_wngc import (
+    WsdDataset,
+)
+from smart_word_hints_api.app.esr_sense_provider import (
+    ESRSenseProvider,
+    save_input_as_xml,
+)
+from smart_word_hints_api.app.text_holder import TextHolderEN
+from smart_word_hints_api.app.wsd_input import WsdInputBuilder
+
+TEXTS = [
+    "By the time we reached the opposite bank, the boat was sinking fast.",
+    "I am looking after the kids. The plant is an endemic species.",
+    "You should get around to it. She says he never cared for her.",
+]
+
+
+@pytest.fixture(scope="module")
+def sense_provider():
+    return ESRSenseProvider("distilroberta-base")
+
+
+def _get_translatable_token_indexes(text_holder: TextHolderEN) -> list[int]:
+    return [i for i, token in enumerate(text_holder.tokens) if token.is_translatable()]
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_in_memory_input_has_the_same_candidate_senses_as_xml_input(
+    sense_provider, text
+):
+    text_holder = TextHolderEN(text, flag_phrasal_verbs=True)
+    token_indexes = _get_translatable_token_indexes(text_holder)
+
+    with tempfile.NamedTemporaryFile(mode="w+t") as f:
+        dataset_id__to__token_id = save_input_as_xml(
+            text_holder.tokens, token_indexes, f.name
+        )
+        xml_dataset = WsdDataset(
+            sense_provider.tokenizer,
+            limit=432,
+            wsd_xml=f.name,
+            wsd_label=None,
+            annotators=None,
+            is_dev=False,
+            is_main_process=False,
+            extra_xml=None,
+        )
+        xml_candidates = [
+            (dataset_id__to__token_id[instance_id], sense_key)
+            for instance_id, sense_key, *_ in xml_dataset.get_example_list()
+        ]
+
+    examples = WsdInputBuilder(sense_provider.tokenizer).build_examples(
+        text_holder.tokens, token_indexes
+    )
+    in_memory_candidates = [
+        (example.instance_id, example.sense_key) for example in examples
+    ]
+
+    assert sorted(in_memory_candidates) == sorted(xml_candidates)
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_in_memory_sense_keys_are_the_same_as_xml_sense_keys(sense_provider, text):
+    text_holder = TextHolderEN(text, flag_phrasal_verbs=True)
+    token_indexes = _get_translatable_token_indexes(text_holder)
+
+    assert sense_provider.get_sense_keys(
+        text_holder, token_indexes
+    ) == sense_provider.get_sense_keys_via_xml(text_holder, token_indexes)
+
+
+def test_no_instances_to_disambiguate_returns_empty_result(sense_provider):
+    text_holder = TextHolderEN("Ajod fhis tuy benght ratingo.", flag_phrasal_verbs=True)
+    assert sense_provider.get_sense_keys(text_holder, []) == {}
+
+
+def test_model_version_changes_with_the_early_exit_heads(monkeypatch):
+    model_version = ESRSenseProvider("distilroberta-base").get_model_version()
+    heads = EarlyExitHeads(hidden_size=768, exit_layers=[2, 4], thresholds=[0.5, 0.5])
+    monkeypatch.setattr(EarlyExitHeads, "load_if_built", lambda model_name: heads)
+    sense_provider = ESRSenseProvider("distilroberta-base", early_exit=True)
+    early_exit_model_version = sense_provider.get_model_version()
+    assert early_exit_model_version != model_version
+
+    heads.thresholds = [0.5, 0.4]
+    assert sense_provider.get_model_version() != early_exit_model_version
+
+
+def test_zero_length_bucket_width_disables_bucketing(monkeypatch):
+    def group_into_length_buckets(*args):
+        raise AssertionError("the examples shouldn't be bucketed")
+
+    monkeypatch.setattr(
+        esr_sense_provider, "group_into_length_buckets", group_into_length_buckets
+    )
+    sense_provider = ESRSenseProvider("distilroberta-base", length_bucket_width=0)
+    text_holder = TextHolderEN(TEXTS[0], flag_phrasal_verbs=True)
+    assert sense_provider.get_sense_keys(
+        text_holder, _get_translatable_token_indexes(text_holder)
+    )
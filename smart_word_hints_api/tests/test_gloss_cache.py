@@ -0,0 +1,35 @@
+import pytest
+
+from smart_word_hints_api.app.gloss_cache import GlossTokenCache, build_gloss_cache
+from smart_word_hints_api.app.model_files import load_tokenizer
+from smart_word_hints_api.app.wsd_input import WsdInputBuilder
+
+MODEL_NAME = "distilroberta-base"
+
+
+@pytest.fixture(scope="module")
+def tokenizer():
+    return load_tokenizer(MODEL_NAME)
+
+
+@pytest.fixture(scope="module")
+def gloss_cache(tmp_path_factory):
+    cache_dir = tmp_path_factory.mktemp("gloss_cache")
+    build_gloss_cache(MODEL_NAME, cache_dir)
+    return GlossTokenCache(cache_dir)
+
+
+@pytest.mark.parametrize(
+    "sense_key",
+    ["bank%1:17:01::", "bank%1:14:00::", "run%2:38:00::", "big%3:00:01::"],
+)
+def test_cached_gloss_ids_are_the_same_as_tokenized_gloss(
+    tokenizer, gloss_cache, sense_key
+):
+    assert WsdInputBuilder(tokenizer, gloss_cache=gloss_cache).encode_gloss(
+        sense_key
+    ) == WsdInputBuilder(tokenizer).encode_gloss(sense_key)
+
+
+def test_unknown_sense_key_is_not_in_cache(gloss_cache):
+    assert gloss_cache.get("notaword%1:00:00::") is None
@@ -1,5 +1,20 @@
+from smart_word_hints_api.app import hints_providers
+from smart_word_hints_api.app.cascade_sense_provider import CascadeSenseProvider
+from smart_word_hints_api.app.config import config
+from smart_word_hints_api.app.constants import (
+    CONFIG_KEY_MODEL_NAME,
+    CONFIG_KEY_WSD_CASCADE_ESCALATION_MODEL_NAME,
+    CONFIG_KEY_WSD_ENGINE,
+    WSD_ENGINE_CASCADE,
+    WSD_MODEL_TIER__TO__MODEL_NAME,
+)
 from smart_word_hints_api.app.difficulty_rankings import DifficultyRanking
-from smart_word_hints_api.app.hints_providers import EnglishToEnglishHintsProvider, Hint
+from smart_word_hints_api.app.hints_providers import (
+    EnglishToEnglishHintsProvider,
+    Hint,
+    get_available_model_tiers,
+)
+from smart_word_hints_api.app.sense_cache import SentenceSenseCache
 
 
 def test_personal_pronouns_dont_raise_exceptions__smoke_test():
@@ -155,3 +170,89 @@ def test_hints_with_phrasal_verbs__particle_with_preposition():
     ]
 
     assert actual == expected
+
+
+class _SenseProviderWithoutSenses:
+    """
+    Gives no sense to any token, as for tokens without WordNet candidates.
+    """
+
+    def __init__(self) -> None:
+        self.requests: list[list[int]] = []
+
+    def get_sense_keys(self, text_holder, token_indexes_to_disambiguate):
+        self.requests.append(token_indexes_to_disambiguate)
+        return {}
+
+
+def test_sentence_with_tokens_without_a_sense_is_served_from_the_sense_cache():
+    hints_provider = EnglishToEnglishHintsProvider()
+    hints_provider.monosemous_index = None
+    hints_provider.sense_cache = SentenceSenseCache(max_sentences=10)
+    sense_provider = _SenseProviderWithoutSenses()
+    hints_provider.sense_provider = sense_provider
+
+    assert hints_provider.get_hints("The bank of the river was flooded.") == []
+    assert hints_provider.get_hints("The bank of the river was flooded.") == []
+
+    assert len(sense_provider.requests) == 1
+
+
+def test_model_tiers_that_dont_fit_next_to_the_resident_model_are_unavailable(
+    tmp_path, monkeypatch
+):
+    model_name__to__checkpoint_mb = {
+        "distilroberta-base": 300,
+        "roberta-base": 500,
+        "roberta-large": 1400,
+    }
+    for model_name, checkpoint_mb in model_name__to__checkpoint_mb.items():
+        with open(tmp_path / model_name, "wb") as f:
+            f.truncate(checkpoint_mb * 2**20)
+    monkeypatch.setattr(
+        hints_providers, "get_checkpoint_path", lambda model_name: tmp_path / model_name
+    )
+
+    assert get_available_model_tiers({"distilroberta-base"}, 300, 800) == {
+        "fast": "distilroberta-base",
+        "balanced": "roberta-base",
+    }
+    assert len(get_available_model_tiers({"distilroberta-base"}, 300, 0)) == 3
+
+
+class _FakeSenseProvider:
+    def __init__(self, model_name: str) -> None:
+        self.model_name = model_name
+
+    def get_model_version(self) -> str:
+        return self.model_name
+
+
+def test_cascade_models_serve_their_model_tiers_without_the_pool(monkeypatch):
+    hints_provider = EnglishToEnglishHintsProvider()
+    first_sense_provider = _FakeSenseProvider("distilroberta-base")
+    escalation_sense_provider = _FakeSenseProvider("roberta-large")
+    hints_provider.sense_provider = CascadeSenseProvider(
+        first_sense_provider, escalation_sense_provider, escalation_margin=0.2
+    )
+    hints_provider.model_tier__to__model_name = WSD_MODEL_TIER__TO__MODEL_NAME
+    monkeypatch.setitem(config, CONFIG_KEY_WSD_ENGINE, WSD_ENGINE_CASCADE)
+    monkeypatch.setitem(config, CONFIG_KEY_MODEL_NAME, "distilroberta-base")
+    monkeypatch.setitem(
+        config, CONFIG_KEY_WSD_CASCADE_ESCALATION_MODEL_NAME, "roberta-large"
+    )
+    loaded_model_names = []
+
+    def load(model_name: str) -> _FakeSenseProvider:
+        loaded_model_names.append(model_name)
+        return _FakeSenseProvider(model_name)
+
+    monkeypatch.setattr(hints_provider.sense_provider_pool, "get", load)
+
+    fast_sense_provider, _ = hints_provider._get_sense_provider_for_tier("fast")
+    best_sense_provider, _ = hints_provider._get_sense_provider_for_tier("best")
+    hints_provider._get_sense_provider_for_tier("balanced")
+
+    assert fast_sense_provider is first_sense_provider
+    assert best_sense_provider is escalation_sense_provider
+    assert loaded_model_names == ["roberta-base"]
@@ -0,0 +1,36 @@
+import pytest
+import torch
+
+from smart_word_hints_api.app import mmap_weights
+from smart_word_hints_api.app.esr_sense_provider import ESRSenseProvider
+from smart_word_hints_api.app.wsd_input import get_dummy_batch
+
+
+@pytest.fixture(scope="module")
+def sense_provider():
+    return ESRSenseProvider("distilroberta-base")
+
+
+def test_mmapped_model_gives_the_same_probabilities(
+    sense_provider, tmp_path, monkeypatch
+):
+    safetensors_path = tmp_path / "wsd_distilroberta.safetensors"
+    mmap_weights.convert_to_safetensors(sense_provider.model, safetensors_path)
+    monkeypatch.setattr(
+        mmap_weights, "get_safetensors_model_path", lambda model_name: safetensors_path
+    )
+    mmapped_model = mmap_weights.load_mmapped_model(
+        "distilroberta-base", sense_provider.config
+    )
+    batch = get_dummy_batch(batch_size=3, sequence_length=24)
+    with torch.no_grad():
+        assert torch.equal(
+            sense_provider.model.eval()(**batch)[0], mmapped_model(**batch)[0]
+        )
+
+
+def test_random_init_functions_are_restored():
+    normal_ = torch.nn.init.normal_
+    with mmap_weights.skip_random_init():
+        assert torch.nn.init.normal_ is not normal_
+    assert torch.nn.init.normal_ is normal_
@@ -0,0 +1,32 @@
+import socket
+
+import pytest
+
+from smart_word_hints_api.app import model_files
+
+MODEL_NAME = "distilroberta-base"
+
+
+def test_network_access_raises_inside_no_network_access():
+    original_connect = socket.socket.connect
+    original_create_connection = socket.create_connection
+    with model_files.no_network_access():
+        with pytest.raises(model_files.NetworkAccessError):
+            socket.create_connection(("huggingface.co", 443))
+        with pytest.raises(model_files.NetworkAccessError):
+            socket.socket().connect(("huggingface.co", 443))
+    assert socket.socket.connect is original_connect
+    assert socket.create_connection is original_create_connection
+
+
+def test_bundled_files_are_loaded_without_network_access(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        model_files, "get_model_files_dir", lambda model_name: tmp_path / model_name
+    )
+    model_files.bundle_model_files(MODEL_NAME)
+    with model_files.no_network_access():
+        model_config = model_files.load_model_config(MODEL_NAME)
+        tokenizer = model_files.load_tokenizer(MODEL_NAME)
+    assert model_config.model_type == "roberta"
+    assert tokenizer.is_fast
+    assert len(tokenizer) == model_config.vocab_size
@@ -0,0 +1,84 @@
+from types import SimpleNamespace
+
+import pytest
+
+from smart_word_hints_api.app.monosemous_index import (
+    MonosemousSenseIndex,
+    build_monosemous_index,
+)
+from smart_word_hints_api.app.text_holder import TextHolderEN
+from smart_word_hints_api.app.wsd_input import get_candidate_sense_keys
+
+
+@pytest.fixture(scope="module")
+def monosemous_index(tmp_path_factory):
+    index_path = tmp_path_factory.mktemp("monosemous_index") / "monosemous_senses.tsv"
+    build_monosemous_index(index_path)
+    return MonosemousSenseIndex(index_path)
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "By the time we reached the opposite bank, the boat was sinking fast.",
+        "Researchers found that the endemic plant can survive long droughts.",
+        "The photosynthesis of the chloroplast was measured with a spectrometer.",
+    ],
+)
+def test_index_resolves_exactly_the_tokens_with_a_single_candidate_sense(
+    monosemous_index, text
+):
+    text_holder = TextHolderEN(text, flag_phrasal_verbs=True)
+    for token in text_holder.tokens:
+        if not token.is_translatable():
+            continue
+        candidate_sense_keys = get_candidate_sense_keys(token)
+        expected = candidate_sense_keys[0] if len(candidate_sense_keys) == 1 else None
+        assert monosemous_index.get_sense_key(token) == expected
+
+
+class FakeLemma:
+    def __init__(self, name: str, key: str) -> None:
+        self._name = name
+        self._key = key
+
+    def name(self) -> str:
+        return self._name
+
+    def key(self) -> str:
+        return self._key
+
+
+class FakeSynset:
+    def __init__(self, pos: str, lemmas: list[FakeLemma]) -> None:
+        self._pos = pos
+        self._lemmas = lemmas
+
+    def pos(self) -> str:
+        return self._pos
+
+    def lemmas(self) -> list[FakeLemma]:
+        return self._lemmas
+
+
+def test_built_index_is_loaded_back(tmp_path, monkeypatch):
+    synsets = [
+        FakeSynset("n", [FakeLemma("Bank", "bank%1:17:01::")]),
+        FakeSynset("n", [FakeLemma("bank", "bank%1:14:00::")]),
+        FakeSynset("n", [FakeLemma("photosynthesis", "photosynthesis%1:22:00::")]),
+        FakeSynset("s", [FakeLemma("endemic", "endemic%5:00:00:native:01")]),
+    ]
+    monkeypatch.setattr(
+        "smart_word_hints_api.app.monosemous_index.wn",
+        SimpleNamespace(ADJ="a", ADJ_SAT="s", all_synsets=lambda: iter(synsets)),
+    )
+    index_path = tmp_path / "monosemous_senses.tsv"
+    build_monosemous_index(index_path)
+
+    loaded = MonosemousSenseIndex(index_path)
+
+    assert len(index_path.read_text().splitlines()) == 2
+    assert loaded.lemma_pos__to__sense_key == {
+        ("endemic", "a"): "endemic%5:00:00:native:01",
+        ("photosynthesis", "n"): "photosynthesis%1:22:00::",
+    }
@@ -0,0 +1,56 @@
+import pytest
+import torch
+
+from smart_word_hints_api.app.esr_sense_provider import ESRSenseProvider
+from smart_word_hints_api.app.onnx_wsd_model import OnnxWsdModel, export_to_onnx
+from smart_word_hints_api.app.text_holder import TextHolderEN
+from smart_word_hints_api.app.wsd_input import collate_wsd_examples
+
+TEXTS = [
+    "By the time we reached the opposite bank, the boat was sinking fast.",
+    "I am looking after the kids. The plant is an endemic species.",
+]
+
+
+@pytest.fixture(scope="module")
+def torch_sense_provider():
+    return ESRSenseProvider("distilroberta-base")
+
+
+@pytest.fixture(scope="module")
+def onnx_sense_provider(torch_sense_provider, tmp_path_factory):
+    onnx_path = tmp_path_factory.mktemp("onnx") / "wsd_distilroberta.onnx"
+    export_to_onnx(torch_sense_provider.model, torch_sense_provider.config, onnx_path)
+    sense_provider = ESRSenseProvider("distilroberta-base")
+    sense_provider.model = OnnxWsdModel(onnx_path)
+    return sense_provider
+
+
+def _get_translatable_token_indexes(text_holder: TextHolderEN) -> list[int]:
+    return [i for i, token in enumerate(text_holder.tokens) if token.is_translatable()]
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_onnx_probabilities_are_close_to_torch_probabilities(
+    torch_sense_provider, onnx_sense_provider, text
+):
+    text_holder = TextHolderEN(text, flag_phrasal_verbs=True)
+    examples = torch_sense_provider.input_builder.build_examples(
+        text_holder.tokens, _get_translatable_token_indexes(text_holder)
+    )
+    batch = collate_wsd_examples(examples, torch_sense_provider.tokenizer.pad_token_id)
+    with torch.no_grad():
+        torch_probs = torch_sense_provider.model(**batch)[0]
+    onnx_probs = onnx_sense_provider.model(**batch)[0]
+    assert torch.allclose(torch_probs, onnx_probs, atol=1e-4)
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_onnx_sense_keys_are_the_same_as_torch_sense_keys(
+    torch_sense_provider, onnx_sense_provider, text
+):
+    text_holder = TextHolderEN(text, flag_phrasal_verbs=True)
+    token_indexes = _get_translatable_token_indexes(text_holder)
+    assert onnx_sense_provider.get_sense_keys(
+        text_holder, token_indexes
+    ) == torch_sense_provider.get_sense_keys(text_holder, token_indexes)
@@ -0,0 +1,76 @@
+import copy
+
+import pytest
+import torch
+from transformers import RobertaConfig
+
+from smart_word_hints_api.app import pruning
+from smart_word_hints_api.app.distilroberta_for_wsd import DistilRobertaForWsd
+from smart_word_hints_api.app.wsd_input import get_dummy_batch
+
+MODEL_NAME = "distilroberta-base"
+
+
+@pytest.fixture
+def model():
+    torch.manual_seed(0)
+    config = RobertaConfig(
+        vocab_size=100,
+        hidden_size=32,
+        num_hidden_layers=2,
+        num_attention_heads=4,
+        intermediate_size=64,
+        max_position_embeddings=80,
+        pad_token_id=1,
+    )
+    return DistilRobertaForWsd(config).eval()
+
+
+@pytest.fixture
+def batch():
+    batch = get_dummy_batch(batch_size=4, sequence_length=16)
+    batch["input_ids"] = torch.randint(3, 100, (4, 16))
+    return batch
+
+
+def test_pruning_neurons_without_output_weights_keeps_predictions(model, batch):
+    layer = model.roberta.encoder.layer[0]
+    with torch.no_grad():
+        layer.output.dense.weight[:, 32:] = 0
+        expected = model(**batch)[0]
+
+    pruning.prune_model(model, {}, {0: list(range(32))})
+
+    assert model.config.intermediate_sizes == [32, 64]
+    with torch.no_grad():
+        assert torch.allclose(model(**batch)[0], expected, atol=1e-6)
+
+
+def test_pruned_checkpoint_is_loaded_with_its_structure(
+    model, batch, tmp_path, monkeypatch
+):
+    unpruned_config = copy.deepcopy(model.config)
+    pruning.prune_model(model, {0: [1, 3], 1: [0]}, {1: list(range(0, 64, 2))})
+    monkeypatch.setattr(
+        pruning, "get_pruning_path", lambda model_name: tmp_path / "pruning.json"
+    )
+    pruning.save_pruned_model(model, tmp_path / "model.bin", tmp_path / "pruning.json")
+
+    pruning.apply_pruning(unpruned_config, MODEL_NAME)
+    loaded = DistilRobertaForWsd.from_pretrained(
+        tmp_path / "model.bin", config=unpruned_config
+    ).eval()
+
+    assert loaded.roberta.encoder.layer[0].attention.self.num_attention_heads == 2
+    assert loaded.roberta.encoder.layer[1].intermediate.dense.out_features == 32
+    with torch.no_grad():
+        assert torch.equal(loaded(**batch)[0], model(**batch)[0])
+
+
+def test_unpruned_checkpoint_config_is_unchanged(model, tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        pruning, "get_pruning_path", lambda model_name: tmp_path / "pruning.json"
+    )
+    pruning.apply_pruning(model.config, MODEL_NAME)
+    assert not model.config.pruned_heads
+    assert not hasattr(model.config, "intermediate_sizes")
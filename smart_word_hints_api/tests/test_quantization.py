@@ -0,0 +1,95 @@
+import os
+
+import pytest
+import torch
+from transformers import RobertaConfig
+
+from smart_word_hints_api.app import quantization
+from smart_word_hints_api.app.distilroberta_for_wsd import DistilRobertaForWsd
+from smart_word_hints_api.app.quantization import build_int8_model, load_int8_model
+from smart_word_hints_api.app.wsd_input import get_dummy_batch
+
+MODEL_NAME = "distilroberta-base"
+
+
+@pytest.fixture
+def config():
+    return RobertaConfig(
+        vocab_size=100,
+        hidden_size=32,
+        num_hidden_layers=2,
+        num_attention_heads=4,
+        intermediate_size=64,
+        max_position_embeddings=80,
+        pad_token_id=1,
+    )
+
+
+@pytest.fixture
+def fp32_model(config):
+    torch.manual_seed(0)
+    return DistilRobertaForWsd(config).eval()
+
+
+@pytest.fixture
+def checkpoint_path(tmp_path, fp32_model):
+    checkpoint_path = tmp_path / "pytorch_model.bin"
+    torch.save(fp32_model.state_dict(), checkpoint_path)
+    return checkpoint_path
+
+
+@pytest.fixture(autouse=True)
+def int8_model_path(tmp_path, monkeypatch):
+    int8_model_path = tmp_path / "wsd.int8.pt"
+    monkeypatch.setattr(
+        quantization, "get_int8_model_path", lambda model_name: int8_model_path
+    )
+    return int8_model_path
+
+
+def load_fp32_model_not_expected():
+    raise AssertionError("the fp32 model shouldn't be loaded")
+
+
+def test_int8_model_is_loaded_from_cache_and_agrees_with_fp32(
+    config, fp32_model, checkpoint_path
+):
+    build_int8_model(MODEL_NAME, lambda: fp32_model, checkpoint_path)
+
+    int8_model = load_int8_model(
+        MODEL_NAME, config, load_fp32_model_not_expected, checkpoint_path
+    )
+
+    batch = get_dummy_batch(batch_size=2, sequence_length=16)
+    batch["input_ids"] = torch.randint(4, 100, (2, 16))
+    with torch.no_grad():
+        expected = fp32_model(**batch)[0]
+        actual = int8_model(**batch)[0]
+    assert torch.allclose(actual, expected, atol=5e-2)
+
+
+def test_cache_of_another_checkpoint_is_ignored(
+    config, fp32_model, checkpoint_path, int8_model_path
+):
+    build_int8_model(MODEL_NAME, lambda: fp32_model, checkpoint_path)
+    cache_mtime = int8_model_path.stat().st_mtime
+    checkpoint_mtime = checkpoint_path.stat().st_mtime
+    os.utime(checkpoint_path, (checkpoint_mtime + 60, checkpoint_mtime + 60))
+    loaded_fp32_models = []
+
+    def load_fp32_model():
+        loaded_fp32_models.append(fp32_model)
+        return fp32_model
+
+    load_int8_model(MODEL_NAME, config, load_fp32_model, checkpoint_path)
+
+    assert len(loaded_fp32_models) == 1
+    assert int8_model_path.stat().st_mtime == cache_mtime
+
+
+def test_missing_cache_is_not_written_at_runtime(
+    config, fp32_model, checkpoint_path, int8_model_path
+):
+    load_int8_model(MODEL_NAME, config, lambda: fp32_model, checkpoint_path)
+
+    assert not int8_model_path.exists()
@@ -0,0 +1,113 @@
+import multiprocessing
+
+import pytest
+
+from smart_word_hints_api.app.sense_cache import (
+    SentenceSenseCache,
+    SqliteSentenceSenseCache,
+)
+
+
+def test_least_recently_used_sentence_is_evicted():
+    cache = SentenceSenseCache(max_sentences=2)
+    cache.put("a", {0: "a%1"})
+    cache.put("b", {0: "b%1"})
+    assert cache.get("a", [0]) == {0: "a%1"}
+    cache.put("c", {0: "c%1"})
+    assert cache.get("b", [0]) is None
+    assert cache.get("a", [0]) == {0: "a%1"}
+    assert cache.get("c", [0]) == {0: "c%1"}
+
+
+def test_sentence_with_tokens_not_disambiguated_before_is_a_miss():
+    cache = SentenceSenseCache(max_sentences=10)
+    cache.put("a", {0: "a%1"})
+    assert cache.get("a", [0, 2]) is None
+    cache.put("a", {2: "a%3"})
+    assert cache.get("a", [0, 2]) == {0: "a%1", 2: "a%3"}
+
+
+def test_metrics():
+    cache = SentenceSenseCache(max_sentences=10)
+    cache.put("a", {0: "a%1"})
+    cache.get("a", [0])
+    cache.get("b", [0])
+    cache.get("a", [0])
+    cache.get("a", [1])
+    assert cache.get_metrics() == {
+        "sentences": 1,
+        "hits": 2,
+        "misses": 2,
+        "hit_rate": 0.5,
+    }
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return tmp_path / "sense_cache.sqlite3"
+
+
+def test_sqlite_cache_is_shared_between_instances(db_path):
+    SqliteSentenceSenseCache(db_path, "v1", 10, ttl_hours=1).put("a", {0: "a%1"})
+    cache = SqliteSentenceSenseCache(db_path, "v1", 10, ttl_hours=1)
+    assert cache.get("a", [0]) == {0: "a%1"}
+
+
+def _put_in_other_process(db_path) -> None:
+    SqliteSentenceSenseCache(db_path, "v1", 10, ttl_hours=1).put("b", {1: "b%1"})
+
+
+def test_sqlite_cache_is_shared_between_processes(db_path):
+    cache = SqliteSentenceSenseCache(db_path, "v1", 10, ttl_hours=1)
+    process = multiprocessing.get_context("spawn").Process(
+        target=_put_in_other_process, args=(db_path,)
+    )
+    process.start()
+    process.join()
+    assert cache.get("b", [1]) == {1: "b%1"}
+
+
+def test_sqlite_cache_merges_tokens_of_the_same_sentence(db_path):
+    cache = SqliteSentenceSenseCache(db_path, "v1", 10, ttl_hours=1)
+    cache.put("a", {0: "a%1"})
+    assert cache.get("a", [0, 2]) is None
+    cache.put("a", {2: "a%3"})
+    assert cache.get("a", [0, 2]) == {0: "a%1", 2: "a%3"}
+
+
+def test_sqlite_cache_entries_of_other_model_versions_are_deleted(db_path):
+    SqliteSentenceSenseCache(db_path, "v1", 10, ttl_hours=1).put("a", {0: "a%1"})
+    cache = SqliteSentenceSenseCache(db_path, "v2", 10, ttl_hours=1)
+    assert cache.get("a", [0]) is None
+    assert cache.get_metrics()["sentences"] == 0
+
+
+def test_sqlite_cache_expired_entries_are_ignored_and_evicted(db_path):
+    cache = SqliteSentenceSenseCache(db_path, "v1", 10, ttl_hours=-1)
+    cache.put("a", {0: "a%1"})
+    assert cache.get("a", [0]) is None
+    cache.evict()
+    assert cache.get_metrics()["sentences"] == 0
+
+
+def test_sqlite_cache_oldest_entries_are_evicted_above_max_sentences(db_path):
+    cache = SqliteSentenceSenseCache(
+        db_path, "v1", 2, ttl_hours=1, eviction_interval_puts=1
+    )
+    for key in ["a", "b", "c"]:
+        cache.put(key, {0: f"{key}%1"})
+    assert cache.get("a", [0]) is None
+    assert cache.get("b", [0]) == {0: "b%1"}
+    assert cache.get("c", [0]) == {0: "c%1"}
+
+
+def test_tokens_without_a_sense_are_a_hit():
+    cache = SentenceSenseCache(max_sentences=10)
+    cache.put("a", {0: "a%1", 2: None})
+    assert cache.get("a", [0, 2]) == {0: "a%1", 2: None}
+
+
+def test_sqlite_cache_tokens_without_a_sense_are_a_hit(db_path):
+    cache = SqliteSentenceSenseCache(db_path, "v1", 10, ttl_hours=1)
+    cache.put("a", {0: "a%1", 2: None})
+    assert cache.get("a", [0, 2]) == {0: "a%1", 2: None}
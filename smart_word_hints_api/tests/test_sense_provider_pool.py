@@ -0,0 +1,110 @@
+import threading
+
+from smart_word_hints_api.app.sense_provider_pool import SenseProviderPool
+
+MODEL_NAME__TO__MEMORY_MB = {"small": 100, "medium": 300, "large": 1000}
+
+
+class _FakeSenseProvider:
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self.closed = False
+
+    def get_model_memory_mb(self) -> float:
+        return MODEL_NAME__TO__MEMORY_MB[self.model_name]
+
+    def close(self) -> None:
+        self.closed = True
+
+    def get_metrics(self):
+        return {"batch_scheduler": {"requests": 1}}
+
+
+def _pool(max_memory_mb: int) -> tuple[SenseProviderPool, list[_FakeSenseProvider]]:
+    created: list[_FakeSenseProvider] = []
+
+    def create_sense_provider(model_name: str) -> _FakeSenseProvider:
+        sense_provider = _FakeSenseProvider(model_name)
+        created.append(sense_provider)
+        return sense_provider
+
+    return SenseProviderPool(create_sense_provider, max_memory_mb), created
+
+
+def test_models_are_loaded_lazily_once():
+    pool, created = _pool(max_memory_mb=0)
+    assert created == []
+
+    assert pool.get("small") is pool.get("small")
+    assert [sense_provider.model_name for sense_provider in created] == ["small"]
+
+
+def test_least_recently_used_models_are_evicted_over_the_memory_limit():
+    pool, created = _pool(max_memory_mb=1100)
+    small = pool.get("small")
+    medium = pool.get("medium")
+    pool.get("small")
+
+    large = pool.get("large")
+
+    assert medium.closed
+    assert not small.closed and not large.closed
+    assert pool.get("small") is small
+    metrics = pool.get_metrics()
+    assert metrics["model_pool"]["loaded_models"] == 2
+    assert metrics["model_pool"]["loads"] == 3
+    assert metrics["model_pool"]["evictions"] == 1
+    assert metrics["model_pool"]["models_memory_mb"] == 1100
+    assert metrics["model_pool_memory_mb"] == {"small": 100, "large": 1000}
+    assert metrics["model_pool_large_batch_scheduler"] == {"requests": 1}
+
+
+def test_requested_model_is_kept_even_over_the_memory_limit():
+    pool, _ = _pool(max_memory_mb=500)
+    small = pool.get("small")
+
+    large = pool.get("large")
+
+    assert small.closed
+    assert pool.get("large") is large
+    assert pool.get_metrics()["model_pool"]["loaded_models"] == 1
+
+
+def test_concurrent_first_requests_share_one_load():
+    pool, created = _pool(max_memory_mb=0)
+    threads = [threading.Thread(target=pool.get, args=("large",)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(created) == 1
+
+
+def test_close_closes_all_the_loaded_models():
+    pool, created = _pool(max_memory_mb=0)
+    pool.get("small")
+    pool.get("medium")
+
+    pool.close()
+
+    assert all(sense_provider.closed for sense_provider in created)
+    assert pool.get_metrics()["model_pool"]["loaded_models"] == 0
+
+
+def test_resident_memory_counts_against_the_memory_limit():
+    created: list[_FakeSenseProvider] = []
+
+    def create_sense_provider(model_name: str) -> _FakeSenseProvider:
+        created.append(_FakeSenseProvider(model_name))
+        return created[-1]
+
+    pool = SenseProviderPool(
+        create_sense_provider, max_memory_mb=1000, resident_memory_mb=700
+    )
+    small = pool.get("small")
+
+    medium = pool.get("medium")
+
+    assert small.closed and not medium.closed
+    assert pool.get_metrics()["model_pool"]["resident_memory_mb"] == 700
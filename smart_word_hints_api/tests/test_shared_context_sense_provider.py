@@ -0,0 +1,113 @@
+import pytest
+import torch
+from transformers import RobertaConfig
+
+from smart_word_hints_api.app.distilroberta_for_wsd import DistilRobertaForWsd
+from smart_word_hints_api.app.shared_context_sense_provider import (
+    build_packs,
+    predict_packs,
+)
+from smart_word_hints_api.app.wsd_input import WsdExample, collate_wsd_examples
+
+PAD_TOKEN_ID = 1
+SEP_TOKEN_ID = 2
+
+
+def _model(num_hidden_layers: int) -> DistilRobertaForWsd:
+    torch.manual_seed(0)
+    config = RobertaConfig(
+        vocab_size=100,
+        hidden_size=32,
+        num_hidden_layers=num_hidden_layers,
+        num_attention_heads=4,
+        intermediate_size=64,
+        max_position_embeddings=80,
+        pad_token_id=PAD_TOKEN_ID,
+    )
+    return DistilRobertaForWsd(config).eval()
+
+
+@pytest.fixture(scope="module")
+def examples() -> list[WsdExample]:
+    """
+    Cross-encoder examples (<s> context </s></s> gloss </s>)
+    of two instances with four candidate senses each.
+    """
+    generator = torch.Generator().manual_seed(0)
+
+    def random_ids(length: int) -> list[int]:
+        return torch.randint(5, 100, (length,), generator=generator).tolist()
+
+    examples = []
+    for instance_id, (context_len, (start, end)) in enumerate(
+        [(9, (2, 4)), (5, (0, 1))]
+    ):
+        context_ids = random_ids(context_len)
+        for sense_i in range(4):
+            examples.append(
+                WsdExample(
+                    instance_id=instance_id,
+                    sense_key=f"sense_{instance_id}_{sense_i}",
+                    input_ids=[0, *context_ids, 2, 2, *random_ids(3 + sense_i), 2],
+                    instance_start=start + 1,
+                    instance_end=end + 1,
+                )
+            )
+    return examples
+
+
+def test_context_is_packed_once_per_instance(examples):
+    packs = build_packs(examples, SEP_TOKEN_ID, max_pack_length=432)
+
+    assert [pack.sense_keys for pack in packs] == [
+        [example.sense_key for example in examples[:4]],
+        [example.sense_key for example in examples[4:]],
+    ]
+    # the context (<s> + 9 tokens + </s>), then per sense: <s>, 2 instance tokens,
+    # </s>, the gloss and </s>
+    assert len(packs[0]) == 11 + sum(3 + 2 + 3 + sense_i for sense_i in range(4))
+
+
+def test_packs_are_split_at_max_pack_length(examples):
+    packs = build_packs(examples, SEP_TOKEN_ID, max_pack_length=30)
+
+    assert len(packs) > 2
+    assert all(len(pack) <= 30 for pack in packs)
+    assert [key for pack in packs for key in pack.sense_keys] == [
+        example.sense_key for example in examples
+    ]
+
+
+def test_with_a_single_layer_scores_are_the_same_as_per_pair_scores(examples):
+    """
+    The context can only differ from the cross-encoder from the second layer on,
+    after it would have attended to the gloss.
+    """
+    model = _model(num_hidden_layers=1)
+    with torch.no_grad():
+        per_pair_scores = model(**collate_wsd_examples(examples, PAD_TOKEN_ID))[0]
+
+    packed_scores = predict_packs(
+        model, build_packs(examples, SEP_TOKEN_ID, 432), PAD_TOKEN_ID
+    )
+
+    assert torch.allclose(per_pair_scores, packed_scores, atol=1e-6)
+
+
+@pytest.mark.parametrize("max_pack_length", [30, 432])
+def test_each_gloss_is_scored_as_if_it_were_alone(examples, max_pack_length):
+    model = _model(num_hidden_layers=3)
+    alone_scores = torch.cat(
+        [
+            predict_packs(
+                model, build_packs([example], SEP_TOKEN_ID, 432), PAD_TOKEN_ID
+            )
+            for example in examples
+        ]
+    )
+
+    packed_scores = predict_packs(
+        model, build_packs(examples, SEP_TOKEN_ID, max_pack_length), PAD_TOKEN_ID
+    )
+
+    assert torch.allclose(alone_scores, packed_scores, atol=1e-6)
@@ -0,0 +1,111 @@
+import numpy as np
+import pytest
+import torch
+from transformers import RobertaConfig
+
+from smart_word_hints_api.app import esr_sense_provider
+from smart_word_hints_api.app.bfloat16 import to_bfloat16_model
+from smart_word_hints_api.app.constants import WSD_PRECISION_BF16, WSD_PRECISION_FP32
+from smart_word_hints_api.app.distilroberta_for_wsd import DistilRobertaForWsd
+from smart_word_hints_api.app.esr_sense_provider import ESRSenseProvider
+from smart_word_hints_api.app.vocab_trimming import get_word_variants, trim_vocab
+from smart_word_hints_api.app.wsd_input import get_dummy_batch
+
+MODEL_NAME = "distilroberta-base"
+PAD_TOKEN_ID = 1
+UNK_TOKEN_ID = 3
+KEPT_TOKEN_IDS = np.arange(0, 50, dtype=np.int64)
+
+
+@pytest.fixture
+def model():
+    torch.manual_seed(0)
+    config = RobertaConfig(
+        vocab_size=100,
+        hidden_size=32,
+        num_hidden_layers=2,
+        num_attention_heads=4,
+        intermediate_size=64,
+        max_position_embeddings=80,
+        pad_token_id=PAD_TOKEN_ID,
+    )
+    return DistilRobertaForWsd(config).eval()
+
+
+@pytest.fixture
+def batch():
+    batch = get_dummy_batch(batch_size=4, sequence_length=16)
+    batch["input_ids"] = torch.randint(4, 50, (4, 16))
+    batch["input_ids"][1, 10:] = PAD_TOKEN_ID
+    batch["attention_mask"][1, 10:] = 0
+    return batch
+
+
+def test_trimmed_vocab_gives_identical_predictions_for_kept_tokens(model, batch):
+    with torch.no_grad():
+        expected = model(**batch)[0]
+    trim_vocab(model, KEPT_TOKEN_IDS, UNK_TOKEN_ID)
+    assert model.roberta.embeddings.word_embeddings.embedding.num_embeddings == 50
+    with torch.no_grad():
+        assert torch.equal(model(**batch)[0], expected)
+
+
+def test_tokens_outside_of_trimmed_vocab_are_embedded_as_fallback(model, batch):
+    with_fallback = {**batch, "input_ids": batch["input_ids"].clone()}
+    with_fallback["input_ids"][:, 5] = UNK_TOKEN_ID
+    with torch.no_grad():
+        expected = model(**with_fallback)[0]
+    batch["input_ids"][:, 5] = 99
+    trim_vocab(model, KEPT_TOKEN_IDS, UNK_TOKEN_ID)
+    with torch.no_grad():
+        assert torch.equal(model(**batch)[0], expected)
+
+
+def test_word_variants_cover_the_context_tokenization():
+    assert set(get_word_variants("Bank")) == {
+        "Bank",
+        " Bank",
+        "bank",
+        " bank",
+    }
+
+
+def test_trimmed_vocab_works_with_the_bf16_encoder(model, batch):
+    with torch.no_grad():
+        expected = model(**batch)[0]
+    trim_vocab(model, KEPT_TOKEN_IDS, UNK_TOKEN_ID)
+    model = to_bfloat16_model(model)
+    with torch.no_grad():
+        probs = model(**batch)[0]
+    assert probs.dtype == torch.float32
+    assert torch.allclose(probs, expected, atol=5e-2)
+
+
+def test_bf16_sense_provider_with_trimmed_vocab_is_close_to_fp32(monkeypatch):
+    fp32_sense_provider = ESRSenseProvider(MODEL_NAME, precision=WSD_PRECISION_FP32)
+    monkeypatch.setattr(
+        esr_sense_provider,
+        "load_trimmed_vocab",
+        lambda model_name: np.arange(
+            fp32_sense_provider.config.vocab_size, dtype=np.int64
+        ),
+    )
+    bf16_sense_provider = ESRSenseProvider(
+        MODEL_NAME, precision=WSD_PRECISION_BF16, trimmed_vocab=True
+    )
+    batch = get_dummy_batch(batch_size=4, sequence_length=32)
+    with torch.no_grad():
+        fp32_probs = fp32_sense_provider.model(**batch)[0]
+        bf16_probs = bf16_sense_provider.model(**batch)[0]
+    assert torch.allclose(fp32_probs, bf16_probs, atol=5e-2)
+
+
+def test_model_version_changes_with_the_kept_tokens(monkeypatch):
+    kept_token_ids = np.arange(1000, dtype=np.int64)
+    monkeypatch.setattr(
+        esr_sense_provider, "load_trimmed_vocab", lambda model_name: kept_token_ids
+    )
+    sense_provider = ESRSenseProvider(MODEL_NAME, trimmed_vocab=True)
+    model_version = sense_provider.get_model_version()
+    sense_provider.trimmed_vocab = np.arange(1, 1001, dtype=np.int64)
+    assert sense_provider.get_model_version() != model_version
@@ -0,0 +1,125 @@
+import pytest
+
+from smart_word_hints_api.app.wsd_batching import (
+    get_padding_ratio,
+    group_into_length_buckets,
+    pack_into_rows,
+    split_instances_into_micro_batches,
+    split_into_micro_batches,
+)
+from smart_word_hints_api.app.wsd_input import WsdExample
+
+
+def _example(length: int) -> WsdExample:
+    return WsdExample(
+        instance_id=0,
+        sense_key="bank%1:17:01::",
+        input_ids=[0] * length,
+        instance_start=1,
+        instance_end=2,
+    )
+
+
+def _lengths(batches: list[list[WsdExample]]) -> list[list[int]]:
+    return [[len(example) for example in batch] for batch in batches]
+
+
+def test_no_limits_gives_a_single_batch():
+    examples = [_example(length) for length in [5, 10, 3]]
+    assert _lengths(split_into_micro_batches(examples)) == [[5, 10, 3]]
+
+
+def test_max_examples_limits_batch_size():
+    examples = [_example(5) for _ in range(5)]
+    assert _lengths(split_into_micro_batches(examples, max_examples=2)) == [
+        [5, 5],
+        [5, 5],
+        [5],
+    ]
+
+
+def test_max_tokens_takes_padding_into_account():
+    examples = [_example(length) for length in [4, 4, 10, 2]]
+    assert _lengths(split_into_micro_batches(examples, max_tokens=20)) == [
+        [4, 4],
+        [10, 2],
+    ]
+
+
+@pytest.mark.parametrize("max_tokens", [1, 5])
+def test_example_longer_than_max_tokens_gets_its_own_batch(max_tokens):
+    examples = [_example(length) for length in [2, 10, 2]]
+    batches = split_into_micro_batches(examples, max_tokens=max_tokens)
+    assert _lengths(batches)[1] == [10]
+
+
+def test_order_of_examples_is_kept():
+    examples = [_example(length) for length in range(1, 20)]
+    batches = split_into_micro_batches(examples, max_examples=3, max_tokens=30)
+    assert [example for batch in batches for example in batch] == examples
+
+
+def test_length_buckets_are_sorted_and_within_bucket_width():
+    examples = [_example(length) for length in [30, 5, 12, 6, 29, 40]]
+    buckets, _ = group_into_length_buckets(examples, bucket_width=5)
+    assert _lengths(buckets) == [[5, 6], [12], [29, 30], [40]]
+
+
+def test_length_buckets_order_maps_back_to_original_examples():
+    examples = [_example(length) for length in [30, 5, 12, 6, 29, 40]]
+    buckets, order = group_into_length_buckets(examples, bucket_width=5)
+    bucketed = [example for bucket in buckets for example in bucket]
+    assert [examples[i] for i in order] == bucketed
+
+
+def test_padding_ratio():
+    batches = [[_example(2), _example(4)], [_example(4)]]
+    assert get_padding_ratio(batches) == pytest.approx(2 / 12)
+
+
+def test_bucketing_reduces_padding_ratio():
+    examples = [_example(length) for length in [30, 5, 12, 6, 29, 40]]
+    buckets, _ = group_into_length_buckets(examples, bucket_width=5)
+    assert get_padding_ratio(buckets) < get_padding_ratio([examples])
+
+
+def test_examples_are_packed_first_fit_decreasing():
+    examples = [_example(length) for length in [3, 9, 4, 6, 12, 5]]
+
+    rows = pack_into_rows(examples, row_length=16)
+
+    assert [
+        [len(examples[example_i]) for example_i in row.example_indexes] for row in rows
+    ] == [[12, 4], [9, 6], [5, 3]]
+    assert [len(row) for row in rows] == [16, 15, 8]
+
+
+def test_example_longer_than_row_length_gets_a_row_of_its_own():
+    examples = [_example(length) for length in [3, 20]]
+
+    rows = pack_into_rows(examples, row_length=16)
+
+    assert [row.example_indexes for row in rows] == [[1], [0]]
+
+
+def test_examples_of_an_instance_are_kept_in_one_micro_batch():
+    examples = [
+        WsdExample(
+            instance_id=instance_id,
+            sense_key="bank%1:17:01::",
+            input_ids=[0] * 5,
+            instance_start=1,
+            instance_end=2,
+        )
+        for instance_id in [0, 0, 1, 1, 1, 2]
+    ]
+
+    assert split_instances_into_micro_batches(examples, max_examples=4) == [
+        [0, 1],
+        [2, 3, 4, 5],
+    ]
+    assert split_instances_into_micro_batches(examples, max_examples=2) == [
+        [0, 1],
+        [2, 3, 4],
+        [5],
+    ]
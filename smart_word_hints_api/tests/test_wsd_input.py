@@ -0,0 +1,21 @@
+from smart_word_hints_api.app.wsd_input import prune_candidate_sense_keys
+
+SENSE_KEY__TO__RANKING_SCORE = {"a": 30, "b": 10, "c": 20}
+
+
+def test_pruning_keeps_the_most_frequent_senses():
+    assert prune_candidate_sense_keys(
+        ["a", "b", "c"], 2, SENSE_KEY__TO__RANKING_SCORE
+    ) == ["b", "c"]
+
+
+def test_senses_without_ranking_score_come_last_in_wordnet_order():
+    assert prune_candidate_sense_keys(
+        ["x", "a", "y", "z"], 3, SENSE_KEY__TO__RANKING_SCORE
+    ) == ["a", "x", "y"]
+
+
+def test_nothing_is_pruned_if_there_are_few_candidates():
+    assert prune_candidate_sense_keys(
+        ["a", "b", "c"], 3, SENSE_KEY__TO__RANKING_SCORE
+    ) == ["a", "b", "c"]
@@ -0,0 +1,99 @@
+import threading
+import time
+
+import pytest
+import torch
+
+from smart_word_hints_api.app.wsd_input import WsdExample
+from smart_word_hints_api.app.wsd_scheduler import WsdBatchScheduler
+
+
+def _example(instance_id: int) -> WsdExample:
+    return WsdExample(
+        instance_id=instance_id,
+        sense_key="bank%1:17:01::",
+        input_ids=[0, 1, 2],
+        instance_start=1,
+        instance_end=2,
+    )
+
+
+def _predict_instance_ids(examples: list[WsdExample]) -> torch.Tensor:
+    return torch.tensor([float(example.instance_id) for example in examples])
+
+
+def test_predictions_are_routed_back_to_each_request():
+    def predict_once_all_requests_are_sent(examples: list[WsdExample]) -> torch.Tensor:
+        # the first request is predicted alone, the others queue up meanwhile
+        deadline = time.monotonic() + 5
+        while (
+            scheduler.get_metrics()["batches"] == 1
+            and scheduler.get_metrics()["queue_depth_requests"] < 7
+            and time.monotonic() < deadline
+        ):
+            time.sleep(0.001)
+        return _predict_instance_ids(examples)
+
+    scheduler = WsdBatchScheduler(
+        predict_once_all_requests_are_sent, max_wait_ms=50, max_batch_examples=1000
+    )
+    results = {}
+
+    def send_request(request_i: int) -> None:
+        examples = [_example(request_i * 100 + i) for i in range(request_i + 1)]
+        results[request_i] = scheduler.predict(examples).tolist()
+
+    threads = [threading.Thread(target=send_request, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for request_i in range(8):
+        assert results[request_i] == [
+            float(request_i * 100 + i) for i in range(request_i + 1)
+        ]
+    metrics = scheduler.get_metrics()
+    assert metrics["requests"] == 8
+    assert metrics["batches"] < 8
+    assert metrics["queue_depth_requests"] == 0
+    assert metrics["queue_depth_examples"] == 0
+
+
+def test_request_without_concurrent_requests_is_not_delayed():
+    scheduler = WsdBatchScheduler(
+        _predict_instance_ids, max_wait_ms=10_000, max_batch_examples=1000
+    )
+    start = time.monotonic()
+    assert scheduler.predict([_example(1)]).tolist() == [1.0]
+    assert time.monotonic() - start < 5
+
+
+def test_batch_is_not_extended_beyond_max_batch_examples():
+    scheduler = WsdBatchScheduler(
+        _predict_instance_ids, max_wait_ms=1000, max_batch_examples=2
+    )
+    assert scheduler.predict([_example(1), _example(2)]).tolist() == [1.0, 2.0]
+    assert scheduler.get_metrics()["last_batch_examples"] == 2
+
+
+def test_exception_is_passed_to_the_waiting_request():
+    def failing_predict(examples: list[WsdExample]) -> torch.Tensor:
+        raise RuntimeError("out of memory")
+
+    scheduler = WsdBatchScheduler(failing_predict, max_wait_ms=1, max_batch_examples=1)
+    with pytest.raises(RuntimeError):
+        scheduler.predict([_example(1)])
+
+
+def test_close_stops_the_worker_and_predicts_in_the_calling_thread():
+    scheduler = WsdBatchScheduler(
+        _predict_instance_ids, max_wait_ms=1, max_batch_examples=1000
+    )
+    assert scheduler.predict([_example(1)]).tolist() == [1.0]
+
+    scheduler.close()
+    scheduler._worker.join(timeout=5)
+
+    assert not scheduler._worker.is_alive()
+    assert scheduler.predict([_example(2)]).tolist() == [2.0]